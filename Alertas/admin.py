@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Alerta
+from .models import Alerta, AlertaEnCola
 
 @admin.register(Alerta)
 class AlertaAdmin(admin.ModelAdmin):
@@ -7,3 +7,10 @@ class AlertaAdmin(admin.ModelAdmin):
     list_filter = ('estado', 'fecha_alerta')
     search_fields = ('pago__prestamo__banco',)
     ordering = ('fecha_alerta',)
+
+
+@admin.register(AlertaEnCola)
+class AlertaEnColaAdmin(admin.ModelAdmin):
+    list_display = ('pago', 'estado', 'intentos', 'creada', 'procesada')
+    list_filter = ('estado',)
+    ordering = ('-creada',)
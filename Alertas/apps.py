@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AlertasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Alertas'
+
+    def ready(self):
+        # el hilo de la cola arranca con la primera request del proceso web
+        from django.core.signals import request_started
+        from .services import iniciar_worker_al_arrancar
+        request_started.connect(iniciar_worker_al_arrancar)
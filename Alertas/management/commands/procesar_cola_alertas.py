@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Alertas.services import procesar_cola_alertas
+
+
+class Command(BaseCommand):
+    help = "Despacha las alertas inmediatas encoladas al crear o editar préstamos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=100, help='Filas por lote')
+        parser.add_argument('--loop', action='store_true', help='Seguir revisando la cola indefinidamente')
+        parser.add_argument('--intervalo', type=float, default=10, help='Segundos entre revisiones con --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            resumen = procesar_cola_alertas(limite=options['limite'])
+            if resumen['procesadas'] or resumen['errores'] or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Cola de alertas -> procesadas: {resumen['procesadas']}, errores: {resumen['errores']}"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Alertas', '0001_initial'),
+        ('Pagos', '0004_pago_montos_convertidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaEnCola',
+            fields=[
+                ('id_cola', models.AutoField(primary_key=True, serialize=False)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('Procesando', 'Procesando'), ('Procesada', 'Procesada'), ('Error', 'Error')], default='Pendiente', max_length=20)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('procesada', models.DateTimeField(blank=True, null=True)),
+                ('pago', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_en_cola', to='Pagos.pago')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'id_cola'], name='alertacola_estado_idx')],
+            },
+        ),
+    ]
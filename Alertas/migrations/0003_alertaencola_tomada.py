@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Alertas', '0002_alertaencola'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertaencola',
+            name='tomada',
+            field=models.DateTimeField(blank=True, help_text='Cuándo un worker la pasó a Procesando (para reclamar las abandonadas).', null=True),
+        ),
+    ]
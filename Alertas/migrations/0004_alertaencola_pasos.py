@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Alertas', '0003_alertaencola_tomada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertaencola',
+            name='pasos',
+            field=models.JSONField(blank=True, default=list, help_text='Canales ya completados (alerta_email, email, alerta_sms, sms); un reintento no los repite.'),
+        ),
+    ]
@@ -16,3 +16,44 @@ class Alerta(models.Model):
 
     def __str__(self):
         return f"Alerta para cuota {self.pago.numero_cuota} - {self.estado}"
+
+
+class AlertaEnCola(models.Model):
+    """
+    Alerta inmediata pendiente de despachar. La vista solo encola (al
+    confirmarse la transacción); el envío (tipo de cambio, Alerta, email,
+    SMS) lo hace el worker: el hilo de fondo o el comando
+    procesar_cola_alertas.
+    """
+    ESTADO_CHOICES = [
+        ('Pendiente', 'Pendiente'),
+        ('Procesando', 'Procesando'),
+        ('Procesada', 'Procesada'),
+        ('Error', 'Error'),
+    ]
+
+    id_cola = models.AutoField(primary_key=True)
+    pago = models.ForeignKey(Pago, on_delete=models.CASCADE, related_name='alertas_en_cola')
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='Pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    creada = models.DateTimeField(auto_now_add=True)
+    tomada = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Cuándo un worker la pasó a Procesando (para reclamar las abandonadas).",
+    )
+    procesada = models.DateTimeField(null=True, blank=True)
+    pasos = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Canales ya completados (alerta_email, email, alerta_sms, sms); un reintento no los repite.",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'id_cola'], name='alertacola_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cola: cuota {self.pago.numero_cuota} - {self.estado}"
@@ -1,14 +1,23 @@
+import logging
+import threading
 from datetime import date, timedelta
 from django.conf import settings
 from django.core.mail import send_mail
+from django.core.signals import request_started
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
 from Persona.models import Persona
 from Pagos.models import Pago
+from Pagos.services import POR_PAGAR, marcar_vencidos
 from Moneda.services import convertir_monto
 from .sms import send_sms
-from .models import Alerta
+from .models import Alerta, AlertaEnCola
 # ^ si ya lo tenías importado, deja solo una vez
 
+logger = logging.getLogger(__name__)
+
 
 def _parse_days(raw: str, fallback=3):
     """Convierte '7,3,1,0' -> [7,3,1,0] (únicos, >=0, orden desc)."""
@@ -53,7 +62,7 @@ def _crear_alerta(pago, fecha_alerta, mensaje):
 def generar_y_enviar_alertas(dias_antes: int = None, solo_hoy: bool = False, modo_prueba: bool = False):
     """
     Recorre todas las personas y:
-      - busca pagos Pendientes
+      - marca las cuotas vencidas y busca las que siguen por pagar
       - genera alertas para:
           * cuotas próximas según noti_dias
           * cuotas vencidas (fecha_vencimiento < hoy)
@@ -62,6 +71,7 @@ def generar_y_enviar_alertas(dias_antes: int = None, solo_hoy: bool = False, mod
     hoy = date.today()
     creadas = 0
     enviadas = 0
+    marcar_vencidos(hoy)
 
     for persona in Persona.objects.all():
         base = (getattr(persona, 'moneda_preferida', None) or 'PEN').upper()
@@ -76,9 +86,9 @@ def generar_y_enviar_alertas(dias_antes: int = None, solo_hoy: bool = False, mod
 
         fechas_obj = [hoy + timedelta(days=d) for d in dias_list]
 
-        qs = Pago.objects.filter(prestamo__persona=persona, estado='Pendiente')
-        proximos = qs.filter(fecha_vencimiento__in=fechas_obj)
-        vencidos = qs.filter(fecha_vencimiento__lt=hoy)
+        qs = Pago.objects.filter(prestamo__persona=persona)
+        proximos = qs.filter(estado='Pendiente', fecha_vencimiento__in=fechas_obj)
+        vencidos = qs.filter(estado='Vencido')
 
         def cuerpo_email(pago):
             origen = pago.prestamo.moneda_prestamo or 'PEN'
@@ -152,18 +162,21 @@ def generar_y_enviar_alertas(dias_antes: int = None, solo_hoy: bool = False, mod
 # ============================================================
 #  NUEVO: ALERTA INMEDIATA AL CREAR / EDITAR UN PAGO
 # ============================================================
-def enviar_alerta_inmediata_por_pago(pago):
+def enviar_alerta_inmediata_por_pago(pago, hechos=None, registrar=None):
     """
     Se usa justo después de crear un Pago.
     Manda alerta si:
-      - el pago está Pendiente
+      - el pago está Pendiente o Vencido
       - Y vence HOY o ya está vencido (fecha_vencimiento <= hoy)
     Respeta las preferencias de la Persona (noti_email, noti_sms)
     y el flag global SMS_ENABLED.
+    Para reintentos (cola): `hechos` son los pasos ya completados en un
+    intento anterior ('alerta_email', 'email', 'alerta_sms', 'sms'), que no
+    se repiten; `registrar(paso)` se llama apenas se completa cada uno.
     """
     hoy = date.today()
 
-    if getattr(pago, "estado", "") != "Pendiente":
+    if getattr(pago, "estado", "") not in POR_PAGAR:
         return False, "Pago no pendiente"
 
     if pago.fecha_vencimiento > hoy:
@@ -188,21 +201,32 @@ def enviar_alerta_inmediata_por_pago(pago):
         f"vence {pago.fecha_vencimiento} - {monto} {base}"
     )
 
+    hechos = set() if hechos is None else hechos
+
+    def paso(nombre, accion) -> bool:
+        if nombre in hechos:
+            return True
+        if not accion():
+            return False
+        hechos.add(nombre)
+        if registrar is not None:
+            registrar(nombre)
+        return True
+
     enviados = 0
 
     # Email inmediato
     if getattr(persona, "noti_email", False) and persona.correo:
-        _crear_alerta(pago, hoy, cuerpo)
-        if _send_email(persona.correo, asunto, cuerpo):
+        paso("alerta_email", lambda: _crear_alerta(pago, hoy, cuerpo))
+        if paso("email", lambda: _send_email(persona.correo, asunto, cuerpo)):
             enviados += 1
 
     # SMS inmediato
     if getattr(persona, "noti_sms", False) and getattr(persona, "telefono", None):
-        _crear_alerta(pago, hoy, sms_text)
+        paso("alerta_sms", lambda: _crear_alerta(pago, hoy, sms_text))
 
         if getattr(settings, "SMS_ENABLED", False):
-            ok, _ = send_sms(persona.telefono, sms_text)
-            if ok:
+            if paso("sms", lambda: send_sms(persona.telefono, sms_text)[0]):
                 enviados += 1
         else:
             # modo “seguro” por si olvidas apagar SMS_ENABLED en pruebas
@@ -212,3 +236,155 @@ def enviar_alerta_inmediata_por_pago(pago):
         return False, "Sin canales activos o SMS deshabilitado"
 
     return True, f"Notificaciones inmediatas enviadas: {enviados}"
+
+
+# ============================================================
+#  COLA DE ALERTAS INMEDIATAS (fuera del request)
+# ============================================================
+_worker = None
+_worker_lock = threading.Lock()
+_despertar = threading.Event()
+
+
+def encolar_alertas_inmediatas(pagos) -> int:
+    """
+    Encola la alerta inmediata de los pagos que la necesitan (por pagar y
+    con vencimiento <= hoy). La inserción se hace con on_commit: si la
+    transacción del préstamo se revierte no queda nada en cola.
+    Devuelve cuántos pagos se encolarán.
+    """
+    hoy = date.today()
+    ids = [
+        p.pk for p in pagos
+        if p.pk is not None and p.estado in POR_PAGAR and p.fecha_vencimiento <= hoy
+    ]
+    if not ids:
+        return 0
+
+    def insertar():
+        AlertaEnCola.objects.bulk_create([AlertaEnCola(pago_id=pk) for pk in ids])
+        if getattr(settings, 'ALERTAS_WORKER_HILO', True):
+            _iniciar_worker()
+            _despertar.set()
+
+    transaction.on_commit(insertar)
+    return len(ids)
+
+
+def _reclamar_abandonadas() -> int:
+    """
+    Devuelve a Pendiente las filas que llevan más de ALERTAS_COLA_RECLAMO
+    segundos en Procesando (el worker que las tomó murió o se reinició), o
+    las pasa a Error si ya agotaron los intentos. Devuelve cuántas reclamó.
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'ALERTAS_COLA_RECLAMO', 600))
+    reintentos = getattr(settings, 'ALERTAS_COLA_REINTENTOS', 3)
+    abandonadas = AlertaEnCola.objects.filter(
+        Q(tomada__lt=limite) | Q(tomada__isnull=True), estado='Procesando',
+    )
+    agotadas = abandonadas.filter(intentos__gte=reintentos).update(
+        estado='Error', error='Abandonada en Procesando',
+    )
+    return agotadas + abandonadas.update(estado='Pendiente')
+
+
+def _tomar_lote(limite: int, desde_id: int = 0) -> list:
+    """
+    Reserva hasta `limite` filas Pendiente (pasan a Procesando con la hora
+    de la reserva y un intento más) y las devuelve.
+    """
+    with transaction.atomic():
+        ids = list(
+            AlertaEnCola.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado='Pendiente', id_cola__gt=desde_id)
+            .order_by('id_cola')
+            .values_list('id_cola', flat=True)[:limite]
+        )
+        if not ids:
+            return []
+        AlertaEnCola.objects.filter(id_cola__in=ids, estado='Pendiente').update(
+            estado='Procesando', tomada=timezone.now(), intentos=F('intentos') + 1,
+        )
+    return list(
+        AlertaEnCola.objects
+        .filter(id_cola__in=ids, estado='Procesando')
+        .select_related('pago__prestamo__persona')
+        .order_by('id_cola')
+    )
+
+
+def _anotar_paso(item: AlertaEnCola):
+    def anotar(paso):
+        item.pasos = [*item.pasos, paso]
+        item.save(update_fields=['pasos'])
+    return anotar
+
+
+def procesar_cola_alertas(limite: int = 100) -> dict:
+    """
+    Despacha la cola hasta vaciarla, en lotes de `limite`. Primero reclama
+    las filas abandonadas en Procesando. Las filas que fallan vuelven a
+    Pendiente hasta ALERTAS_COLA_REINTENTOS intentos y luego quedan en
+    Error (los reintentos van en la siguiente pasada). Cada canal que ya
+    salió queda anotado en la fila (pasos) y el reintento no lo repite.
+    Devuelve {'procesadas': n, 'errores': m}.
+    """
+    reintentos = getattr(settings, 'ALERTAS_COLA_REINTENTOS', 3)
+    _reclamar_abandonadas()
+    procesadas = errores = 0
+    ultimo = 0
+    while True:
+        lote = _tomar_lote(limite, ultimo)
+        if not lote:
+            break
+        ultimo = lote[-1].id_cola
+        for item in lote:
+            try:
+                enviar_alerta_inmediata_por_pago(item.pago, set(item.pasos), _anotar_paso(item))
+            except Exception as e:
+                errores += 1
+                item.error = str(e)
+                item.estado = 'Pendiente' if item.intentos < reintentos else 'Error'
+            else:
+                procesadas += 1
+                item.error = ''
+                item.estado = 'Procesada'
+                item.procesada = timezone.now()
+            item.save(update_fields=['estado', 'error', 'procesada'])
+    return {'procesadas': procesadas, 'errores': errores}
+
+
+def _bucle_worker():
+    # la primera pasada es inmediata: drena lo que dejó un proceso anterior
+    intervalo = getattr(settings, 'ALERTAS_COLA_INTERVALO', 30)
+    while True:
+        close_old_connections()
+        try:
+            procesar_cola_alertas()
+        except Exception:
+            logger.exception("Error procesando la cola de alertas")
+        finally:
+            close_old_connections()
+        _despertar.wait(timeout=intervalo)
+        _despertar.clear()
+
+
+def _iniciar_worker():
+    """Hilo de fondo (uno por proceso) que drena la cola."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_bucle_worker, name='alertas-cola', daemon=True)
+            _worker.start()
+
+
+def iniciar_worker_al_arrancar(**kwargs):
+    """
+    Receptor de request_started (ver AlertasConfig.ready): en la primera
+    request del proceso web arranca el hilo, que drena lo que quedó en
+    cola sin esperar a que se encole una alerta nueva.
+    """
+    request_started.disconnect(iniciar_worker_al_arrancar)
+    if getattr(settings, 'ALERTAS_WORKER_HILO', True):
+        _iniciar_worker()
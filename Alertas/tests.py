@@ -1,3 +1,83 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from Pagos.models import Pago
+from Prestamos.tests import crear_persona, crear_prestamo
+from . import services
+from .models import Alerta, AlertaEnCola
+
+
+@override_settings(ALERTAS_WORKER_HILO=False, ALERTAS_COLA_REINTENTOS=3, ALERTAS_COLA_RECLAMO=600)
+class ColaAlertasTests(TestCase):
+    def setUp(self):
+        with mock.patch('Moneda.services._fetch_remote_tabla', side_effect=ValueError('caído')):
+            prestamo = crear_prestamo(crear_persona(), cuotas_totales=2)
+        self.pago = Pago.objects.filter(prestamo=prestamo).first()
+
+    def encolar(self, **kwargs):
+        return AlertaEnCola.objects.create(pago=self.pago, **kwargs)
+
+    def test_reserva_marca_hora_e_intento(self):
+        item = self.encolar()
+        lote = services._tomar_lote(10)
+        self.assertEqual([i.pk for i in lote], [item.pk])
+        item.refresh_from_db()
+        self.assertEqual((item.estado, item.intentos), ('Procesando', 1))
+        self.assertIsNotNone(item.tomada)
+
+    def test_reclama_filas_abandonadas_en_procesando(self):
+        viejo = timezone.now() - timedelta(hours=1)
+        abandonada = self.encolar(estado='Procesando', tomada=viejo, intentos=1)
+        agotada = self.encolar(estado='Procesando', tomada=viejo, intentos=3)
+        en_curso = self.encolar(estado='Procesando', tomada=timezone.now(), intentos=1)
+
+        with mock.patch.object(services, 'enviar_alerta_inmediata_por_pago') as enviar:
+            resumen = services.procesar_cola_alertas()
+
+        self.assertEqual(resumen, {'procesadas': 1, 'errores': 0})
+        enviar.assert_called_once()
+        estados = dict(AlertaEnCola.objects.values_list('pk', 'estado'))
+        self.assertEqual(estados[abandonada.pk], 'Procesada')
+        self.assertEqual(estados[agotada.pk], 'Error')
+        self.assertEqual(estados[en_curso.pk], 'Procesando')
+
+    def test_fallos_vuelven_a_pendiente_hasta_agotar_intentos(self):
+        item = self.encolar()
+        with mock.patch.object(services, 'enviar_alerta_inmediata_por_pago', side_effect=RuntimeError('smtp')):
+            for _ in range(3):
+                services.procesar_cola_alertas()
+        item.refresh_from_db()
+        self.assertEqual((item.estado, item.intentos), ('Error', 3))
+
+    @override_settings(SMS_ENABLED=True)
+    def test_reintento_no_repite_los_canales_que_ya_salieron(self):
+        persona = crear_persona(correo='luis@example.com', noti_email=True, noti_sms=True, telefono='+51999999999')
+        prestamo = crear_prestamo(
+            persona, moneda_prestamo='PEN', cuotas_totales=2, fecha_inicio=date.today() - timedelta(days=45),
+        )
+        item = AlertaEnCola.objects.create(pago=Pago.objects.get(prestamo=prestamo, numero_cuota=1))
+
+        with mock.patch.object(services, 'send_sms', side_effect=[RuntimeError('vonage'), (True, 'ok')]) as sms:
+            services.procesar_cola_alertas()
+            item.refresh_from_db()
+            self.assertEqual((item.estado, item.pasos), ('Pendiente', ['alerta_email', 'email', 'alerta_sms']))
+            services.procesar_cola_alertas()
+
+        item.refresh_from_db()
+        self.assertEqual(item.estado, 'Procesada')
+        self.assertEqual(sorted(item.pasos), ['alerta_email', 'alerta_sms', 'email', 'sms'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(sms.call_count, 2)
+        self.assertEqual(Alerta.objects.filter(pago=item.pago).count(), 2)
+
+    def test_el_worker_registra_el_error_con_logging(self):
+        with mock.patch.object(services, 'procesar_cola_alertas', side_effect=RuntimeError('bd caída')), \
+                mock.patch.object(services, 'close_old_connections'), \
+                mock.patch.object(services._despertar, 'wait', side_effect=SystemExit):
+            with self.assertLogs('Alertas.services', level='ERROR') as logs, self.assertRaises(SystemExit):
+                services._bucle_worker()
+        self.assertIn('bd caída', logs.output[0])
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MonedaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Moneda'
+
+    def ready(self):
+        # invalida el cache de tipos de cambio al escribir TipoCambio
+        from . import signals  # noqa
@@ -0,0 +1,8 @@
+from baseParcial.cache import CacheTTL
+
+
+class TasaCache(CacheTTL):
+    """
+    Cache LRU con TTL de tipos de cambio.
+    Claves: (base, destino, fecha).
+    """
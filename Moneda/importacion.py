@@ -0,0 +1,129 @@
+# Moneda/importacion.py
+import csv
+import gzip
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import groupby
+from xml.etree.ElementTree import iterparse
+
+from .models import TipoCambio
+from .services import MONEDAS_SOPORTADAS, SEIS_DECIMALES, _pares_desde_tabla, _invalidar_desde
+
+
+def _abrir(ruta: str, binario: bool):
+    """Abre el archivo (o su versión .gz) para leerlo en streaming."""
+    if ruta.endswith('.gz'):
+        if binario:
+            return gzip.open(ruta, 'rb')
+        return gzip.open(ruta, 'rt', newline='', encoding='utf-8')
+    if binario:
+        return open(ruta, 'rb')
+    return open(ruta, 'r', newline='', encoding='utf-8')
+
+
+def leer_csv(archivo):
+    """
+    Lee un CSV con cabecera fecha,base,destino,valor (fecha en YYYY-MM-DD)
+    fila por fila. Genera tuplas (fecha, base, destino, valor).
+    """
+    for n, fila in enumerate(csv.DictReader(archivo), start=2):
+        try:
+            yield (
+                date.fromisoformat(fila['fecha'].strip()),
+                fila['base'].strip().upper(),
+                fila['destino'].strip().upper(),
+                Decimal(fila['valor'].strip()),
+            )
+        except (KeyError, AttributeError, ValueError, InvalidOperation):
+            raise ValueError(f"Fila {n} inválida en el CSV: {fila}")
+
+
+def leer_ecb_xml(archivo):
+    """
+    Lee el XML de referencia del BCE (eurofxref-daily / eurofxref-hist) con
+    iterparse, liberando cada día apenas se procesa. Genera tuplas
+    (fecha, 'EUR', moneda, valor).
+    """
+    fecha = None
+    for evento, elem in iterparse(archivo, events=('start', 'end')):
+        if not elem.tag.endswith('Cube'):
+            continue
+        if evento == 'start' and 'time' in elem.attrib:
+            fecha = date.fromisoformat(elem.attrib['time'])
+        elif evento == 'end' and 'currency' in elem.attrib and fecha is not None:
+            yield fecha, 'EUR', elem.attrib['currency'].upper(), Decimal(elem.attrib['rate'])
+        elif evento == 'end' and 'time' in elem.attrib:
+            elem.clear()
+
+
+def importar_tasas(filas, batch_size: int = 1000, derivar: bool = True) -> dict:
+    """
+    Upsert en bloques de las tasas leídas. Con derivar=True, por cada
+    (fecha, base) se calculan además los pares inversos y cruzados entre
+    las monedas soportadas, también con upsert: reimportar con tasas
+    corregidas corrige las derivadas. Dentro del mismo archivo una tasa
+    real tiene prioridad sobre la derivada del mismo par.
+    Devuelve {'filas': n, 'segundos': s}.
+    """
+    inicio = time.monotonic()
+    total = 0
+    fecha_min = None
+    directas, derivadas = {}, {}
+    # pares reales ya vistos entre monedas soportadas (los únicos que una
+    # derivada podría pisar), para todo el archivo y no solo el bloque
+    reales = set()
+
+    def volcar():
+        TipoCambio.objects.bulk_create(
+            [TipoCambio(fecha=f, base=b, destino=d, valor=v) for (f, b, d), v in directas.items()],
+            update_conflicts=True,
+            unique_fields=['fecha', 'base', 'destino'],
+            update_fields=['valor'],
+        )
+        TipoCambio.objects.bulk_create(
+            [
+                TipoCambio(fecha=f, base=b, destino=d, valor=v)
+                for (f, b, d), v in derivadas.items()
+                if (f, b, d) not in reales
+            ],
+            update_conflicts=True,
+            unique_fields=['fecha', 'base', 'destino'],
+            update_fields=['valor'],
+        )
+        directas.clear()
+        derivadas.clear()
+
+    for (fecha, base), grupo in groupby(filas, key=lambda fila: (fila[0], fila[1])):
+        tabla = {destino: valor for _, _, destino, valor in grupo}
+        for destino, valor in tabla.items():
+            directas[(fecha, base, destino)] = valor.quantize(SEIS_DECIMALES)
+            if derivar and base in MONEDAS_SOPORTADAS and destino in MONEDAS_SOPORTADAS:
+                reales.add((fecha, base, destino))
+        if derivar:
+            tabla[base] = Decimal('1')
+            for (b, d), valor in _pares_desde_tabla(tabla, MONEDAS_SOPORTADAS).items():
+                derivadas[(fecha, b, d)] = valor
+
+        fecha_min = fecha if fecha_min is None else min(fecha_min, fecha)
+        if len(directas) + len(derivadas) >= batch_size:
+            total += len(directas) + len(derivadas)
+            volcar()
+
+    if directas or derivadas:
+        total += len(directas) + len(derivadas)
+        volcar()
+    if fecha_min is not None:
+        _invalidar_desde(fecha_min)
+    return {'filas': total, 'segundos': time.monotonic() - inicio}
+
+
+def importar_archivo(ruta: str, formato: str | None = None, batch_size: int = 1000, derivar: bool = True) -> dict:
+    """Importa un archivo CSV o XML del BCE (formato deducido por la extensión)."""
+    if formato is None:
+        formato = 'ecb' if '.xml' in ruta.lower() else 'csv'
+    if formato == 'ecb':
+        with _abrir(ruta, binario=True) as archivo:
+            return importar_tasas(leer_ecb_xml(archivo), batch_size=batch_size, derivar=derivar)
+    with _abrir(ruta, binario=False) as archivo:
+        return importar_tasas(leer_csv(archivo), batch_size=batch_size, derivar=derivar)
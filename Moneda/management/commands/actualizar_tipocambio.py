@@ -1,10 +1,13 @@
 from datetime import date
 from django.core.management.base import BaseCommand
-from Moneda.services import obtener_tipo_cambio
+from Moneda.services import precargar_tasas
 
 class Command(BaseCommand):
-    help = "Actualiza/precarga el tipo de cambio USD→PEN del día actual."
+    help = "Actualiza/precarga los tipos de cambio del día actual (todos los pares soportados)."
 
     def handle(self, *args, **options):
-        valor = obtener_tipo_cambio(base="USD", destino="PEN", para_fecha=date.today())
-        self.stdout.write(self.style.SUCCESS(f"Tipo de cambio USD→PEN guardado: {valor}"))
+        pares = precargar_tasas(para_fecha=date.today())
+        self.stdout.write(self.style.SUCCESS(
+            f"Tipo de cambio USD→PEN guardado: {pares.get(('USD', 'PEN'))} "
+            f"({len(pares)} pares con una sola consulta al proveedor)"
+        ))
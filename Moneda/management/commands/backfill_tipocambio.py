@@ -0,0 +1,66 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from Moneda.proveedores import soporta_serie
+from Moneda.services import backfill_tipocambio, MONEDAS_SOPORTADAS, MONEDA_PIVOTE
+
+
+def _parse_fecha(s: str) -> date:
+    try:
+        return date.fromisoformat(s)
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {s} (usa YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga el histórico de tipos de cambio de un rango de fechas (una serie por par). "
+        "El proveedor de series (BCE) no publica PEN: esos pares se omiten; su histórico "
+        "se carga con importar_tipocambio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='Fecha inicial YYYY-MM-DD')
+        parser.add_argument('--hasta', default=None, help='Fecha final YYYY-MM-DD (por defecto hoy)')
+        parser.add_argument(
+            '--pares', default=None,
+            help='Pares BASE:DESTINO separados por coma (por defecto pivote contra cada moneda '
+                 'soportada que publique el proveedor de series)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Filas por bulk_create')
+
+    def handle(self, *args, **options):
+        desde = _parse_fecha(options['desde'])
+        hasta = _parse_fecha(options['hasta']) if options['hasta'] else date.today()
+        if desde > hasta:
+            raise CommandError("--desde no puede ser posterior a --hasta")
+
+        if options['pares']:
+            try:
+                pares = []
+                for item in options['pares'].split(','):
+                    if item.strip():
+                        base, destino = item.strip().upper().split(':')
+                        pares.append((base, destino))
+            except ValueError:
+                raise CommandError("Formato de --pares inválido (ej.: USD:PEN,USD:EUR)")
+        else:
+            pares = [
+                (MONEDA_PIVOTE, m) for m in MONEDAS_SOPORTADAS
+                if m != MONEDA_PIVOTE and soporta_serie(MONEDA_PIVOTE, m)
+            ]
+            if not pares:
+                raise CommandError("Ninguna moneda soportada tiene serie histórica en el proveedor")
+
+        resumen = backfill_tipocambio(pares, desde, hasta, chunk_size=options['chunk_size'])
+
+        for base, destino in resumen['omitidos']:
+            self.stderr.write(self.style.WARNING(
+                f"{base}->{destino}: omitido, el proveedor de series no lo publica (usa importar_tipocambio)"
+            ))
+        for (base, destino), error in resumen['errores'].items():
+            self.stderr.write(self.style.WARNING(f"{base}->{destino}: {error}"))
+        segundos = resumen['segundos'] or 1e-9
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill {desde}..{hasta}: {resumen['filas']} filas en {segundos:.2f}s "
+            f"({resumen['filas'] / segundos:.0f} filas/s)"
+        ))
@@ -0,0 +1,34 @@
+from decimal import InvalidOperation
+from xml.etree.ElementTree import ParseError
+
+from django.core.management.base import BaseCommand, CommandError
+from Moneda.importacion import importar_archivo
+
+
+class Command(BaseCommand):
+    help = "Importa tipos de cambio desde un archivo CSV (fecha,base,destino,valor) o XML del BCE (eurofxref)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo (.csv, .xml, opcionalmente .gz)')
+        parser.add_argument('--formato', choices=['csv', 'ecb'], default=None,
+                            help='Formato del archivo (por defecto según la extensión)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Filas por upsert')
+        parser.add_argument('--sin-derivar', action='store_true',
+                            help='No calcular pares inversos/cruzados entre monedas soportadas')
+
+    def handle(self, *args, **options):
+        try:
+            resumen = importar_archivo(
+                options['archivo'],
+                formato=options['formato'],
+                batch_size=options['batch_size'],
+                derivar=not options['sin_derivar'],
+            )
+        except (OSError, ValueError, ParseError, InvalidOperation, KeyError) as e:
+            # archivo ilegible, XML mal formado o tasa que no es número
+            raise CommandError(f"No se pudo importar {options['archivo']}: {e!r}")
+
+        segundos = resumen['segundos'] or 1e-9
+        self.stdout.write(self.style.SUCCESS(
+            f"Importadas {resumen['filas']} filas en {segundos:.2f}s ({resumen['filas'] / segundos:.0f} filas/s)"
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Moneda', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tipocambio',
+            index=models.Index(fields=['base', 'destino', '-fecha'], name='tipocambio_par_fecha_idx'),
+        ),
+    ]
@@ -13,6 +13,10 @@ class TipoCambio(models.Model):
 
     class Meta:
         unique_together = ('fecha', 'base', 'destino')
+        indexes = [
+            # consulta "as-of": última tasa del par en o antes de una fecha
+            models.Index(fields=['base', 'destino', '-fecha'], name='tipocambio_par_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.fecha} {self.base}->{self.destino} = {self.valor}"
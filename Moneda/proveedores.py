@@ -0,0 +1,406 @@
+# Moneda/proveedores.py
+import threading
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from decimal import Decimal
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+# URLs por defecto; se pueden sobreescribir con settings.TIPOCAMBIO_URLS
+# (p.ej. para apuntar a un servidor stub local en pruebas)
+URLS = {
+    'exchangerate_host': "https://api.exchangerate.host/latest",
+    'frankfurter': "https://api.frankfurter.app/latest",
+    'open_erapi': "https://open.er-api.com/v6/latest",
+    # series de tiempo: {url}/{desde}..{hasta}?from=USD&to=EUR
+    'frankfurter_serie': "https://api.frankfurter.app",
+}
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+_metricas = {}
+_metricas_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un proveedor que viene fallando:
+      - cerrado: se llama normalmente; tras `umbral` fallos seguidos se abre.
+      - abierto: no se llama hasta que pase `enfriamiento` (segundos).
+      - semiabierto: se deja pasar una sola sonda; si responde se cierra,
+        si falla vuelve a abrirse.
+    """
+
+    def __init__(self, umbral: int = 3, enfriamiento: float = 60):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.estado = 'cerrado'
+        self.fallos = 0
+        self._abierto_desde = 0.0
+        self._sonda_en_curso = False
+        self._lock = threading.Lock()
+
+    def disponible(self) -> bool:
+        """Como permite(), pero sin reservar la sonda del estado semiabierto."""
+        with self._lock:
+            if self.estado == 'abierto':
+                return time.monotonic() - self._abierto_desde >= self.enfriamiento
+            return not (self.estado == 'semiabierto' and self._sonda_en_curso)
+
+    def permite(self) -> bool:
+        with self._lock:
+            if self.estado == 'cerrado':
+                return True
+            if self.estado == 'abierto':
+                if time.monotonic() - self._abierto_desde < self.enfriamiento:
+                    return False
+                self.estado = 'semiabierto'
+                self._sonda_en_curso = False
+            if self._sonda_en_curso:
+                return False
+            self._sonda_en_curso = True
+            return True
+
+    def exito(self):
+        with self._lock:
+            self.estado = 'cerrado'
+            self.fallos = 0
+            self._sonda_en_curso = False
+
+    def cancelada(self):
+        """La llamada se abortó sin resultado: libera la sonda sin contar fallo."""
+        with self._lock:
+            self._sonda_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self._sonda_en_curso = False
+            if self.estado == 'semiabierto' or self.fallos >= self.umbral:
+                self.estado = 'abierto'
+                self._abierto_desde = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker(nombre: str) -> CircuitBreaker:
+    with _breakers_lock:
+        cb = _breakers.get(nombre)
+        if cb is None:
+            cb = _breakers[nombre] = CircuitBreaker(
+                umbral=getattr(settings, 'TIPOCAMBIO_CB_FALLOS', 3),
+                enfriamiento=getattr(settings, 'TIPOCAMBIO_CB_ENFRIAMIENTO', 60),
+            )
+        return cb
+
+
+def estado_circuitos() -> dict:
+    """Estado del circuit breaker de cada proveedor ({nombre: (estado, fallos)})."""
+    return {nombre: (_breaker(nombre).estado, _breaker(nombre).fallos) for nombre, _ in PROVEEDORES}
+
+
+def _url(nombre: str) -> str:
+    return getattr(settings, 'TIPOCAMBIO_URLS', {}).get(nombre, URLS[nombre])
+
+
+def _timeout() -> float:
+    return getattr(settings, 'TIPOCAMBIO_FETCH_TIMEOUT', 8)
+
+
+def _sesion(nombre: str) -> requests.Session:
+    """
+    Sesión keep-alive por proveedor y por hilo (requests.Session no es
+    thread-safe). Los hilos del pool reutilizan sus conexiones.
+    """
+    sesiones = getattr(_local, 'sesiones', None)
+    if sesiones is None:
+        sesiones = _local.sesiones = {}
+    s = sesiones.get(nombre)
+    if s is None:
+        s = requests.Session()
+        s.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        s.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        sesiones[nombre] = s
+    return s
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TIPOCAMBIO_FETCH_WORKERS', 6),
+                thread_name_prefix='tipocambio',
+            )
+        return _executor
+
+
+def tabla_desde_json(data: dict) -> dict:
+    """{'rates': {'PEN': 3.7, ...}} -> {'PEN': Decimal('3.7'), ...}"""
+    return {
+        moneda.upper(): Decimal(str(rate))
+        for moneda, rate in (data.get("rates") or {}).items()
+        if rate is not None
+    }
+
+
+def peticion(nombre: str, base: str) -> tuple[str, dict]:
+    """URL y parámetros de la consulta de tabla completa de cada proveedor."""
+    if nombre == 'exchangerate_host':
+        return _url(nombre), {"base": base}
+    if nombre == 'frankfurter':
+        return _url(nombre), {"from": base}
+    # open.er-api devuelve todas las tasas desde "base" en la ruta
+    return f"{_url(nombre)}/{base}", {}
+
+
+def _fetch(nombre: str, base: str, timeout: float) -> dict:
+    url, params = peticion(nombre, base)
+    r = _sesion(nombre).get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    return tabla_desde_json(r.json())
+
+
+def _fetch_exchangerate_host(base: str, timeout: float) -> dict:
+    return _fetch('exchangerate_host', base, timeout)
+
+
+def _fetch_frankfurter(base: str, timeout: float) -> dict:
+    return _fetch('frankfurter', base, timeout)
+
+
+def _fetch_open_erapi(base: str, timeout: float) -> dict:
+    return _fetch('open_erapi', base, timeout)
+
+
+PROVEEDORES = (
+    ('exchangerate_host', _fetch_exchangerate_host),
+    ('frankfurter', _fetch_frankfurter),
+    ('open_erapi', _fetch_open_erapi),
+)
+
+# monedas que publica frankfurter (tasas de referencia del BCE), tanto en
+# /latest como en el endpoint de rangos. PEN no está: su histórico se carga
+# con importar_tipocambio o se acumula con actualizar_tipocambio.
+MONEDAS_SERIE = frozenset({
+    'AUD', 'BGN', 'BRL', 'CAD', 'CHF', 'CNY', 'CZK', 'DKK', 'EUR', 'GBP',
+    'HKD', 'HUF', 'IDR', 'ILS', 'INR', 'ISK', 'JPY', 'KRW', 'MXN', 'MYR',
+    'NOK', 'NZD', 'PHP', 'PLN', 'RON', 'SEK', 'SGD', 'THB', 'TRY', 'USD', 'ZAR',
+})
+
+# monedas que publica cada proveedor de tablas; los que no figuran publican
+# todas. Se sobreescribe con settings.TIPOCAMBIO_MONEDAS_PROVEEDOR.
+MONEDAS_PROVEEDOR = {'frankfurter': MONEDAS_SERIE}
+
+
+def publica(nombre: str, monedas) -> bool:
+    """True si el proveedor publica todas las `monedas` (ver MONEDAS_PROVEEDOR)."""
+    limite = getattr(settings, 'TIPOCAMBIO_MONEDAS_PROVEEDOR', MONEDAS_PROVEEDOR).get(nombre)
+    return limite is None or {m.upper() for m in monedas} <= limite
+
+
+def _registrar(nombre: str, inicio: float, ok: bool):
+    latencia_ms = (time.monotonic() - inicio) * 1000
+    with _metricas_lock:
+        m = _metricas.setdefault(nombre, {
+            'llamadas': 0, 'errores': 0, 'latencia_total_ms': 0.0, 'ultima_latencia_ms': None,
+        })
+        m['llamadas'] += 1
+        m['latencia_total_ms'] += latencia_ms
+        m['ultima_latencia_ms'] = latencia_ms
+        if not ok:
+            m['errores'] += 1
+
+
+def metricas() -> dict:
+    """Llamadas, errores y latencia (total/última/promedio, en ms) por proveedor."""
+    with _metricas_lock:
+        out = {}
+        for nombre, m in _metricas.items():
+            out[nombre] = dict(m, latencia_promedio_ms=m['latencia_total_ms'] / m['llamadas'])
+        return out
+
+
+# Una consulta a un proveedor, compartida con Moneda.services_async:
+# iniciar_consulta() -> llamada HTTP -> terminar_consulta() (o
+# cancelar_consulta() si se abortó sin resultado).
+
+def iniciar_consulta(nombre: str) -> float | None:
+    """Instante de inicio si el circuito del proveedor deja pasar la llamada; None si no."""
+    if not _breaker(nombre).permite():
+        return None
+    return time.monotonic()
+
+
+def terminar_consulta(nombre: str, inicio: float, tabla, requeridas: set) -> dict:
+    """
+    Registra el resultado en métricas y circuito. Solo es fallo del
+    proveedor un error de red, HTTP o de formato (tabla=None o sin tasas);
+    una tabla válida a la que le faltan monedas no sirve para esta consulta
+    pero no abre el circuito. Devuelve la tabla, o {} si no sirve.
+    """
+    ok = bool(tabla)
+    _registrar(nombre, inicio, ok=ok)
+    if ok:
+        _breaker(nombre).exito()
+    else:
+        _breaker(nombre).fallo()
+    return tabla if ok and requeridas.issubset(tabla) else {}
+
+
+def cancelar_consulta(nombre: str):
+    """La llamada se abortó sin resultado: no cuenta como fallo del proveedor."""
+    _breaker(nombre).cancelada()
+
+
+def _consultar(nombre: str, fn, base: str, requeridas: set, timeout: float) -> dict:
+    """Llama a un proveedor; devuelve {} si falla o si le faltan monedas."""
+    inicio = iniciar_consulta(nombre)
+    if inicio is None:
+        return {}
+    try:
+        tabla = fn(base, timeout)
+    except Exception:
+        tabla = None
+    return terminar_consulta(nombre, inicio, tabla, requeridas)
+
+
+def candidatos(base: str, requeridas) -> tuple[set, list]:
+    """
+    Monedas requeridas (sin la base) y proveedores que las publican y cuyo
+    circuito deja pasar la llamada (cerrado o sonda). Lanza ValueError en
+    modo offline, si ninguno publica las monedas o si todos los que las
+    publican tienen el circuito abierto.
+    """
+    if getattr(settings, 'TIPOCAMBIO_OFFLINE', False):
+        # nodos sin internet: solo se usan las tasas importadas/guardadas
+        raise ValueError("Modo offline: no se consultan proveedores de tipo de cambio")
+    requeridas = {m for m in requeridas if m != base}
+    publican = [(nombre, fn) for nombre, fn in PROVEEDORES if publica(nombre, requeridas | {base})]
+    if not publican:
+        raise ValueError(f"Ningún proveedor publica {base}->{', '.join(sorted(requeridas))}")
+    disponibles = [(nombre, fn) for nombre, fn in publican if _breaker(nombre).disponible()]
+    if not disponibles:
+        raise ValueError("Proveedores de tipo de cambio no disponibles (circuitos abiertos)")
+    return requeridas, disponibles
+
+
+def sin_tabla(base: str, requeridas: set) -> ValueError:
+    """Error cuando ningún proveedor devolvió una tabla válida a tiempo."""
+    return ValueError(
+        f"No se obtuvo la tabla de tasas desde {base} "
+        f"({', '.join(sorted(requeridas))}) de los proveedores públicos"
+    )
+
+
+def _en_cadena(base: str, requeridas: set, proveedores: list) -> dict:
+    for nombre, fn in proveedores:
+        tabla = _consultar(nombre, fn, base, requeridas, _timeout())
+        if tabla:
+            return tabla
+    return {}
+
+
+def _en_paralelo(base: str, requeridas: set, proveedores: list) -> dict:
+    """
+    Carrera entre proveedores en el pool: se lanza el siguiente proveedor
+    cada TIPOCAMBIO_HEDGE_DELAY segundos (0 = todos a la vez) y gana la
+    primera respuesta válida. Los que aún no arrancaron se cancelan; los que
+    ya están en curso no se pueden interrumpir, así que cada uno lleva como
+    timeout HTTP lo que le queda a la carrera: un perdedor lento ocupa su
+    hilo del pool a lo más hasta el límite de la carrera, no más allá.
+    """
+    executor = _get_executor()
+    retraso = getattr(settings, 'TIPOCAMBIO_HEDGE_DELAY', 0)
+    limite = time.monotonic() + _timeout()
+    por_lanzar = list(proveedores)
+    pendientes = set()
+
+    try:
+        while por_lanzar or pendientes:
+            if por_lanzar:
+                nombre, fn = por_lanzar.pop(0)
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                pendientes.add(executor.submit(_consultar, nombre, fn, base, requeridas, restante))
+                if por_lanzar and retraso <= 0:
+                    continue
+            espera = limite - time.monotonic()
+            if por_lanzar:
+                espera = min(espera, retraso)
+            if espera <= 0:
+                break
+            hechos, pendientes = wait(pendientes, timeout=espera, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                tabla = futuro.result()
+                if tabla:
+                    return tabla
+    finally:
+        for futuro in pendientes:
+            futuro.cancel()
+    return {}
+
+
+def obtener_tabla(base: str, requeridas=()) -> dict:
+    """
+    Tabla completa de tasas desde `base` ({moneda: Decimal}) que incluya
+    todas las monedas `requeridas`. Modo según TIPOCAMBIO_FETCH_MODO:
+    'paralelo' (carrera entre proveedores) o 'secuencial' (uno tras otro).
+    Lanza ValueError si ningún proveedor responde a tiempo, o de inmediato
+    en modo offline o si todos tienen el circuito abierto.
+    """
+    requeridas, proveedores = candidatos(base, requeridas)
+    modo = getattr(settings, 'TIPOCAMBIO_FETCH_MODO', 'paralelo')
+    if modo == 'paralelo':
+        tabla = _en_paralelo(base, requeridas, proveedores)
+    else:
+        tabla = _en_cadena(base, requeridas, proveedores)
+    if not tabla:
+        raise sin_tabla(base, requeridas)
+    tabla = dict(tabla)
+    tabla[base] = Decimal('1')
+    return tabla
+
+
+def soporta_serie(base: str, destino: str) -> bool:
+    """True si el endpoint de rangos publica el par (ver MONEDAS_SERIE)."""
+    monedas = getattr(settings, 'TIPOCAMBIO_SERIE_MONEDAS', MONEDAS_SERIE)
+    return base.upper() in monedas and destino.upper() in monedas
+
+
+def obtener_serie(base: str, destino: str, desde: date, hasta: date) -> dict:
+    """
+    Serie histórica base->destino entre dos fechas con una sola llamada
+    (endpoint de rangos de frankfurter). Devuelve {fecha: Decimal}; solo
+    trae días hábiles. Lanza ValueError si el proveedor falla o si no
+    publica el par (sin llamarlo).
+    """
+    if not soporta_serie(base, destino):
+        raise ValueError(f"El proveedor de series no publica {base}->{destino}")
+    inicio = time.monotonic()
+    try:
+        r = _sesion('frankfurter_serie').get(
+            f"{_url('frankfurter_serie')}/{desde.isoformat()}..{hasta.isoformat()}",
+            params={"from": base, "to": destino},
+            timeout=getattr(settings, 'TIPOCAMBIO_SERIE_TIMEOUT', 30),
+        )
+        r.raise_for_status()
+        data = r.json()
+    except Exception as e:
+        _registrar('frankfurter_serie', inicio, ok=False)
+        raise ValueError(f"No se obtuvo la serie {base}->{destino}: {e}") from e
+    _registrar('frankfurter_serie', inicio, ok=True)
+
+    serie = {}
+    for dia, tasas in (data.get("rates") or {}).items():
+        rate = (tasas or {}).get(destino)
+        if rate is not None:
+            serie[date.fromisoformat(dia)] = Decimal(str(rate))
+    return serie
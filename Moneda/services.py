@@ -1,73 +1,387 @@
+import time
+from bisect import bisect_right
 from datetime import date
 from decimal import Decimal
-import requests
-from django.db import transaction
+from django.conf import settings
+from django.db.models import Q
+from . import proveedores
+from .cache import TasaCache
 from .models import TipoCambio
 
-EXCHANGERATE_HOST = "https://api.exchangerate.host/latest"   
-FRANKFURTER = "https://api.frankfurter.app/latest"           
-OPEN_ERAPI = "https://open.er-api.com/v6/latest"             
-
-def _fetch_exchangerate_host(base: str, destino: str):
-    try:
-        r = requests.get(EXCHANGERATE_HOST, params={"base": base, "symbols": destino}, timeout=8)
-        r.raise_for_status()
-        data = r.json()
-        rate = data.get("rates", {}).get(destino)
-        return Decimal(str(rate)) if rate is not None else None
-    except Exception:
-        return None
+# monedas que manejamos; con una tabla de un proveedor se derivan todos los pares
+MONEDAS_SOPORTADAS = tuple(getattr(settings, 'TIPOCAMBIO_MONEDAS', ('PEN', 'USD', 'EUR')))
+# base con la que se pide la tabla completa al proveedor
+MONEDA_PIVOTE = getattr(settings, 'TIPOCAMBIO_PIVOTE', 'USD')
+
+SEIS_DECIMALES = Decimal('0.000001')
+
+# cache compartido por todas las requests del worker (ver Moneda/signals.py)
+tasas_cache = TasaCache(
+    maxsize=getattr(settings, 'TIPOCAMBIO_CACHE_MAXSIZE', 512),
+    ttl=getattr(settings, 'TIPOCAMBIO_CACHE_TTL', 3600),
+)
+# cache negativo: claves que no se pudieron obtener hace poco -> (error, respaldo)
+fallos_cache = TasaCache(
+    maxsize=getattr(settings, 'TIPOCAMBIO_CACHE_MAXSIZE', 512),
+    ttl=getattr(settings, 'TIPOCAMBIO_NEGATIVO_TTL', 60),
+)
+
+
+def _fetch_remote_tabla(base: str, requeridas=()) -> dict:
+    # en modo offline obtener_tabla lanza ValueError sin consultar proveedores
+    return proveedores.obtener_tabla(base, requeridas)
+
+def _fetch_remote_rate(base: str, destino: str) -> Decimal:
+    return _fetch_remote_tabla(base, {destino})[destino]
+
+
+def _pares_desde_tabla(tabla: dict, monedas=MONEDAS_SOPORTADAS) -> dict:
+    """
+    Con una tabla base->X calcula localmente todos los pares entre `monedas`
+    (directos, inversos y cruzados): a->b = tabla[b] / tabla[a].
+    """
+    disponibles = [m for m in monedas if tabla.get(m)]
+    return {
+        (a, b): (tabla[b] / tabla[a]).quantize(SEIS_DECIMALES)
+        for a in disponibles
+        for b in disponibles
+        if a != b
+    }
 
-def _fetch_frankfurter(base: str, destino: str):
-    try:
-        r = requests.get(FRANKFURTER, params={"from": base, "to": destino}, timeout=8)
-        r.raise_for_status()
-        data = r.json()
-        rate = data.get("rates", {}).get(destino)
-        return Decimal(str(rate)) if rate is not None else None
-    except Exception:
+def _derivar_tasa(base: str, destino: str, filas: dict):
+    """
+    Busca base->destino entre las filas de una misma fecha ({(b, d): valor}):
+    directa, inversa (1 / destino->base) o cruzada a través de otra moneda.
+    """
+    def directa_o_inversa(a, b):
+        if (a, b) in filas:
+            return Decimal(filas[(a, b)])
+        if filas.get((b, a)):
+            return Decimal('1') / Decimal(filas[(b, a)])
         return None
 
-def _fetch_open_erapi(base: str, destino: str):
-    try:
-        # esta API devuelve todas las tasas desde "base"
-        r = requests.get(f"{OPEN_ERAPI}/{base}", timeout=8)
-        r.raise_for_status()
-        data = r.json()
-        rate = data.get("rates", {}).get(destino)
-        return Decimal(str(rate)) if rate is not None else None
-    except Exception:
+    tasa = directa_o_inversa(base, destino)
+    if tasa is None:
+        for pivote in MONEDAS_SOPORTADAS:
+            if pivote in (base, destino):
+                continue
+            t1 = directa_o_inversa(base, pivote)
+            t2 = directa_o_inversa(pivote, destino)
+            if t1 is not None and t2 is not None:
+                tasa = t1 * t2
+                break
+    return tasa.quantize(SEIS_DECIMALES) if tasa is not None else None
+
+def _guardar_pares(fechas, pares: dict):
+    """Persiste todos los pares para las fechas dadas en un solo bulk_create."""
+    fechas = list(fechas)
+    TipoCambio.objects.bulk_create(
+        [
+            TipoCambio(fecha=fecha, base=b, destino=d, valor=valor)
+            for fecha in fechas
+            for (b, d), valor in pares.items()
+        ],
+        ignore_conflicts=True,
+    )
+    for fecha in fechas:
+        for (b, d), valor in pares.items():
+            tasas_cache.set((b, d, fecha), valor)
+
+
+def fecha_efectiva(para_fecha: date | None = None) -> date:
+    """
+    Fecha cuya tasa se usa: las fechas futuras (p.ej. vencimientos de
+    cuotas) y None usan la tasa de hoy.
+    """
+    hoy = date.today()
+    if para_fecha is None or para_fecha > hoy:
+        return hoy
+    return para_fecha
+
+
+def _filas_asof(claves) -> dict:
+    """
+    Carga las filas necesarias para resolver "la última tasa en o antes de"
+    cada fecha pedida: una consulta por la fecha ancla (la última fecha
+    guardada <= la menor fecha pedida) y otra por el rango [ancla, mayor fecha].
+    Devuelve {fecha: {(base, destino): valor}}.
+    """
+    monedas = set(MONEDAS_SOPORTADAS)
+    for base, destino, _ in claves:
+        monedas.update((base, destino))
+    fechas = [f for _, _, f in claves]
+    qs = TipoCambio.objects.filter(base__in=monedas, destino__in=monedas)
+
+    ancla = (
+        qs.filter(fecha__lte=min(fechas))
+        .order_by('-fecha')
+        .values_list('fecha', flat=True)
+        .first()
+    )
+    filas = qs.filter(
+        fecha__gte=ancla or min(fechas),
+        fecha__lte=max(fechas),
+    ).values_list('base', 'destino', 'fecha', 'valor')
+
+    por_fecha = {}
+    for base, destino, fecha, valor in filas:
+        por_fecha.setdefault(fecha, {})[(base, destino)] = valor
+    return por_fecha
+
+
+def _ultima_tasa_conocida(base: str, destino: str):
+    """
+    Respaldo cuando los proveedores no responden: la tasa más reciente
+    guardada para el par (o su inversa). None si no hay ninguna o si
+    TIPOCAMBIO_RESPALDO_ULTIMA está desactivado.
+    """
+    if not getattr(settings, 'TIPOCAMBIO_RESPALDO_ULTIMA', True):
         return None
+    fila = (
+        TipoCambio.objects
+        .filter(Q(base=base, destino=destino) | Q(base=destino, destino=base))
+        .order_by('-fecha')
+        .values_list('base', 'valor')
+        .first()
+    )
+    if fila is None:
+        return None
+    fila_base, valor = fila
+    if fila_base == base:
+        return valor
+    return (Decimal('1') / valor).quantize(SEIS_DECIMALES) if valor else None
+
+
+def resolver_locales(claves, sin_red: bool = False) -> tuple[dict, dict, set]:
+    """
+    Primera parte de la resolución de claves (base, destino, fecha), sin
+    red: cache -> última tasa guardada en o antes de cada fecha (con
+    derivación local de pares inversos y cruzados) -> cache negativo (las
+    claves que fallaron hace poco responden con su respaldo o su error).
+    Las fechas deben venir ya pasadas por fecha_efectiva().
+    Devuelve (tasas, errores, faltantes); las faltantes necesitan la tabla
+    remota (ver resolver_con_tabla). Con sin_red=True no se mira el cache
+    negativo y lo que falte queda como error.
+    La comparten _resolver_tasas y Moneda.services_async.
+    """
+    tasas, errores = {}, {}
+    hoy = date.today()
+    faltantes = set()
+    for clave in claves:
+        valor = tasas_cache.get(clave)
+        if valor is not None:
+            tasas[clave] = valor
+        else:
+            faltantes.add(clave)
+
+    if faltantes:
+        por_fecha = _filas_asof(faltantes)
+        fechas_disponibles = sorted(por_fecha)
+        tolerancia = getattr(settings, 'TIPOCAMBIO_MAX_ANTIGUEDAD_DIAS', 7)
+
+        for clave in list(faltantes):
+            base, destino, fecha = clave
+            # fechas guardadas <= fecha pedida, de la más reciente hacia atrás
+            idx = bisect_right(fechas_disponibles, fecha)
+            for fecha_fila in reversed(fechas_disponibles[:idx]):
+                # hoy exige la tasa del día; el pasado acepta unos días de hueco
+                if (fecha - fecha_fila).days > (0 if fecha >= hoy else tolerancia):
+                    break
+                valor = _derivar_tasa(base, destino, por_fecha[fecha_fila])
+                if valor is not None:
+                    tasas[clave] = valor
+                    tasas_cache.set(clave, valor)
+                    faltantes.discard(clave)
+                    break
+
+    if sin_red:
+        for clave in faltantes:
+            errores[clave] = ValueError(f"Sin tasa guardada para {clave[0]}->{clave[1]} el {clave[2]}")
+        return tasas, errores, set()
+
+    # claves que fallaron hace poco: no se vuelve a la red hasta que expiren
+    for clave in list(faltantes):
+        negativo = fallos_cache.get(clave)
+        if negativo is not None:
+            error, respaldo = negativo
+            if respaldo is not None:
+                tasas[clave] = respaldo
+            else:
+                errores[clave] = error
+            faltantes.discard(clave)
+
+    return tasas, errores, faltantes
+
+
+def monedas_requeridas(claves) -> set:
+    """Monedas que debe traer la tabla remota para resolver `claves`."""
+    requeridas = set(MONEDAS_SOPORTADAS)
+    for base, destino, _ in claves:
+        requeridas.update((base, destino))
+    return requeridas
+
+
+def resolver_con_tabla(faltantes, tabla: dict | None, error: Exception | None = None) -> tuple[dict, dict]:
+    """
+    Segunda parte: resuelve las claves faltantes con la tabla remota de hoy
+    (pedida con monedas_requeridas(faltantes)) o, si el proveedor falló
+    (tabla=None), con la última tasa conocida, dejando la clave un rato en
+    el cache negativo. La tabla solo se guarda con la fecha de hoy; las
+    fechas pasadas la usan en memoria (cache con TTL) sin convertirla en
+    histórico. Devuelve (tasas, errores).
+    """
+    tasas, errores = {}, {}
+    if tabla is None:
+        respaldos = {}
+        for clave in faltantes:
+            par = (clave[0], clave[1])
+            if par not in respaldos:
+                respaldos[par] = _ultima_tasa_conocida(*par)
+            fallos_cache.set(clave, (error, respaldos[par]))
+            if respaldos[par] is not None:
+                tasas[clave] = respaldos[par]
+            else:
+                errores[clave] = error
+        return tasas, errores
+
+    hoy = date.today()
+    pares = _pares_desde_tabla(tabla, sorted(monedas_requeridas(faltantes)))
+    _guardar_pares([hoy], pares)
+    for clave in faltantes:
+        valor = pares[(clave[0], clave[1])]
+        tasas[clave] = valor
+        if clave[2] != hoy:
+            tasas_cache.set(clave, valor)
+    return tasas, errores
+
+
+def _resolver_tasas(claves, sin_red: bool = False) -> tuple[dict, dict]:
+    """
+    Resuelve muchas claves (base, destino, fecha) a la vez: lo local
+    (resolver_locales) y, para lo que falte, a lo más una tabla remota
+    para todo el lote (resolver_con_tabla).
+    Devuelve (tasas, errores), ambos indexados por clave.
+    """
+    tasas, errores, faltantes = resolver_locales(claves, sin_red)
+    if faltantes:
+        try:
+            tabla, error = _fetch_remote_tabla(MONEDA_PIVOTE, monedas_requeridas(faltantes)), None
+        except ValueError as e:
+            tabla, error = None, e
+        resueltas, fallidas = resolver_con_tabla(faltantes, tabla, error)
+        tasas.update(resueltas)
+        errores.update(fallidas)
+    return tasas, errores
+
+
+def _invalidar_desde(fecha: date):
+    """
+    Olvida lo cacheado para fechas >= `fecha`. Lo usan las señales de
+    TipoCambio y las cargas masivas (bulk_create no dispara señales).
+    """
+    afectada = lambda clave: clave[2] >= fecha
+    tasas_cache.invalidar_donde(afectada)
+    fallos_cache.invalidar_donde(afectada)
+
+
+def backfill_tipocambio(pares, desde: date, hasta: date, chunk_size: int = 1000) -> dict:
+    """
+    Carga el histórico de cada par (y su inversa) entre dos fechas con una
+    serie de tiempo por par, insertando en bloques con ignore_conflicts.
+    Los pares que el proveedor de series no publica (p.ej. los de PEN) se
+    omiten sin llamarlo.
+    Devuelve {'filas': n, 'segundos': s, 'errores': {par: mensaje},
+    'omitidos': [par]}.
+    """
+    inicio = time.monotonic()
+    filas = 0
+    errores = {}
+    omitidos = []
+    for base, destino in pares:
+        base = base.upper(); destino = destino.upper()
+        if not proveedores.soporta_serie(base, destino):
+            omitidos.append((base, destino))
+            continue
+        try:
+            serie = proveedores.obtener_serie(base, destino, desde, hasta)
+        except ValueError as e:
+            errores[(base, destino)] = str(e)
+            continue
+
+        lote = []
+        for fecha, valor in serie.items():
+            lote.append(TipoCambio(fecha=fecha, base=base, destino=destino,
+                                   valor=valor.quantize(SEIS_DECIMALES)))
+            if valor:
+                lote.append(TipoCambio(fecha=fecha, base=destino, destino=base,
+                                       valor=(Decimal('1') / valor).quantize(SEIS_DECIMALES)))
+        for i in range(0, len(lote), chunk_size):
+            TipoCambio.objects.bulk_create(lote[i:i + chunk_size], ignore_conflicts=True)
+        filas += len(lote)
+
+    _invalidar_desde(desde)
+    return {'filas': filas, 'segundos': time.monotonic() - inicio, 'errores': errores, 'omitidos': omitidos}
+
+
+def precargar_tasas(para_fecha: date | None = None) -> dict:
+    """
+    Trae una sola tabla del proveedor y guarda todos los pares soportados
+    para la fecha. Devuelve {(base, destino): valor}.
+    """
+    para_fecha = fecha_efectiva(para_fecha)
+    tabla = _fetch_remote_tabla(MONEDA_PIVOTE, MONEDAS_SOPORTADAS)
+    pares = _pares_desde_tabla(tabla)
+    _guardar_pares([para_fecha], pares)
+    return pares
 
-def _fetch_remote_rate(base: str, destino: str) -> Decimal:
-    # intenta varios proveedores en cadena
-    for provider in (_fetch_exchangerate_host, _fetch_frankfurter, _fetch_open_erapi):
-        rate = provider(base, destino)
-        if rate is not None:
-            return rate
-    raise ValueError(f"No se obtuvo tasa {base}->{destino} de los proveedores públicos")
 
 def obtener_tipo_cambio(base: str = "USD", destino: str = "PEN", para_fecha: date | None = None) -> Decimal:
-    if para_fecha is None:
-        para_fecha = date.today()
     base = base.upper(); destino = destino.upper()
 
-    try:
-        tc = TipoCambio.objects.get(fecha=para_fecha, base=base, destino=destino)
-        return tc.valor
-    except TipoCambio.DoesNotExist:
-        valor = _fetch_remote_rate(base, destino)
-        with transaction.atomic():
-            tc, _ = TipoCambio.objects.get_or_create(
-                fecha=para_fecha, base=base, destino=destino,
-                defaults={"valor": valor}
-            )
-        return tc.valor
-    
+    clave = (base, destino, fecha_efectiva(para_fecha))
+    tasas, errores = _resolver_tasas({clave})
+    if clave in tasas:
+        return tasas[clave]
+    raise errores[clave]
+
+
+def convertir_montos_batch(items, omitir_errores: bool = False, sin_red: bool = False) -> list:
+    """
+    Convierte muchos montos en bloque. `items` es un iterable de
+    (monto, desde, hacia, para_fecha); devuelve los montos convertidos
+    en el mismo orden.
+    Si una tasa no se pudo obtener lanza ValueError, o deja None en esa
+    posición cuando omitir_errores=True. Con sin_red=True solo se usan
+    tasas cacheadas o guardadas (nunca se llama a un proveedor).
+    """
+    normalizados = []
+    claves = set()
+    for monto, desde, hacia, para_fecha in items:
+        desde = (desde or 'PEN').upper()
+        hacia = (hacia or 'PEN').upper()
+        clave = None
+        if desde != hacia:
+            clave = (desde, hacia, fecha_efectiva(para_fecha))
+            claves.add(clave)
+        normalizados.append((monto, clave))
+
+    tasas, errores = _resolver_tasas(claves, sin_red) if claves else ({}, {})
+
+    resultado = []
+    for monto, clave in normalizados:
+        if clave is None:
+            resultado.append(Decimal(monto))
+        elif clave in tasas:
+            resultado.append(Decimal(monto) * Decimal(tasas[clave]))
+        elif omitir_errores:
+            resultado.append(None)
+        else:
+            raise errores[clave]
+    return resultado
+
+
 def convertir_monto(monto, desde, hacia, para_fecha=None):
     if desde == hacia:
         return Decimal(monto)
-    if para_fecha is None:
-        para_fecha = date.today()
     tc = Decimal(obtener_tipo_cambio(base=desde, destino=hacia, para_fecha=para_fecha))
     return Decimal(monto) * tc
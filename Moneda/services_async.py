@@ -0,0 +1,139 @@
+# Moneda/services_async.py
+"""
+Versión async de obtener_tipo_cambio / convertir_monto para el despliegue
+ASGI (uvicorn): HTTP con aiohttp, sin bloquear el event loop. La política
+(cache, filas guardadas, cache negativo, qué se guarda) es la de
+Moneda.services (resolver_locales / resolver_con_tabla) y cada consulta a
+un proveedor pasa por los mismos circuit breakers y métricas; aquí solo
+cambia el transporte. La sesión se cierra en el shutdown de ASGI
+(baseParcial/asgi.py).
+"""
+import asyncio
+import time
+import weakref
+from datetime import date
+from decimal import Decimal
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import proveedores
+from .services import (
+    MONEDA_PIVOTE, fecha_efectiva, monedas_requeridas, resolver_con_tabla,
+    resolver_locales, tasas_cache,
+)
+
+# por event loop: sesión HTTP compartida y consultas en vuelo
+_sesiones = weakref.WeakKeyDictionary()
+_en_vuelo = weakref.WeakKeyDictionary()
+
+
+async def _sesion() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    sesion = _sesiones.get(loop)
+    if sesion is None or sesion.closed:
+        sesion = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=getattr(settings, 'TIPOCAMBIO_FETCH_TIMEOUT', 8)),
+            connector=aiohttp.TCPConnector(limit=getattr(settings, 'TIPOCAMBIO_FETCH_WORKERS', 6)),
+        )
+        _sesiones[loop] = sesion
+    return sesion
+
+
+async def cerrar_sesion():
+    """Cierra la sesión aiohttp del loop actual (shutdown de ASGI)."""
+    sesion = _sesiones.pop(asyncio.get_running_loop(), None)
+    if sesion is not None and not sesion.closed:
+        await sesion.close()
+
+
+async def _una_vez(clave, fabrica):
+    """
+    Coalescing: si ya hay una tarea en vuelo para `clave`, se espera esa en
+    lugar de lanzar otra. shield() evita que un cliente que se desconecta
+    cancele la tarea compartida.
+    """
+    loop = asyncio.get_running_loop()
+    en_vuelo = _en_vuelo.setdefault(loop, {})
+    tarea = en_vuelo.get(clave)
+    if tarea is None:
+        tarea = loop.create_task(fabrica())
+        en_vuelo[clave] = tarea
+        tarea.add_done_callback(lambda _: en_vuelo.pop(clave, None))
+    return await asyncio.shield(tarea)
+
+
+async def _consultar(nombre: str, base: str, requeridas: set) -> dict:
+    inicio = proveedores.iniciar_consulta(nombre)
+    if inicio is None:
+        return {}
+    url, params = proveedores.peticion(nombre, base)
+    try:
+        sesion = await _sesion()
+        async with sesion.get(url, params=params) as r:
+            r.raise_for_status()
+            tabla = proveedores.tabla_desde_json(await r.json(content_type=None))
+    except asyncio.CancelledError:
+        proveedores.cancelar_consulta(nombre)
+        raise
+    except Exception:
+        tabla = None
+    return proveedores.terminar_consulta(nombre, inicio, tabla, requeridas)
+
+
+async def _obtener_tabla(base: str, requeridas: frozenset) -> dict:
+    """Carrera entre proveedores: gana la primera tabla válida."""
+    requeridas, disponibles = proveedores.candidatos(base, requeridas)
+    tareas = {asyncio.create_task(_consultar(nombre, base, requeridas)) for nombre, _ in disponibles}
+    limite = time.monotonic() + getattr(settings, 'TIPOCAMBIO_FETCH_TIMEOUT', 8)
+    try:
+        while tareas:
+            hechos, tareas = await asyncio.wait(
+                tareas, timeout=max(limite - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not hechos:
+                break
+            for tarea in hechos:
+                tabla = tarea.result()
+                if tabla:
+                    return dict(tabla, **{base: Decimal('1')})
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+    raise proveedores.sin_tabla(base, requeridas)
+
+
+async def _resolver(clave) -> Decimal:
+    tasas, errores, faltantes = await sync_to_async(resolver_locales)({clave})
+    if faltantes:
+        requeridas = frozenset(monedas_requeridas(faltantes))
+        try:
+            # una sola consulta remota aunque lleguen muchos pares/fechas a la vez
+            tabla, error = await _una_vez(
+                ('tabla', MONEDA_PIVOTE, requeridas),
+                lambda: _obtener_tabla(MONEDA_PIVOTE, requeridas),
+            ), None
+        except ValueError as e:
+            tabla, error = None, e
+        tasas, errores = await sync_to_async(resolver_con_tabla)(faltantes, tabla, error)
+    if clave in tasas:
+        return tasas[clave]
+    raise errores[clave]
+
+
+async def aobtener_tipo_cambio(base: str = "USD", destino: str = "PEN", para_fecha: date | None = None) -> Decimal:
+    base = base.upper(); destino = destino.upper()
+    clave = (base, destino, fecha_efectiva(para_fecha))
+
+    valor = tasas_cache.get(clave)
+    if valor is not None:
+        return valor
+    return await _una_vez(('tasa',) + clave, lambda: _resolver(clave))
+
+
+async def aconvertir_monto(monto, desde, hacia, para_fecha=None):
+    if desde == hacia:
+        return Decimal(monto)
+    tc = Decimal(await aobtener_tipo_cambio(base=desde, destino=hacia, para_fecha=para_fecha))
+    return Decimal(monto) * tc
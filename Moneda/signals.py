@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import TipoCambio
+from .services import _invalidar_desde
+
+
+@receiver(post_save, sender=TipoCambio)
+@receiver(post_delete, sender=TipoCambio)
+def invalidar_cache_tipocambio(sender, instance: TipoCambio, **kwargs):
+    # la fila puede ser la tasa "vigente" de cualquier fecha posterior
+    _invalidar_desde(instance.fecha)
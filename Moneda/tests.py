@@ -1,3 +1,520 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from baseParcial import cache as cache_mod
+from baseParcial.cache import CacheTTL
+
+from . import importacion, proveedores, services, services_async
+from .models import TipoCambio
+
+TABLA_USD = {'USD': Decimal('1'), 'PEN': Decimal('3.40'), 'EUR': Decimal('0.90')}
+
+
+class LimpiarCachesMixin:
+    def setUp(self):
+        super().setUp()
+        services.tasas_cache.limpiar()
+        services.fallos_cache.limpiar()
+
+
+class ResolverTasasTests(LimpiarCachesMixin, TestCase):
+    def test_tabla_remota_solo_se_guarda_con_la_fecha_de_hoy(self):
+        hoy = date.today()
+        fechas = [hoy - timedelta(days=30 * k) for k in range(1, 13)]
+        with mock.patch.object(services, '_fetch_remote_tabla', return_value=TABLA_USD) as fetch:
+            montos = services.convertir_montos_batch([(100, 'USD', 'PEN', f) for f in fechas])
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(montos, [Decimal('340.00')] * 12)
+        self.assertEqual(set(TipoCambio.objects.values_list('fecha', flat=True)), {hoy})
+        self.assertEqual(TipoCambio.objects.count(), 6)
+
+    def test_fechas_pasadas_reusan_la_tabla_en_memoria(self):
+        pasada = date.today() - timedelta(days=90)
+        with mock.patch.object(services, '_fetch_remote_tabla', return_value=TABLA_USD) as fetch:
+            services.obtener_tipo_cambio('USD', 'PEN', pasada)
+            services.obtener_tipo_cambio('USD', 'PEN', pasada)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertFalse(TipoCambio.objects.filter(fecha=pasada).exists())
+
+    def test_fila_guardada_dentro_de_la_tolerancia_no_va_a_la_red(self):
+        pasada = date.today() - timedelta(days=60)
+        TipoCambio.objects.create(fecha=pasada - timedelta(days=2), base='USD', destino='PEN', valor=Decimal('3.70'))
+        with mock.patch.object(services, '_fetch_remote_tabla') as fetch:
+            tasa = services.obtener_tipo_cambio('PEN', 'USD', pasada)
+        fetch.assert_not_called()
+        self.assertEqual(tasa, (Decimal('1') / Decimal('3.70')).quantize(services.SEIS_DECIMALES))
+
+
+class CacheTTLTests(TestCase):
+    def test_lru_descarta_la_menos_usada(self):
+        c = CacheTTL(maxsize=2, ttl=60)
+        c.set('a', 1)
+        c.set('b', 2)
+        self.assertEqual(c.get('a'), 1)   # 'a' pasa a ser la más reciente
+        c.set('c', 3)
+
+        self.assertIsNone(c.get('b'))
+        self.assertEqual((c.get('a'), c.get('c')), (1, 3))
+        self.assertEqual(c.stats(), {'tamano': 2, 'maxsize': 2, 'ttl': 60, 'hits': 3, 'misses': 1})
+
+    def test_expira_con_el_ttl(self):
+        c = CacheTTL(maxsize=10, ttl=5)
+        with mock.patch.object(cache_mod.time, 'monotonic', return_value=100.0):
+            c.set('a', 1)
+        with mock.patch.object(cache_mod.time, 'monotonic', return_value=104.9):
+            self.assertEqual(c.get('a'), 1)
+        with mock.patch.object(cache_mod.time, 'monotonic', return_value=105.0):
+            self.assertIsNone(c.get('a'))
+        self.assertEqual(c.stats()['tamano'], 0)
+
+    def test_invalidar_donde_y_limpiar(self):
+        c = CacheTTL()
+        for d in range(1, 4):
+            c.set(('USD', 'PEN', date(2024, 1, d)), d)
+        c.invalidar_donde(lambda clave: clave[2] >= date(2024, 1, 2))
+
+        self.assertEqual(c.get(('USD', 'PEN', date(2024, 1, 1))), 1)
+        self.assertIsNone(c.get(('USD', 'PEN', date(2024, 1, 2))))
+        c.limpiar()
+        self.assertEqual(c.stats()['hits'], 0)
+        self.assertEqual(c.stats()['tamano'], 0)
+
+
+class TasasCacheTests(LimpiarCachesMixin, TestCase):
+    def test_segunda_consulta_no_toca_la_bd(self):
+        pasada = date.today() - timedelta(days=10)
+        TipoCambio.objects.create(fecha=pasada, base='USD', destino='PEN', valor=Decimal('3.70'))
+        self.assertEqual(services.obtener_tipo_cambio('USD', 'PEN', pasada), Decimal('3.70'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(services.obtener_tipo_cambio('usd', 'pen', pasada), Decimal('3.70'))
+
+    def test_guardar_una_tasa_invalida_las_fechas_posteriores(self):
+        pasada = date.today() - timedelta(days=10)
+        TipoCambio.objects.create(fecha=pasada - timedelta(days=1), base='USD', destino='PEN', valor=Decimal('3.70'))
+        self.assertEqual(services.obtener_tipo_cambio('USD', 'PEN', pasada), Decimal('3.70'))
+
+        # la nueva fila es la vigente para `pasada`: el cache no debe responder la anterior
+        TipoCambio.objects.create(fecha=pasada, base='USD', destino='PEN', valor=Decimal('3.80'))
+        self.assertEqual(services.obtener_tipo_cambio('USD', 'PEN', pasada), Decimal('3.80'))
+
+
+class ConvertirMontosBatchTests(LimpiarCachesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.hoy = date.today()
+        self.fechas = [self.hoy - timedelta(days=d) for d in (40, 20, 5)]
+        TipoCambio.objects.bulk_create([
+            TipoCambio(fecha=f, base='USD', destino=destino, valor=valor + Decimal(k) / 100)
+            for k, f in enumerate(self.fechas)
+            for destino, valor in (('PEN', Decimal('3.70')), ('EUR', Decimal('0.90')))
+        ])
+        self.items = [
+            (Decimal('100'), desde, hacia, f + timedelta(days=1))
+            for f in self.fechas
+            for desde, hacia in (('USD', 'PEN'), ('PEN', 'USD'), ('EUR', 'PEN'), ('pen', 'PEN'))
+        ]
+
+    def test_igual_que_convertir_monto_fila_por_fila(self):
+        with mock.patch.object(services, '_fetch_remote_tabla') as fetch:
+            lote = services.convertir_montos_batch(self.items)
+            services.tasas_cache.limpiar()
+            uno_a_uno = [services.convertir_monto(m, d.upper(), h, f) for m, d, h, f in self.items]
+        fetch.assert_not_called()
+        self.assertEqual(lote, uno_a_uno)
+        self.assertEqual(lote[0], Decimal('370.000000'))
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        with self.assertNumQueries(2):
+            services.convertir_montos_batch(self.items * 50)
+
+    def test_tasa_faltante(self):
+        items = [(Decimal('10'), 'USD', 'PEN', self.hoy - timedelta(days=100)), (Decimal('10'), 'USD', 'PEN', self.fechas[2])]
+        with mock.patch.object(services, '_fetch_remote_tabla') as fetch:
+            resultado = services.convertir_montos_batch(items, omitir_errores=True, sin_red=True)
+            with self.assertRaises(ValueError):
+                services.convertir_montos_batch(items, sin_red=True)
+        fetch.assert_not_called()
+        self.assertEqual(resultado, [None, Decimal('37.200000')])
+
+
+class ParesDerivadosTests(LimpiarCachesMixin, TestCase):
+    def test_pares_desde_tabla(self):
+        pares = services._pares_desde_tabla(TABLA_USD)
+
+        self.assertEqual(len(pares), 6)
+        self.assertEqual(pares[('USD', 'PEN')], Decimal('3.400000'))
+        self.assertEqual(pares[('PEN', 'USD')], (Decimal('1') / Decimal('3.40')).quantize(services.SEIS_DECIMALES))
+        self.assertEqual(pares[('EUR', 'PEN')], (Decimal('3.40') / Decimal('0.90')).quantize(services.SEIS_DECIMALES))
+
+    def test_una_tabla_resuelve_todos_los_pares(self):
+        with mock.patch.object(services, '_fetch_remote_tabla', return_value=TABLA_USD) as fetch:
+            eur_pen = services.obtener_tipo_cambio('EUR', 'PEN')
+            pen_eur = services.obtener_tipo_cambio('PEN', 'EUR')
+            pen_usd = services.obtener_tipo_cambio('PEN', 'USD')
+
+        fetch.assert_called_once_with('USD', {'PEN', 'USD', 'EUR'})
+        self.assertEqual(eur_pen, Decimal('3.777778'))
+        self.assertEqual(pen_eur, Decimal('0.264706'))
+        self.assertEqual(pen_usd, Decimal('0.294118'))
+        self.assertEqual(TipoCambio.objects.filter(fecha=date.today()).count(), 6)
+
+    def test_cruzado_desde_filas_guardadas(self):
+        pasada = date.today() - timedelta(days=3)
+        TipoCambio.objects.bulk_create([
+            TipoCambio(fecha=pasada, base='USD', destino='PEN', valor=Decimal('3.60')),
+            TipoCambio(fecha=pasada, base='EUR', destino='USD', valor=Decimal('1.10')),
+        ])
+        with mock.patch.object(services, '_fetch_remote_tabla') as fetch:
+            # EUR->PEN por USD; PEN->EUR invirtiendo ambas
+            self.assertEqual(services.obtener_tipo_cambio('EUR', 'PEN', pasada), Decimal('3.960000'))
+            self.assertEqual(
+                services.obtener_tipo_cambio('PEN', 'EUR', pasada),
+                (Decimal('1') / Decimal('3.60') / Decimal('1.10')).quantize(services.SEIS_DECIMALES),
+            )
+        fetch.assert_not_called()
+
+
+class _Proveedor(BaseHTTPRequestHandler):
+    """
+    Proveedor stub: el primer segmento de la ruta decide la respuesta.
+      /ok, /lento (espera 1 s), /roto (500), /incompleto (sin PEN),
+      /serie/<desde>..<hasta>?from=X&to=Y (días hábiles del rango).
+    """
+    protocol_version = 'HTTP/1.1'
+    llamadas = Counter()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        ruta = partes.path.strip('/').split('/')
+        with self.lock:
+            self.llamadas[ruta[0]] += 1
+        if ruta[0] == 'roto':
+            return self._responder(500, {})
+        if ruta[0] == 'lento':
+            time.sleep(1)
+        if ruta[0] == 'serie':
+            desde, hasta = (date.fromisoformat(d) for d in ruta[1].split('..'))
+            destino = parse_qs(partes.query)['to'][0]
+            rates, dia = {}, desde
+            while dia <= hasta:
+                if dia.weekday() < 5:
+                    rates[dia.isoformat()] = {destino: 0.9}
+                dia += timedelta(days=1)
+            return self._responder(200, {'rates': rates})
+        rates = {'USD': 1, 'EUR': 0.92}
+        if ruta[0] != 'incompleto':
+            rates['PEN'] = 3.75
+        self._responder(200, {'rates': rates})
+
+    def _responder(self, status, data):
+        cuerpo = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        try:
+            self.wfile.write(cuerpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente ya cortó por timeout (perdedor de la carrera)
+
+    def log_message(self, *args):
+        pass
+
+
+class ProveedorStubMixin(LimpiarCachesMixin):
+    """Levanta el proveedor stub y deja circuitos y métricas en cero por test."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Proveedor)
+        cls.servidor.daemon_threads = True
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.servidor.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        _Proveedor.llamadas.clear()
+        with proveedores._breakers_lock:
+            proveedores._breakers.clear()
+        with proveedores._metricas_lock:
+            proveedores._metricas.clear()
+
+    def urls(self, exchangerate_host='ok', frankfurter='ok', open_erapi='ok'):
+        return override_settings(TIPOCAMBIO_URLS={
+            'exchangerate_host': f'{self.url}/{exchangerate_host}',
+            'frankfurter': f'{self.url}/{frankfurter}',
+            'open_erapi': f'{self.url}/{open_erapi}',
+            'frankfurter_serie': f'{self.url}/serie',
+        })
+
+
+@override_settings(TIPOCAMBIO_FETCH_MODO='paralelo', TIPOCAMBIO_FETCH_TIMEOUT=5, TIPOCAMBIO_OFFLINE=False)
+class CarreraProveedoresTests(ProveedorStubMixin, TestCase):
+    @override_settings(TIPOCAMBIO_HEDGE_DELAY=0)
+    def test_gana_la_primera_respuesta_valida(self):
+        # frankfurter no publica PEN: la carrera es entre el lento y el que responde
+        with self.urls(exchangerate_host='lento', frankfurter='roto'):
+            inicio = time.monotonic()
+            tabla = proveedores.obtener_tabla('USD', {'PEN', 'EUR'})
+        self.assertLess(time.monotonic() - inicio, 0.9)
+        self.assertEqual(tabla['PEN'], Decimal('3.75'))
+        self.assertEqual(_Proveedor.llamadas['roto'], 0)
+
+    @override_settings(TIPOCAMBIO_HEDGE_DELAY=0.4, TIPOCAMBIO_FETCH_TIMEOUT=0.6)
+    def test_perdedor_lento_no_pasa_del_limite_de_la_carrera(self):
+        with self.urls('lento', 'lento', 'lento'):
+            inicio = time.monotonic()
+            with self.assertRaises(ValueError):
+                proveedores.obtener_tabla('USD', {'EUR'})
+            # frankfurter se lanzó a los 0.4 s: su timeout es lo que quedaba de
+            # la carrera (0.2 s), así que libera el hilo del pool hacia los 0.6 s
+            while len(proveedores.metricas()) < 2 and time.monotonic() - inicio < 0.95:
+                time.sleep(0.02)
+        self.assertLess(time.monotonic() - inicio, 0.95)
+        self.assertEqual(set(proveedores.metricas()), {'exchangerate_host', 'frankfurter'})
+
+    @override_settings(TIPOCAMBIO_HEDGE_DELAY=0.5)
+    def test_hedge_no_lanza_el_siguiente_si_el_primero_responde(self):
+        with self.urls(frankfurter='lento', open_erapi='lento'):
+            proveedores.obtener_tabla('USD', {'PEN'})
+        self.assertEqual(_Proveedor.llamadas, Counter(ok=1))
+
+    @override_settings(TIPOCAMBIO_HEDGE_DELAY=0)
+    def test_tabla_sin_las_monedas_requeridas_no_gana(self):
+        with self.urls(exchangerate_host='incompleto', open_erapi='lento'):
+            tabla = proveedores.obtener_tabla('USD', {'PEN'})
+        self.assertEqual(tabla['PEN'], Decimal('3.75'))
+
+
+@override_settings(
+    TIPOCAMBIO_FETCH_MODO='secuencial', TIPOCAMBIO_OFFLINE=False,
+    TIPOCAMBIO_CB_FALLOS=2, TIPOCAMBIO_CB_ENFRIAMIENTO=60,
+)
+class MonedasNoPublicadasTests(ProveedorStubMixin, TestCase):
+    @override_settings(TIPOCAMBIO_MONEDAS_PROVEEDOR={})
+    def test_tabla_valida_sin_pen_no_abre_el_circuito(self):
+        with self.urls('roto', 'incompleto', 'roto'):
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    proveedores.obtener_tabla('USD', {'PEN'})
+            # frankfurter respondió las tres veces; los rotos abrieron su circuito
+            self.assertEqual(_Proveedor.llamadas['incompleto'], 3)
+            tabla = proveedores.obtener_tabla('USD', {'EUR'})
+        self.assertEqual(tabla['EUR'], Decimal('0.92'))
+        self.assertEqual(proveedores.estado_circuitos()['frankfurter'], ('cerrado', 0))
+        self.assertEqual(proveedores.metricas()['frankfurter']['errores'], 0)
+
+    def test_proveedor_que_no_publica_la_moneda_no_se_consulta(self):
+        with self.urls('roto', 'incompleto', 'ok'):
+            self.assertEqual(proveedores.obtener_tabla('USD', {'PEN'})['PEN'], Decimal('3.75'))
+            self.assertEqual(proveedores.obtener_tabla('USD', {'EUR'})['EUR'], Decimal('0.92'))
+        self.assertEqual(_Proveedor.llamadas, Counter(roto=2, incompleto=1, ok=1))
+
+    def test_ningun_proveedor_publica_la_moneda(self):
+        with override_settings(TIPOCAMBIO_MONEDAS_PROVEEDOR={n: frozenset({'USD'}) for n, _ in proveedores.PROVEEDORES}):
+            with self.assertRaisesMessage(ValueError, 'Ningún proveedor publica'):
+                proveedores.obtener_tabla('USD', {'PEN'})
+        self.assertEqual(_Proveedor.llamadas, Counter())
+
+
+@override_settings(
+    TIPOCAMBIO_FETCH_MODO='secuencial', TIPOCAMBIO_OFFLINE=False,
+    TIPOCAMBIO_CB_FALLOS=2, TIPOCAMBIO_CB_ENFRIAMIENTO=0.3,
+)
+class CircuitoProveedoresTests(ProveedorStubMixin, TestCase):
+    def test_circuito_abierto_no_llama_y_la_sonda_lo_cierra(self):
+        with self.urls('roto', 'roto', 'roto'):
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    proveedores.obtener_tabla('USD', {'EUR'})
+            self.assertEqual(_Proveedor.llamadas['roto'], 6)
+            with self.assertRaisesMessage(ValueError, 'circuitos abiertos'):
+                proveedores.obtener_tabla('USD', {'EUR'})
+        self.assertEqual(_Proveedor.llamadas['roto'], 6)
+        self.assertEqual({e for e, _ in proveedores.estado_circuitos().values()}, {'abierto'})
+
+        time.sleep(0.35)
+        with self.urls('ok', 'roto', 'roto'):
+            proveedores.obtener_tabla('USD', {'PEN'})
+        self.assertEqual(proveedores.estado_circuitos()['exchangerate_host'], ('cerrado', 0))
+        self.assertEqual(_Proveedor.llamadas['ok'], 1)
+
+
+@override_settings(TIPOCAMBIO_FETCH_MODO='secuencial', TIPOCAMBIO_OFFLINE=False, TIPOCAMBIO_CB_FALLOS=10)
+class CacheNegativoTests(ProveedorStubMixin, TestCase):
+    def test_fallo_reciente_no_vuelve_a_la_red(self):
+        with self.urls('roto', 'roto', 'roto'):
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    services.obtener_tipo_cambio('USD', 'PEN')
+        # frankfurter no publica PEN: solo se consultan los otros dos
+        self.assertEqual(_Proveedor.llamadas['roto'], 2)
+
+    def test_fallo_responde_con_la_ultima_tasa_conocida(self):
+        TipoCambio.objects.create(fecha=date.today() - timedelta(days=40), base='USD', destino='PEN',
+                                  valor=Decimal('3.600000'))
+        with self.urls('roto', 'roto', 'roto'):
+            self.assertEqual(services.obtener_tipo_cambio('USD', 'PEN'), Decimal('3.600000'))
+            self.assertEqual(services.obtener_tipo_cambio('USD', 'PEN'), Decimal('3.600000'))
+        # frankfurter no publica PEN: solo se consultan los otros dos
+        self.assertEqual(_Proveedor.llamadas['roto'], 2)
+
+
+class BackfillTests(ProveedorStubMixin, TestCase):
+    def test_backfill_guarda_el_par_y_su_inversa_y_omite_pen(self):
+        desde, hasta = date(2024, 1, 1), date(2024, 1, 31)
+        with self.urls():
+            resultado = services.backfill_tipocambio([('USD', 'EUR'), ('USD', 'PEN')], desde, hasta)
+
+        self.assertEqual(resultado['omitidos'], [('USD', 'PEN')])
+        self.assertEqual(resultado['errores'], {})
+        self.assertEqual(_Proveedor.llamadas, Counter(serie=1))
+        habiles = sum(1 for d in range(31) if (desde + timedelta(days=d)).weekday() < 5)
+        self.assertEqual(resultado['filas'], 2 * habiles)
+        self.assertEqual(TipoCambio.objects.filter(base='USD', destino='EUR').count(), habiles)
+        inversa = TipoCambio.objects.get(fecha=date(2024, 1, 2), base='EUR', destino='USD')
+        self.assertEqual(inversa.valor, (Decimal('1') / Decimal('0.9')).quantize(services.SEIS_DECIMALES))
+
+
+@override_settings(TIPOCAMBIO_OFFLINE=False, TIPOCAMBIO_FETCH_TIMEOUT=5, ALERTAS_WORKER_HILO=False)
+class TipoCambioAsyncTests(ProveedorStubMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(User.objects.create_user('ana', password='x'))
+
+    async def consultar(self, **params):
+        try:
+            return await self.async_client.get(reverse('moneda:tipo_cambio'), params)
+        finally:
+            await services_async.cerrar_sesion()
+
+    async def test_vista_resuelve_con_la_tabla_remota_y_la_guarda_hoy(self):
+        with self.urls('roto', 'roto', 'ok'):
+            r = await self.consultar(base='usd', destino='pen', monto='100')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {'base': 'USD', 'destino': 'PEN', 'tasa': '3.750000', 'monto': '375.00'})
+        self.assertTrue(await TipoCambio.objects.filter(fecha=date.today(), base='USD', destino='PEN').aexists())
+        self.assertEqual(proveedores.metricas()['exchangerate_host']['errores'], 1)
+
+    async def test_vista_con_proveedores_caidos_responde_503(self):
+        with self.urls('roto', 'roto', 'roto'):
+            r = await self.consultar(base='USD', destino='EUR')
+        self.assertEqual(r.status_code, 503)
+
+    async def test_shutdown_de_asgi_cierra_la_sesion(self):
+        from baseParcial.asgi import application
+
+        sesion = await services_async._sesion()
+        mensajes = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        enviados = []
+
+        async def receive():
+            return next(mensajes)
+
+        async def send(mensaje):
+            enviados.append(mensaje['type'])
+
+        await application({'type': 'lifespan'}, receive, send)
+        self.assertTrue(sesion.closed)
+        self.assertEqual(enviados, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+ECB_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+  <Cube>
+    <Cube time="2024-01-03"><Cube currency="USD" rate="1.0919"/><Cube currency="JPY" rate="155.52"/></Cube>
+    <Cube time="2024-01-02"><Cube currency="USD" rate="1.0956"/><Cube currency="JPY" rate="155.34"/></Cube>
+  </Cube>
+</gesmes:Envelope>"""
+
+
+class ImportacionTests(LimpiarCachesMixin, TestCase):
+    def valor(self, fecha, base, destino):
+        return TipoCambio.objects.get(fecha=fecha, base=base, destino=destino).valor
+
+    def test_leer_csv(self):
+        archivo = io.StringIO("fecha,base,destino,valor\n2024-01-02,usd,pen,3.70\n2024-01-02,USD,EUR,0.91\n")
+        self.assertEqual(list(importacion.leer_csv(archivo)), [
+            (date(2024, 1, 2), 'USD', 'PEN', Decimal('3.70')),
+            (date(2024, 1, 2), 'USD', 'EUR', Decimal('0.91')),
+        ])
+
+    def test_leer_csv_fila_invalida(self):
+        archivo = io.StringIO("fecha,base,destino,valor\n2024-01-02,USD,PEN,3.70\n2024-01-03,USD,PEN,abc\n")
+        with self.assertRaisesMessage(ValueError, 'Fila 3'):
+            list(importacion.leer_csv(archivo))
+
+    def test_leer_ecb_xml(self):
+        filas = list(importacion.leer_ecb_xml(io.BytesIO(ECB_XML)))
+        self.assertEqual(filas[0], (date(2024, 1, 3), 'EUR', 'USD', Decimal('1.0919')))
+        self.assertEqual(len(filas), 4)
+
+    def test_importar_guarda_directas_y_derivadas(self):
+        filas = [(date(2024, 1, 2), 'USD', 'PEN', Decimal('3.70')), (date(2024, 1, 2), 'USD', 'EUR', Decimal('0.90'))]
+        importacion.importar_tasas(filas)
+        dia = date(2024, 1, 2)
+        self.assertEqual(self.valor(dia, 'USD', 'PEN'), Decimal('3.700000'))
+        self.assertEqual(self.valor(dia, 'PEN', 'USD'), (Decimal('1') / Decimal('3.70')).quantize(services.SEIS_DECIMALES))
+        self.assertEqual(self.valor(dia, 'EUR', 'PEN'), (Decimal('3.70') / Decimal('0.90')).quantize(services.SEIS_DECIMALES))
+
+    def test_reimportar_corrige_directas_y_derivadas(self):
+        dia = date(2024, 1, 2)
+        importacion.importar_tasas([(dia, 'USD', 'PEN', Decimal('3.70')), (dia, 'USD', 'EUR', Decimal('0.90'))])
+        importacion.importar_tasas([(dia, 'USD', 'PEN', Decimal('3.80')), (dia, 'USD', 'EUR', Decimal('0.90'))])
+        self.assertEqual(self.valor(dia, 'USD', 'PEN'), Decimal('3.800000'))
+        self.assertEqual(self.valor(dia, 'PEN', 'USD'), (Decimal('1') / Decimal('3.80')).quantize(services.SEIS_DECIMALES))
+        self.assertEqual(self.valor(dia, 'EUR', 'PEN'), (Decimal('3.80') / Decimal('0.90')).quantize(services.SEIS_DECIMALES))
+
+    def test_la_derivada_no_pisa_la_real_del_mismo_archivo(self):
+        dia = date(2024, 1, 2)
+        filas = [
+            (dia, 'PEN', 'USD', Decimal('0.25')),
+            (dia, 'USD', 'PEN', Decimal('3.70')),
+        ]
+        importacion.importar_tasas(filas, batch_size=1)
+        self.assertEqual(self.valor(dia, 'PEN', 'USD'), Decimal('0.250000'))
+
+    def importar(self, contenido: bytes, sufijo: str):
+        with tempfile.NamedTemporaryFile(suffix=sufijo) as archivo:
+            archivo.write(contenido)
+            archivo.flush()
+            call_command('importar_tipocambio', archivo.name, stdout=io.StringIO())
+
+    def test_comando_importa_el_xml_del_bce(self):
+        self.importar(ECB_XML, '.xml')
+        self.assertEqual(self.valor(date(2024, 1, 3), 'EUR', 'USD'), Decimal('1.091900'))
+        self.assertTrue(TipoCambio.objects.filter(fecha=date(2024, 1, 3), base='USD', destino='EUR').exists())
+
+    def test_comando_con_archivo_mal_formado_es_command_error(self):
+        casos = [
+            (ECB_XML[:200], '.xml'),
+            (ECB_XML.replace(b'rate="1.0919"', b'rate="n/d"'), '.xml'),
+            (b"fecha,base,destino,valor\n2024-01-02,USD,PEN,x\n", '.csv'),
+        ]
+        for contenido, sufijo in casos:
+            with self.subTest(contenido=contenido[-40:]), self.assertRaises(CommandError):
+                self.importar(contenido, sufijo)
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'moneda'
+
+urlpatterns = [
+    path('tipo-cambio/', views.tipo_cambio, name='tipo_cambio'),
+]
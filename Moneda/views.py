@@ -1,3 +1,46 @@
-from django.shortcuts import render
+# Moneda/views.py
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .services import MONEDAS_SOPORTADAS
+from .services_async import aobtener_tipo_cambio
+
+
+@login_required
+@require_GET
+async def tipo_cambio(request):
+    """
+    Tipo de cambio en JSON: ?base=USD&destino=PEN[&fecha=YYYY-MM-DD][&monto=100].
+    Vista async: bajo ASGI la consulta a los proveedores no ocupa un hilo.
+    """
+    base = (request.GET.get('base') or 'USD').upper()
+    destino = (request.GET.get('destino') or 'PEN').upper()
+    if base not in MONEDAS_SOPORTADAS or destino not in MONEDAS_SOPORTADAS:
+        return JsonResponse({'error': f'Moneda no soportada: {base}->{destino}'}, status=400)
+    try:
+        fecha = date.fromisoformat(request.GET['fecha']) if request.GET.get('fecha') else None
+    except ValueError:
+        return JsonResponse({'error': 'Fecha inválida (YYYY-MM-DD)'}, status=400)
+    monto = request.GET.get('monto') or None
+    if monto is not None:
+        try:
+            monto = Decimal(monto)
+        except InvalidOperation:
+            monto = None
+        if monto is None or not monto.is_finite():
+            return JsonResponse({'error': f"Monto inválido: {request.GET['monto']}"}, status=400)
+
+    try:
+        tasa = Decimal(1) if base == destino else await aobtener_tipo_cambio(base, destino, fecha)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    return JsonResponse({
+        'base': base,
+        'destino': destino,
+        'tasa': str(tasa),
+        'monto': str((monto * tasa).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)) if monto is not None else None,
+    })
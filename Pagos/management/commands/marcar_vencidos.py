@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from Pagos.services import marcar_vencidos
+
+
+class Command(BaseCommand):
+    help = "Pasa a Vencido las cuotas pendientes cuyo vencimiento ya pasó (job diario)."
+
+    def handle(self, *args, **options):
+        r = marcar_vencidos()
+        self.stdout.write(self.style.SUCCESS(
+            f"Cuotas marcadas como vencidas: {r['vencidos']} (reabiertas: {r['reabiertos']})"
+        ))
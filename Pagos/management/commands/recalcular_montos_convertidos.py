@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from Pagos.services import refrescar_montos_convertidos
+
+
+class Command(BaseCommand):
+    help = "Recalcula los montos equivalentes (PEN/USD/EUR) de las cuotas pendientes con tipo de cambio desactualizado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Filas por bulk_update')
+        parser.add_argument('--actualizar-tasas', action='store_true',
+                            help='Precargar primero las tasas del día (como actualizar_tipocambio)')
+
+    def handle(self, *args, **options):
+        if options['actualizar_tasas']:
+            from Moneda.services import precargar_tasas
+            precargar_tasas()
+        n = refrescar_montos_convertidos(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Cuotas con montos recalculados: {n}"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pagos', '0003_pago_mp_payment_id_pago_mp_preference_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='fecha_tc_montos',
+            field=models.DateField(blank=True, help_text='Fecha del tipo de cambio usado para los montos equivalentes.', null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='monto_eur',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='monto_pen',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='monto_usd',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pagos', '0004_pago_montos_convertidos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='capital',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='interes',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='saldo',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Capital pendiente después de pagar esta cuota.', max_digits=12, null=True),
+        ),
+    ]
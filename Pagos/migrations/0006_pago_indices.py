@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pagos', '0005_pago_desglose_cronograma'),
+        ('Prestamos', '0006_prestamo_resumen'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['prestamo', 'estado', 'fecha_vencimiento', 'numero_cuota'], name='pago_prest_estado_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(condition=models.Q(('estado', 'Pendiente')), fields=['fecha_vencimiento', 'numero_cuota'], name='pago_pendiente_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['prestamo', 'numero_cuota'], name='pago_prestamo_cuota_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pago',
+            constraint=models.CheckConstraint(condition=models.Q(('estado__in', ['Pendiente', 'Pagado', 'Vencido'])), name='pago_estado_valido'),
+        ),
+    ]
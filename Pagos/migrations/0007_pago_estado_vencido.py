@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:24
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def marcar_vencidos(apps, schema_editor):
+    Pago = apps.get_model('Pagos', 'Pago')
+    Pago.objects.filter(estado='Pendiente', fecha_vencimiento__lt=date.today()).update(estado='Vencido')
+
+
+def desmarcar_vencidos(apps, schema_editor):
+    Pago = apps.get_model('Pagos', 'Pago')
+    Pago.objects.filter(estado='Vencido').update(estado='Pendiente')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pagos', '0006_pago_indices'),
+        ('Prestamos', '0006_prestamo_resumen'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(condition=models.Q(('estado', 'Vencido')), fields=['fecha_vencimiento'], name='pago_vencido_venc_idx'),
+        ),
+        migrations.RunPython(marcar_vencidos, desmarcar_vencidos),
+    ]
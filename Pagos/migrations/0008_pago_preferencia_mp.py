@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pagos', '0007_pago_estado_vencido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='mp_init_point',
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='mp_preference_creada',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='mp_preference_monto',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Monto en PEN con el que se creó la preferencia.', max_digits=12, null=True),
+        ),
+        migrations.AlterField(
+            model_name='pago',
+            name='mp_preference_id',
+            field=models.CharField(blank=True, db_index=True, help_text='ID de preferencia de Mercado Pago (Checkout Pro).', max_length=100, null=True),
+        ),
+    ]
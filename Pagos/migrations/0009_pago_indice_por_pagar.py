@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pagos', '0008_pago_preferencia_mp'),
+        ('Prestamos', '0006_prestamo_resumen'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pago',
+            name='pago_pendiente_venc_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pago',
+            name='pago_vencido_venc_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(condition=models.Q(('estado', 'Pendiente'), ('estado', 'Vencido'), _connector='OR'), fields=['fecha_vencimiento', 'numero_cuota'], name='pago_por_pagar_venc_idx'),
+        ),
+    ]
@@ -1,6 +1,22 @@
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import Signal
 from Prestamos.models import Prestamo
 
+# borrado en bloque de pagos (PagoQuerySet.delete): se envía una sola vez,
+# dentro de la transacción del borrado, con los préstamos afectados
+pagos_borrados = Signal()  # kwargs: prestamo_ids
+
+
+class PagoQuerySet(models.QuerySet):
+    def delete(self):
+        prestamo_ids = set(self.order_by().values_list('prestamo_id', flat=True).distinct())
+        with transaction.atomic():
+            resultado = super().delete()
+            if prestamo_ids:
+                pagos_borrados.send(sender=self.model, prestamo_ids=prestamo_ids)
+        return resultado
+
+
 class Pago(models.Model):
     ESTADO_CHOICES = [
         ('Pendiente', 'Pendiente'),
@@ -16,6 +32,17 @@ class Pago(models.Model):
     fecha_pago = models.DateField(blank=True, null=True)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='Pendiente')
 
+    # --- Desglose del cronograma (sistema francés / prorrateo) ---
+    interes = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    capital = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    saldo = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        help_text="Capital pendiente después de pagar esta cuota.",
+    )
+
     # --- Snapshot al pagar (para que no cambie con el selector de moneda) ---
     base_fija = models.CharField(max_length=3, blank=True, null=True)
     destino_fijo = models.CharField(max_length=3, blank=True, null=True)
@@ -23,17 +50,77 @@ class Pago(models.Model):
     monto_base_fijo = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
     monto_destino_fijo = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
     # ------------------------------------------------------------------------
+
+    # --- Equivalentes precalculados (se llenan al generar cuotas y los
+    #     refresca recalcular_montos_convertidos cuando cambian las tasas) ---
+    monto_pen = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    monto_usd = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    monto_eur = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    fecha_tc_montos = models.DateField(
+        blank=True,
+        null=True,
+        help_text="Fecha del tipo de cambio usado para los montos equivalentes.",
+    )
+    # ------------------------------------------------------------------------
     mp_preference_id = models.CharField(
             max_length=100,
             blank=True,
             null=True,
+            db_index=True,
             help_text="ID de preferencia de Mercado Pago (Checkout Pro)."
         )
+    # --- Preferencia guardada para reutilizarla (ver Pagos.mp) ---
+    mp_init_point = models.URLField(max_length=500, blank=True, null=True)
+    mp_preference_monto = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        help_text="Monto en PEN con el que se creó la preferencia.",
+    )
+    mp_preference_creada = models.DateTimeField(blank=True, null=True)
     mp_payment_id = models.CharField(
             max_length=100,
             blank=True,
             null=True,
             help_text="ID de pago de Mercado Pago una vez aprobado."
         )
+
+    objects = PagoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # listados, dashboard, agenda y alertas: cuotas de los préstamos
+            # de una persona por estado y rango de vencimiento, ordenadas
+            models.Index(
+                fields=['prestamo', 'estado', 'fecha_vencimiento', 'numero_cuota'],
+                name='pago_prest_estado_venc_idx',
+            ),
+            # solo las cuotas por pagar (Pagos.services.POR_PAGAR; jobs globales:
+            # marcar vencidos, refresco de montos). Escrito como OR y no como IN:
+            # PostgreSQL lo deduce de ambos filtros y SQLite lo acepta con estado = ?
+            models.Index(
+                fields=['fecha_vencimiento', 'numero_cuota'],
+                name='pago_por_pagar_venc_idx',
+                condition=models.Q(estado='Pendiente') | models.Q(estado='Vencido'),
+            ),
+            # cronograma de un préstamo (pagos_por_prestamo, sincronizar_cuotas)
+            models.Index(fields=['prestamo', 'numero_cuota'], name='pago_prestamo_cuota_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(estado__in=['Pendiente', 'Pagado', 'Vencido']),
+                name='pago_estado_valido',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # valores leídos de la BD: el post_save compara con ellos para no
+        # recalcular el resumen del préstamo si no cambió nada que lo afecte
+        instance = super().from_db(db, field_names, values)
+        instance._valores_bd = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return f"Cuota {self.numero_cuota} - {self.prestamo.banco} ({self.estado})"
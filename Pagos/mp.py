@@ -0,0 +1,97 @@
+# Pagos/mp.py
+"""
+Cliente de Mercado Pago compartido por el proceso. El SDK abre una sesión
+HTTP nueva en cada llamada; aquí se usa una sesión keep-alive por hilo,
+así que los checkouts seguidos reutilizan la conexión TLS.
+"""
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+import mercadopago
+import requests
+from django.conf import settings
+from django.utils import timezone
+from mercadopago.errors import MPServerError
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+_local = threading.local()
+_cliente = None
+_cliente_lock = threading.Lock()
+
+# códigos con reintento (los mismos que usa el SDK)
+REINTENTAR_EN = (429, 500, 502, 503, 504)
+
+
+class HttpClientSesion(HttpClient):
+    """HttpClient del SDK con una requests.Session persistente por hilo."""
+
+    def _sesion(self):
+        s = getattr(_local, 'sesion', None)
+        if s is None:
+            s = _local.sesion = requests.Session()
+            _local.adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            s.mount('https://', _local.adaptador)
+        return s
+
+    def request(self, method, url, maxretries=None, retry_on=None, backoff_factor=None, **kwargs):
+        sesion = self._sesion()
+        _local.adaptador.max_retries = Retry(
+            total=maxretries,
+            status_forcelist=retry_on if retry_on is not None else REINTENTAR_EN,
+            backoff_factor=backoff_factor or 0,
+        )
+        r = sesion.request(method, url, **kwargs)
+        respuesta = {'status': r.status_code, 'response': None}
+        if r.status_code != 204 and r.content:
+            try:
+                respuesta['response'] = r.json()
+            except ValueError as exc:
+                # mismo contrato que el HttpClient del SDK
+                raise MPServerError(
+                    r.status_code,
+                    {'message': 'Invalid JSON in response body', 'error': 'invalid_response'},
+                ) from exc
+        return respuesta
+
+
+def cliente() -> mercadopago.SDK:
+    """SDK de Mercado Pago del proceso (se crea en el primer uso)."""
+    global _cliente
+    token = settings.MP_ACCESS_TOKEN
+    with _cliente_lock:
+        if _cliente is None or _cliente.request_options.access_token != token:
+            _cliente = mercadopago.SDK(token, http_client=HttpClientSesion())
+        return _cliente
+
+
+def _ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'MP_PREFERENCIA_TTL', 86400))
+
+
+def preferencia_vigente(pago, monto: Decimal):
+    """
+    init_point de la preferencia guardada en el pago si sigue vigente (mismo
+    monto y creada hace menos de MP_PREFERENCIA_TTL); None si hay que crear
+    otra.
+    """
+    if not (pago.mp_preference_id and pago.mp_init_point and pago.mp_preference_creada):
+        return None
+    if pago.mp_preference_monto != monto:
+        return None
+    if pago.mp_preference_creada + _ttl() <= timezone.now():
+        return None
+    return pago.mp_init_point
+
+
+def guardar_preferencia(pago, preferencia: dict, monto: Decimal) -> None:
+    """Guarda en el pago la preferencia creada para poder reutilizarla."""
+    pago.mp_preference_id = preferencia.get('id')
+    pago.mp_init_point = preferencia.get('init_point')
+    pago.mp_preference_monto = monto
+    pago.mp_preference_creada = timezone.now()
+    pago.save(update_fields=[
+        'mp_preference_id', 'mp_init_point', 'mp_preference_monto', 'mp_preference_creada',
+    ])
@@ -0,0 +1,102 @@
+# Pagos/paginacion.py
+"""
+Paginación por cursor (keyset) sobre (fecha_vencimiento, numero_cuota,
+id_pago): cada página es un SELECT con WHERE sobre la clave y LIMIT, sin
+COUNT ni OFFSET, así que la página N cuesta lo mismo que la primera.
+"""
+import base64
+import json
+from datetime import date
+
+from django.db.models import Q
+
+ORDEN = ('fecha_vencimiento', 'numero_cuota', 'id_pago')
+
+# direcciones del cursor: siguiente, anterior, última página
+SIGUIENTE, ANTERIOR, ULTIMA = 'n', 'p', 'u'
+
+
+class PaginaCursor:
+    """Página de resultados con los tokens para moverse a los lados."""
+
+    def __init__(self, object_list, has_next: bool, has_previous: bool):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_token = _token(SIGUIENTE, object_list[-1]) if has_next and object_list else None
+        self.previous_token = _token(ANTERIOR, object_list[0]) if has_previous and object_list else None
+        self.last_token = _codificar([ULTIMA]) if has_next else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _codificar(datos) -> str:
+    crudo = json.dumps(datos, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def _token(direccion: str, pago) -> str:
+    return _codificar([direccion, pago.fecha_vencimiento.isoformat(), pago.numero_cuota, pago.id_pago])
+
+
+def _decodificar(token: str):
+    """(direccion, clave) del token; None si es inválido."""
+    try:
+        crudo = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        datos = json.loads(crudo)
+        if datos[0] == ULTIMA:
+            return ULTIMA, None
+        direccion, fecha, numero, id_pago = datos
+        if direccion not in (SIGUIENTE, ANTERIOR):
+            return None
+        return direccion, (date.fromisoformat(fecha), int(numero), int(id_pago))
+    except (ValueError, TypeError, IndexError, KeyError):
+        return None
+
+
+def _despues(clave) -> Q:
+    f, n, i = clave
+    return (
+        Q(fecha_vencimiento__gt=f)
+        | Q(fecha_vencimiento=f, numero_cuota__gt=n)
+        | Q(fecha_vencimiento=f, numero_cuota=n, id_pago__gt=i)
+    )
+
+
+def _antes(clave) -> Q:
+    f, n, i = clave
+    return (
+        Q(fecha_vencimiento__lt=f)
+        | Q(fecha_vencimiento=f, numero_cuota__lt=n)
+        | Q(fecha_vencimiento=f, numero_cuota=n, id_pago__lt=i)
+    )
+
+
+def paginar(qs, token: str | None = None, por_pagina: int = 12) -> PaginaCursor:
+    """
+    Página de `qs` a partir del token (None o inválido = primera página).
+    Se pide una fila de más para saber si hay otra página en esa dirección.
+    """
+    cursor = _decodificar(token) if token else None
+    asc = qs.order_by(*ORDEN)
+    desc = qs.order_by(*('-' + c for c in ORDEN))
+
+    if cursor is None:
+        filas = list(asc[:por_pagina + 1])
+        return PaginaCursor(filas[:por_pagina], len(filas) > por_pagina, False)
+
+    direccion, clave = cursor
+    if direccion == SIGUIENTE:
+        filas = list(asc.filter(_despues(clave))[:por_pagina + 1])
+        return PaginaCursor(filas[:por_pagina], len(filas) > por_pagina, True)
+
+    if direccion == ANTERIOR:
+        filas = list(desc.filter(_antes(clave))[:por_pagina + 1])
+    else:
+        filas = list(desc[:por_pagina + 1])
+    hay_antes = len(filas) > por_pagina
+    return PaginaCursor(filas[:por_pagina][::-1], direccion == ANTERIOR, hay_antes)
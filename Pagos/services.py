@@ -0,0 +1,147 @@
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import F, Q
+
+from Moneda.services import MONEDAS_SOPORTADAS, convertir_montos_batch, fecha_efectiva
+from .models import Pago
+
+# moneda -> campo de Pago con el equivalente precalculado
+CAMPOS_MONTO = {
+    'PEN': 'monto_pen',
+    'USD': 'monto_usd',
+    'EUR': 'monto_eur',
+}
+
+# estados de una cuota que aún no se paga
+POR_PAGAR = ('Pendiente', 'Vencido')
+
+
+def _q2(x) -> Decimal:
+    return Decimal(x).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def calcular_montos_convertidos(pagos, sin_red: bool = False):
+    """
+    Llena en memoria monto_pen/monto_usd/monto_eur y fecha_tc_montos de los
+    pagos (con prestamo cargado). Una conversión en bloque por moneda; si
+    una tasa no está disponible el campo queda en None y la fila sin
+    fecha_tc_montos, para que la complete el job de refresco.
+    sin_red=True (al guardar préstamos) usa solo tasas cacheadas o
+    guardadas: no bloquea la request esperando a un proveedor.
+    """
+    pagos = list(pagos)
+    for moneda in MONEDAS_SOPORTADAS:
+        campo = CAMPOS_MONTO.get(moneda)
+        if campo is None:
+            continue
+        convertidos = convertir_montos_batch(
+            [(p.monto, p.prestamo.moneda_prestamo, moneda, p.fecha_vencimiento) for p in pagos],
+            omitir_errores=True,
+            sin_red=sin_red,
+        )
+        for p, monto in zip(pagos, convertidos):
+            setattr(p, campo, _q2(monto) if monto is not None else None)
+    campos = [c for m, c in CAMPOS_MONTO.items() if m in MONEDAS_SOPORTADAS]
+    for p in pagos:
+        completo = all(getattr(p, c) is not None for c in campos)
+        p.fecha_tc_montos = fecha_efectiva(p.fecha_vencimiento) if completo else None
+    return pagos
+
+
+def _vigente(pago: Pago) -> bool:
+    """El equivalente guardado usa la tasa que hoy corresponde a la cuota."""
+    return (
+        pago.fecha_tc_montos is not None
+        and pago.fecha_tc_montos == fecha_efectiva(pago.fecha_vencimiento)
+    )
+
+
+def equivalentes(pagos, destinos, omitir_errores: bool = True) -> list:
+    """
+    Monto de cada pago expresado en su moneda destino (listas paralelas).
+    Usa el valor precalculado en la fila cuando está vigente y convierte en
+    bloque solo el resto.
+    """
+    resultado = []
+    a_convertir = []
+    for i, (p, destino) in enumerate(zip(pagos, destinos)):
+        destino = (destino or 'PEN').upper()
+        campo = CAMPOS_MONTO.get(destino)
+        guardado = getattr(p, campo) if campo else None
+        if guardado is not None and _vigente(p):
+            resultado.append(guardado)
+        else:
+            resultado.append(None)
+            a_convertir.append((i, p, destino))
+
+    convertidos = convertir_montos_batch(
+        [(p.monto, p.prestamo.moneda_prestamo, destino, p.fecha_vencimiento) for _, p, destino in a_convertir],
+        omitir_errores=omitir_errores,
+    )
+    for (i, _, _), monto in zip(a_convertir, convertidos):
+        resultado[i] = monto
+    return resultado
+
+
+def refrescar_montos_convertidos(batch_size: int = 500) -> int:
+    """
+    Recalcula los equivalentes de las cuotas por pagar cuyo tipo de cambio
+    ya no es el vigente (o que nunca se calcularon), en bloques con
+    bulk_update. Devuelve cuántas filas se actualizaron.
+    """
+    hoy = date.today()
+    qs = (
+        Pago.objects
+        .filter(estado__in=POR_PAGAR)
+        .filter(
+            Q(fecha_tc_montos__isnull=True)
+            | Q(fecha_vencimiento__gte=hoy, fecha_tc_montos__lt=hoy)
+            # vencidas desde el último refresco: su tasa pasa a ser la del vencimiento
+            | Q(fecha_vencimiento__lt=hoy, fecha_tc_montos__lt=F('fecha_vencimiento'))
+        )
+        .select_related('prestamo')
+        .order_by('id_pago')
+    )
+    campos = list(CAMPOS_MONTO.values()) + ['fecha_tc_montos']
+
+    total = 0
+    lote = []
+    for pago in qs.iterator(chunk_size=batch_size):
+        lote.append(pago)
+        if len(lote) >= batch_size:
+            Pago.objects.bulk_update(calcular_montos_convertidos(lote), campos)
+            total += len(lote)
+            lote = []
+    if lote:
+        Pago.objects.bulk_update(calcular_montos_convertidos(lote), campos)
+        total += len(lote)
+    return total
+
+
+def estado_por_fecha(fecha_vencimiento, hoy=None) -> str:
+    """Estado de una cuota no pagada según su vencimiento."""
+    return 'Vencido' if fecha_vencimiento < (hoy or date.today()) else 'Pendiente'
+
+
+def marcar_vencidos(hoy=None, prestamo_ids=None) -> dict:
+    """
+    Pasa a Vencido las cuotas Pendiente con vencimiento anterior a hoy (y
+    devuelve a Pendiente las Vencido cuyo vencimiento se movió a hoy o
+    después, p.ej. al editar el préstamo). Dos UPDATE sobre el índice
+    parcial de cuotas por pagar; no carga filas ni dispara señales (el
+    resumen del préstamo no cambia: cuenta igual Pendiente y Vencido).
+    La corren el job diario (`manage.py marcar_vencidos`) y el de alertas;
+    las vistas solo leen el estado guardado.
+    Devuelve {'vencidos': n, 'reabiertos': m}.
+    """
+    hoy = hoy or date.today()
+    # mismo predicado que el índice parcial: así lo usa también SQLite
+    qs = Pago.objects.filter(estado__in=POR_PAGAR)
+    if prestamo_ids is not None:
+        qs = qs.filter(prestamo__in=list(prestamo_ids))
+    return {
+        'vencidos': qs.filter(estado='Pendiente', fecha_vencimiento__lt=hoy).update(estado='Vencido'),
+        'reabiertos': qs.filter(estado='Vencido', fecha_vencimiento__gte=hoy).update(estado='Pendiente'),
+    }
+
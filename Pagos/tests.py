@@ -1,3 +1,440 @@
-from django.test import TestCase
+import importlib
+import threading
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from mercadopago.errors import MPServerError
+
+import Moneda.services as moneda
+from Moneda.models import TipoCambio
+from Prestamos.tests import crear_persona, crear_prestamo
+from . import mp, views
+from .models import Pago
+from .paginacion import ORDEN, paginar
+from .services import (
+    POR_PAGAR, _vigente, calcular_montos_convertidos, equivalentes, marcar_vencidos,
+    refrescar_montos_convertidos,
+)
+
+
+class RefrescarMontosTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        self.prestamo = crear_prestamo(crear_persona(), cuotas_totales=3)
+
+    def test_refresca_cuotas_vencidas_desde_el_ultimo_refresco(self):
+        hoy = date.today()
+        vence = hoy - timedelta(days=5)
+        # calculada cuando aún no vencía: la tasa guardada es la de ese día
+        Pago.objects.filter(prestamo=self.prestamo, numero_cuota=1).update(
+            fecha_vencimiento=vence, fecha_tc_montos=vence - timedelta(days=10),
+            monto_pen=Decimal('1'), monto_usd=Decimal('1'), monto_eur=Decimal('1'),
+        )
+        TipoCambio.objects.bulk_create([
+            TipoCambio(fecha=vence, base='USD', destino='PEN', valor=Decimal('3.600000')),
+            TipoCambio(fecha=vence, base='USD', destino='EUR', valor=Decimal('0.900000')),
+        ])
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            refrescar_montos_convertidos()
+
+        pago = Pago.objects.select_related('prestamo').get(prestamo=self.prestamo, numero_cuota=1)
+        self.assertEqual(pago.fecha_tc_montos, vence)
+        self.assertTrue(_vigente(pago))
+        self.assertEqual(pago.monto_pen, (pago.monto * Decimal('3.6')).quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+
+class EquivalentesTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        TipoCambio.objects.bulk_create([
+            TipoCambio(fecha=date.today(), base='USD', destino='PEN', valor=Decimal('3.600000')),
+            TipoCambio(fecha=date.today(), base='USD', destino='EUR', valor=Decimal('0.900000')),
+        ])
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            self.prestamo = crear_prestamo(crear_persona(), cuotas_totales=3)
+        self.pagos = list(Pago.objects.filter(prestamo=self.prestamo).select_related('prestamo').order_by('numero_cuota'))
+
+    def test_se_guardan_al_crear_el_prestamo(self):
+        for pago in self.pagos:
+            self.assertTrue(_vigente(pago))
+            self.assertEqual(pago.fecha_tc_montos, date.today())
+            self.assertEqual(pago.monto_usd, pago.monto)
+            self.assertEqual(pago.monto_pen, (pago.monto * Decimal('3.6')).quantize(Decimal('0.01'), ROUND_HALF_UP))
+            self.assertEqual(pago.monto_eur, (pago.monto * Decimal('0.9')).quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+    def test_usa_el_valor_guardado_sin_convertir(self):
+        moneda.tasas_cache.limpiar()
+        with self.assertNumQueries(0):
+            montos = equivalentes(self.pagos, ['pen', 'EUR', 'USD'])
+        self.assertEqual(montos, [self.pagos[0].monto_pen, self.pagos[1].monto_eur, self.pagos[2].monto_usd])
+
+    def test_convierte_solo_lo_que_no_esta_vigente(self):
+        viejo = self.pagos[0]
+        viejo.fecha_tc_montos = date.today() - timedelta(days=1)
+        viejo.monto_pen = Decimal('1.00')
+        sin_calcular = self.pagos[1]
+        sin_calcular.monto_pen = None
+
+        montos = equivalentes(self.pagos, ['PEN'] * 3)
+
+        self.assertEqual(montos[0], viejo.monto * Decimal('3.6'))
+        self.assertEqual(montos[1], sin_calcular.monto * Decimal('3.6'))
+        self.assertEqual(montos[2], self.pagos[2].monto_pen)
+
+    def test_sin_tasa_quedan_pendientes_para_el_refresco(self):
+        TipoCambio.objects.all().delete()
+        moneda.tasas_cache.limpiar()
+        pagos = calcular_montos_convertidos(self.pagos, sin_red=True)
+
+        self.assertTrue(all(p.monto_usd == p.monto for p in pagos))
+        self.assertTrue(all(p.monto_pen is None and p.fecha_tc_montos is None for p in pagos))
+
+
+@override_settings(ALERTAS_WORKER_HILO=False)
+class FilasListadoTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        TipoCambio.objects.bulk_create([
+            TipoCambio(fecha=date.today(), base='USD', destino='PEN', valor=Decimal('3.600000')),
+            TipoCambio(fecha=date.today(), base='USD', destino='EUR', valor=Decimal('0.900000')),
+        ])
+        self.user = User.objects.create_user('ana', password='x')
+        self.persona = crear_persona(user=self.user)
+        self.client.force_login(self.user)
+        self.usd = crear_prestamo(self.persona, cuotas_totales=3, moneda_prestamo='USD', moneda_pago='PEN')
+        self.pen = crear_prestamo(self.persona, cuotas_totales=3, moneda_prestamo='PEN', moneda_pago='PEN')
+
+    def test_filas_con_equivalentes_guardados_no_consultan(self):
+        pagos = list(Pago.objects.filter(prestamo__persona=self.persona).select_related('prestamo').order_by('pk'))
+        moneda.tasas_cache.limpiar()
+        with self.assertNumQueries(0):
+            filas = views._filas(pagos, 'PEN')
+
+        for f in filas:
+            if f['pago'].prestamo_id == self.usd.pk:
+                self.assertEqual((f['sym_origen'], f['sym_destino']), ('$/', 'S/'))
+                self.assertEqual(f['equiv'], f['pago'].monto_pen)
+            else:
+                self.assertIsNone(f['equiv'])
+            self.assertEqual(f['monto_base'], f['pago'].monto)
+
+    def test_consultas_del_listado_no_crecen_con_las_filas(self):
+        def consultas() -> int:
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(reverse('pagos:lista_pagos')).status_code, 200)
+            return len(ctx.captured_queries)
+
+        pocas = consultas()
+        crear_prestamo(self.persona, cuotas_totales=6, moneda_prestamo='EUR', moneda_pago='USD')
+        self.assertEqual(consultas(), pocas)
+
+    def test_api(self):
+        r = self.client.get(reverse('pagos:api_pagos'), {'listado': 'pendientes'})
+        self.assertEqual(r.status_code, 200)
+        filas = {(f['prestamo'], f['numero_cuota']): f for f in r.json()['pagos']}
+        self.assertEqual(len(filas), 6)
+        pago = Pago.objects.get(prestamo=self.usd, numero_cuota=1)
+        self.assertEqual(filas[(self.usd.pk, 1)]['equivalente'], str(pago.monto_pen))
+        self.assertIsNone(filas[(self.pen.pk, 1)]['equivalente'])
+
+        self.assertEqual(self.client.get(reverse('pagos:api_pagos'), {'listado': 'otro'}).status_code, 400)
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        persona = crear_persona()
+        # dos préstamos con las mismas fechas: empates en fecha_vencimiento
+        for _ in range(2):
+            crear_prestamo(persona, cuotas_totales=13, moneda_prestamo='PEN', moneda_pago='PEN')
+        self.qs = Pago.objects.filter(prestamo__persona=persona)
+        self.todos = list(self.qs.order_by(*ORDEN).values_list('pk', flat=True))
+
+    def ids(self, pagina) -> list:
+        return [p.pk for p in pagina]
+
+    def test_recorre_hacia_adelante_y_hacia_atras(self):
+        paginas, pagina = [], paginar(self.qs, None, 10)
+        self.assertFalse(pagina.has_previous)
+        while True:
+            paginas.append(self.ids(pagina))
+            if not pagina.has_next:
+                break
+            pagina = paginar(self.qs, pagina.next_token, 10)
+        self.assertEqual([len(p) for p in paginas], [10, 10, 6])
+        self.assertEqual(sum(paginas, []), self.todos)
+        self.assertIsNone(pagina.next_token)
+
+        hacia_atras = [self.ids(pagina)]
+        while pagina.has_previous:
+            pagina = paginar(self.qs, pagina.previous_token, 10)
+            hacia_atras.insert(0, self.ids(pagina))
+        self.assertEqual(hacia_atras, paginas)
+
+    def test_ultima_pagina(self):
+        primera = paginar(self.qs, None, 10)
+        ultima = paginar(self.qs, primera.last_token, 10)
+
+        self.assertEqual(self.ids(ultima), self.todos[-10:])
+        self.assertTrue(ultima.has_previous)
+        self.assertFalse(ultima.has_next)
+        self.assertEqual(self.ids(paginar(self.qs, ultima.previous_token, 10)), self.todos[-20:-10])
+
+    def test_token_invalido_es_la_primera_pagina(self):
+        for token in ('basura', 'W10', 'WyJ4IiwxLDIsM10'):
+            with self.subTest(token=token):
+                self.assertEqual(self.ids(paginar(self.qs, token, 10)), self.todos[:10])
+
+    def test_cada_pagina_es_una_consulta(self):
+        token = paginar(self.qs, None, 10).next_token
+        with self.assertNumQueries(1):
+            paginar(self.qs, token, 10)
+
+
+class MarcarVencidosTests(TestCase):
+    def setUp(self):
+        self.hoy = date.today()
+        self.prestamo = crear_prestamo(
+            crear_persona(), cuotas_totales=3, moneda_prestamo='PEN', moneda_pago='PEN',
+        )
+        self.otro = crear_prestamo(crear_persona(correo='beto@example.com'), cuotas_totales=3)
+        # cuota 1 vencida, 2 vence hoy, 3 futura; todas Pendiente
+        for prestamo in (self.prestamo, self.otro):
+            for n, dias in ((1, -1), (2, 0), (3, 30)):
+                Pago.objects.filter(prestamo=prestamo, numero_cuota=n).update(
+                    fecha_vencimiento=self.hoy + timedelta(days=dias), estado='Pendiente',
+                )
+
+    def estados(self, prestamo) -> list:
+        return list(Pago.objects.filter(prestamo=prestamo).order_by('numero_cuota').values_list('estado', flat=True))
+
+    def test_marca_las_vencidas_y_reabre_las_movidas(self):
+        Pago.objects.filter(prestamo=self.prestamo, numero_cuota=3).update(estado='Vencido')
+        Pago.objects.filter(prestamo=self.prestamo, numero_cuota=2).update(estado='Pagado')
+
+        r = marcar_vencidos(self.hoy)
+
+        self.assertEqual(r, {'vencidos': 2, 'reabiertos': 1})
+        self.assertEqual(self.estados(self.prestamo), ['Vencido', 'Pagado', 'Pendiente'])
+        self.assertEqual(self.estados(self.otro), ['Vencido', 'Pendiente', 'Pendiente'])
+        # idempotente
+        self.assertEqual(marcar_vencidos(self.hoy), {'vencidos': 0, 'reabiertos': 0})
+
+    def test_solo_los_prestamos_pedidos(self):
+        r = marcar_vencidos(self.hoy, prestamo_ids=[self.prestamo.pk])
+
+        self.assertEqual(r, {'vencidos': 1, 'reabiertos': 0})
+        self.assertEqual(self.estados(self.prestamo), ['Vencido', 'Pendiente', 'Pendiente'])
+        self.assertEqual(self.estados(self.otro), ['Pendiente', 'Pendiente', 'Pendiente'])
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('marcar_vencidos', stdout=salida)
+
+        self.assertIn('Cuotas marcadas como vencidas: 2 (reabiertas: 0)', salida.getvalue())
+        self.assertEqual(self.estados(self.otro), ['Vencido', 'Pendiente', 'Pendiente'])
+
+    def test_migracion_de_datos(self):
+        migracion = importlib.import_module('Pagos.migrations.0007_pago_estado_vencido')
+
+        migracion.marcar_vencidos(apps, None)
+        self.assertEqual(self.estados(self.prestamo), ['Vencido', 'Pendiente', 'Pendiente'])
+
+        migracion.desmarcar_vencidos(apps, None)
+        self.assertEqual(self.estados(self.prestamo), ['Pendiente', 'Pendiente', 'Pendiente'])
+
+    @override_settings(ALERTAS_WORKER_HILO=False)
+    def test_las_vistas_no_escriben_el_estado(self):
+        user = User.objects.create_user('ana', password='x')
+        self.prestamo.persona.user = user
+        self.prestamo.persona.save()
+        self.client.force_login(user)
+
+        for url in (
+            reverse('pagos:lista_pagos'), reverse('pagos:vencidos'),
+            reverse('prestamos:pagos_por_prestamo', args=[self.prestamo.pk]),
+            reverse('reportes:dashboard'), reverse('reportes:agenda'),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        # lo marca el job diario, no la petición
+        self.assertEqual(self.estados(self.prestamo), ['Pendiente', 'Pendiente', 'Pendiente'])
+        self.assertEqual(self.estados(self.otro), ['Pendiente', 'Pendiente', 'Pendiente'])
+
+
+def _respuesta(status: int, contenido: bytes) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r._content = contenido
+    return r
+
+
+class HttpClientSesionTests(TestCase):
+    def setUp(self):
+        mp._local.__dict__.clear()
+
+    def test_reutiliza_la_sesion_del_hilo(self):
+        sesiones = []
+
+        def request(sesion, method, url, **kwargs):
+            sesiones.append(sesion)
+            return _respuesta(201, b'{"id": "p1"}')
+
+        http = mp.HttpClientSesion()
+        with mock.patch.object(requests.Session, 'request', autospec=True, side_effect=request):
+            r1 = http.post('https://api.mercadopago.com/checkout/preferences', headers={})
+            r2 = http.get('https://api.mercadopago.com/checkout/preferences/p1', headers={})
+            otro_hilo = threading.Thread(target=lambda: http.get('https://api.mercadopago.com/x', headers={}))
+            otro_hilo.start()
+            otro_hilo.join()
+
+        self.assertEqual(r1, {'status': 201, 'response': {'id': 'p1'}})
+        self.assertEqual(r2['status'], 201)
+        self.assertIs(sesiones[0], sesiones[1])
+        self.assertIsNot(sesiones[0], sesiones[2])
+
+    def test_sin_cuerpo(self):
+        with mock.patch.object(requests.Session, 'request', return_value=_respuesta(204, b'')):
+            r = mp.HttpClientSesion().get('https://api.mercadopago.com/x', headers={})
+        self.assertEqual(r, {'status': 204, 'response': None})
+
+    def test_cuerpo_no_json_lanza_mpservererror(self):
+        html = _respuesta(502, b'<html>Bad Gateway</html>')
+        with mock.patch.object(requests.Session, 'request', return_value=html):
+            with self.assertRaises(MPServerError) as ctx:
+                mp.HttpClientSesion().post('https://api.mercadopago.com/x', headers={})
+        self.assertEqual(ctx.exception.status_code, 502)
+
+    def test_cliente_se_recrea_al_cambiar_el_token(self):
+        with override_settings(MP_ACCESS_TOKEN='TEST-1'):
+            a, b = mp.cliente(), mp.cliente()
+        with override_settings(MP_ACCESS_TOKEN='TEST-2'):
+            c = mp.cliente()
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+        self.assertIsInstance(c.http_client, mp.HttpClientSesion)
+
+
+@override_settings(MP_ACCESS_TOKEN='TEST-1', MP_PREFERENCIA_TTL=3600, ALERTAS_WORKER_HILO=False)
+class PreferenciaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='x')
+        prestamo = crear_prestamo(
+            crear_persona(user=self.user), cuotas_totales=3, moneda_prestamo='PEN', moneda_pago='PEN',
+        )
+        self.pago = Pago.objects.get(prestamo=prestamo, numero_cuota=1)
+        self.monto = self.pago.monto.quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+    def test_guardar_y_reutilizar(self):
+        self.assertIsNone(mp.preferencia_vigente(self.pago, self.monto))
+
+        mp.guardar_preferencia(self.pago, {'id': 'p1', 'init_point': 'https://mp.test/p1'}, self.monto)
+        pago = Pago.objects.get(pk=self.pago.pk)
+
+        self.assertEqual(pago.mp_preference_id, 'p1')
+        self.assertEqual(pago.mp_preference_monto, self.monto)
+        self.assertEqual(mp.preferencia_vigente(pago, self.monto), 'https://mp.test/p1')
+        # otro monto o vencida: hay que crear otra
+        self.assertIsNone(mp.preferencia_vigente(pago, self.monto + Decimal('0.01')))
+        pago.mp_preference_creada = timezone.now() - timedelta(seconds=3600)
+        self.assertIsNone(mp.preferencia_vigente(pago, self.monto))
+
+    def test_pagar_cuota_reutiliza_la_preferencia(self):
+        self.client.force_login(self.user)
+        creada = {'status': 201, 'response': {'id': 'p1', 'init_point': 'https://mp.test/p1'}}
+        with mock.patch.object(mp.cliente(), 'preference') as preference:
+            preference.return_value.create.return_value = creada
+            r1 = self.client.get(reverse('pagos:pagar_cuota', args=[self.pago.pk]))
+            r2 = self.client.get(reverse('pagos:pagar_cuota', args=[self.pago.pk]))
+
+        self.assertRedirects(r1, 'https://mp.test/p1', fetch_redirect_response=False)
+        self.assertRedirects(r2, 'https://mp.test/p1', fetch_redirect_response=False)
+        preference.return_value.create.assert_called_once()
+
+    def test_pagar_cuota_con_respuesta_no_json(self):
+        self.client.force_login(self.user)
+        html = _respuesta(502, b'<html>Bad Gateway</html>')
+        with mock.patch.object(requests.Session, 'request', return_value=html):
+            r = self.client.get(reverse('pagos:pagar_cuota', args=[self.pago.pk]))
+
+        self.assertRedirects(r, reverse('pagos:lista_pagos'), fetch_redirect_response=False)
+        self.assertIsNone(Pago.objects.get(pk=self.pago.pk).mp_preference_id)
+
+
+def _consultas_calientes(persona_id: int, prestamo_id: int) -> dict:
+    """Consultas frecuentes sobre Pago (mismos filtros que las vistas y jobs)."""
+    hoy = date.today()
+    inicio_mes = hoy.replace(day=1)
+    por_persona = Pago.objects.filter(prestamo__persona_id=persona_id)
+    orden = ('fecha_vencimiento', 'numero_cuota', 'id_pago')
+    return {
+        'listado pendientes': por_persona.filter(estado__in=POR_PAGAR).order_by(*orden)[:13],
+        'listado vencidos': por_persona.filter(estado='Vencido').order_by(*orden)[:13],
+        'dashboard': por_persona.filter(
+            Q(fecha_vencimiento__gte=inicio_mes, fecha_vencimiento__lte=hoy)
+            | Q(fecha_vencimiento__lt=inicio_mes, estado__in=POR_PAGAR)
+        ).order_by('fecha_vencimiento', 'numero_cuota'),
+        'agenda': por_persona.filter(
+            estado='Pendiente', fecha_vencimiento__gte=hoy, fecha_vencimiento__lte=hoy + timedelta(days=7),
+        ).order_by('fecha_vencimiento', 'numero_cuota'),
+        'alertas': por_persona.filter(
+            estado='Pendiente', fecha_vencimiento__in=[hoy + timedelta(days=d) for d in (0, 1, 3)],
+        ),
+        'por pagar globales': Pago.objects.filter(estado__in=POR_PAGAR, fecha_vencimiento__lt=hoy),
+        'marcar vencidos': Pago.objects.filter(estado__in=POR_PAGAR).filter(
+            estado='Pendiente', fecha_vencimiento__lt=hoy,
+        ),
+        'reabrir vencidos': Pago.objects.filter(estado__in=POR_PAGAR).filter(
+            estado='Vencido', fecha_vencimiento__gte=hoy,
+        ),
+        'cuotas del préstamo': Pago.objects.filter(prestamo_id=prestamo_id).order_by('numero_cuota'),
+    }
+
+
+# SQLite no deduce el predicado del índice parcial desde estado IN (?, ?)
+# (sí desde estado = ?); PostgreSQL sí
+SOLO_POSTGRES = {'por pagar globales'}
+
+
+class IndicesPagoTests(TestCase):
+    """Las consultas frecuentes sobre Pago no recorren la tabla completa."""
+
+    def _scan_secuencial(self, plan: str) -> bool:
+        tabla = Pago._meta.db_table
+        if connection.vendor == 'postgresql':
+            return f'Seq Scan on "{tabla}"' in plan or f'Seq Scan on {tabla}' in plan
+        return any(
+            linea.split('SCAN ', 1)[1].split()[0] == tabla and 'USING' not in linea
+            for linea in plan.splitlines() if 'SCAN ' in linea
+        )
+
+    def test_consultas_calientes_usan_indices(self):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.skipTest(f'EXPLAIN no verificado en {connection.vendor}')
+        prestamo = crear_prestamo(crear_persona(), cuotas_totales=3)
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # con tablas chicas el planner prefiere el seq scan aunque
+                # el índice sirva; así se verifica que el índice es usable
+                with connection.cursor() as cur:
+                    cur.execute('SET LOCAL enable_seqscan = off')
+            for nombre, qs in _consultas_calientes(prestamo.persona_id, prestamo.pk).items():
+                with self.subTest(consulta=nombre):
+                    if nombre in SOLO_POSTGRES and connection.vendor != 'postgresql':
+                        continue
+                    plan = qs.explain()
+                    self.assertFalse(self._scan_secuencial(plan), f'{nombre}:\n{plan}')
@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.lista_pagos, name='lista_pagos'),
     path('pendientes/', views.pagos_pendientes, name='pendientes'),
     path('vencidos/', views.pagos_vencidos, name='vencidos'),
+    path('api/', views.api_pagos, name='api_pagos'),
     path("pagar/<int:pago_id>/", views.pagar_cuota, name="pagar_cuota"),
     path("mp/success/", views.mp_success, name="mp_success"),
     path("mp/failure/", views.mp_failure, name="mp_failure"),
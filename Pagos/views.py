@@ -1,19 +1,19 @@
 # Pagos/views.py
 from decimal import Decimal, ROUND_HALF_UP
 
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST, require_GET
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.contrib import messages
-from django.conf import settings
 from django.urls import reverse
 
-import mercadopago
-
 from .models import Pago
 from Moneda.services import convertir_monto, obtener_tipo_cambio
+from .mp import cliente, guardar_preferencia, preferencia_vigente
+from .paginacion import paginar
+from .services import POR_PAGAR, equivalentes
 
 
 def _q2(x) -> Decimal:
@@ -35,133 +35,116 @@ def _sym(mon: str) -> str:
 # LISTADO / PENDIENTES / VENCIDOS
 # ======================================================
 
-@login_required
-def lista_pagos(request):
-    persona = getattr(request.user, 'persona', None)
-    if not persona:
-        return render(request, 'pagos/lista_pagos.html', {'filas': [], 'page_obj': None})
+# filas por página en los listados
+POR_PAGINA = 12
 
-    pagos_qs = (
-        Pago.objects
-        .filter(prestamo__persona=persona)
-        .select_related('prestamo', 'prestamo__persona')
-        .order_by('fecha_vencimiento', 'numero_cuota')
-    )
 
-    paginator = Paginator(pagos_qs, 12)
-    page_number = request.GET.get('page') or 1
-    page_obj = paginator.get_page(page_number)
-
-    filas = []
-    preferida = (persona.moneda_preferida or 'PEN').upper()
-
-    for p in page_obj.object_list:
-        origen = (p.prestamo.moneda_prestamo or 'PEN').upper()
-        destino = (getattr(p.prestamo, 'moneda_pago', None) or preferida).upper()
-
-        monto_base = _q2(p.monto)
-        equiv = None
-
-        if origen != destino:
-            try:
-                equiv = _q2(convertir_monto(p.monto, origen, destino, p.fecha_vencimiento))
-            except Exception:
-                equiv = None
+def _filas(pagos, preferida: str) -> list:
+    """
+    Filas de los listados de pagos: equivalentes de toda la página en un
+    solo bloque (precalculados en Pago o convertidos juntos) y símbolos
+    calculados una vez por moneda.
+    """
+    pagos = list(pagos)
+    monedas = [
+        (
+            (p.prestamo.moneda_prestamo or 'PEN').upper(),
+            (getattr(p.prestamo, 'moneda_pago', None) or preferida).upper(),
+        )
+        for p in pagos
+    ]
+    equivs = equivalentes(pagos, [d for _, d in monedas])
+    simbolos = {m: _sym(m) for par in set(monedas) for m in par}
 
-        filas.append({
+    return [
+        {
             'pago': p,
-            'monto_base': monto_base,
-            'equiv': equiv,
-            'sym_origen': _sym(origen),
-            'sym_destino': _sym(destino),
-        })
-
-    ctx = {
-        'filas': filas,
-        'page_obj': page_obj,
-    }
-    return render(request, 'pagos/lista_pagos.html', ctx)
+            'monto_base': _q2(p.monto),
+            'equiv': _q2(equiv) if (origen != destino and equiv is not None) else None,
+            'sym_origen': simbolos[origen],
+            'sym_destino': simbolos[destino],
+        }
+        for p, (origen, destino), equiv in zip(pagos, monedas, equivs)
+    ]
 
 
-@login_required
-def pagos_pendientes(request):
-    persona = getattr(request.user, 'persona', None)
-    if not persona:
-        return render(request, 'pagos/pendientes.html', {'filas': []})
+# filtros de cada listado
+LISTADOS = {
+    'todos': lambda: {},
+    'pendientes': lambda: {'estado__in': POR_PAGAR},
+    'vencidos': lambda: {'estado': 'Vencido'},
+}
 
-    preferida = (persona.moneda_preferida or 'PEN').upper()
 
+def _pagina(request, persona, listado: str):
+    """Página (por cursor, ?cursor=...) del listado pedido y sus filas."""
     qs = (
         Pago.objects
-        .filter(prestamo__persona=persona, estado='Pendiente')
+        .filter(prestamo__persona=persona, **LISTADOS[listado]())
         .select_related('prestamo', 'prestamo__persona')
-        .order_by('fecha_vencimiento', 'numero_cuota')
     )
+    page_obj = paginar(qs, request.GET.get('cursor'), POR_PAGINA)
+    preferida = (persona.moneda_preferida or 'PEN').upper()
+    return page_obj, _filas(page_obj.object_list, preferida)
 
-    filas = []
-    for p in qs:
-        origen = (p.prestamo.moneda_prestamo or 'PEN').upper()
-        destino = (getattr(p.prestamo, 'moneda_pago', None) or preferida).upper()
-
-        monto_base = _q2(p.monto)
-        equiv = None
 
-        if origen != destino:
-            try:
-                equiv = _q2(convertir_monto(p.monto, origen, destino, p.fecha_vencimiento))
-            except Exception:
-                equiv = None
-
-        filas.append({
-            'pago': p,
-            'monto_base': monto_base,
-            'equiv': equiv,
-            'sym_origen': _sym(origen),
-            'sym_destino': _sym(destino),
-        })
+def _listado(request, template: str, listado: str):
+    persona = getattr(request.user, 'persona', None)
+    if not persona:
+        return render(request, template, {'filas': [], 'page_obj': None})
 
-    return render(request, 'pagos/pendientes.html', {'filas': filas})
+    page_obj, filas = _pagina(request, persona, listado)
+    return render(request, template, {'filas': filas, 'page_obj': page_obj})
 
 
 @login_required
-def pagos_vencidos(request):
-    persona = getattr(request.user, 'persona', None)
-    if not persona:
-        return render(request, 'pagos/vencidos.html', {'filas': []})
+def lista_pagos(request):
+    return _listado(request, 'pagos/lista_pagos.html', 'todos')
 
-    preferida = (persona.moneda_preferida or 'PEN').upper()
-    hoy = timezone.localdate()
 
-    qs = (
-        Pago.objects
-        .filter(prestamo__persona=persona, estado='Pendiente', fecha_vencimiento__lt=hoy)
-        .select_related('prestamo', 'prestamo__persona')
-        .order_by('fecha_vencimiento', 'numero_cuota')
-    )
+@login_required
+def pagos_pendientes(request):
+    return _listado(request, 'pagos/pendientes.html', 'pendientes')
 
-    filas = []
-    for p in qs:
-        origen = (p.prestamo.moneda_prestamo or 'PEN').upper()
-        destino = (getattr(p.prestamo, 'moneda_pago', None) or preferida).upper()
 
-        monto_base = _q2(p.monto)
-        equiv = None
+@login_required
+def pagos_vencidos(request):
+    return _listado(request, 'pagos/vencidos.html', 'vencidos')
 
-        if origen != destino:
-            try:
-                equiv = _q2(convertir_monto(p.monto, origen, destino, p.fecha_vencimiento))
-            except Exception:
-                equiv = None
 
-        filas.append({
-            'pago': p,
-            'monto_base': monto_base,
-            'equiv': equiv,
-            'sym_origen': _sym(origen),
-            'sym_destino': _sym(destino),
-        })
+@login_required
+@require_GET
+def api_pagos(request):
+    """
+    Listado en JSON: ?listado=todos|pendientes|vencidos&cursor=<token>.
+    Devuelve las filas y los tokens `siguiente` / `anterior` (null si no hay).
+    """
+    listado = request.GET.get('listado') or 'todos'
+    if listado not in LISTADOS:
+        return JsonResponse({'error': f'Listado inválido: {listado}'}, status=400)
+    persona = getattr(request.user, 'persona', None)
+    if not persona:
+        return JsonResponse({'pagos': [], 'siguiente': None, 'anterior': None})
 
-    return render(request, 'pagos/vencidos.html', {'filas': filas})
+    page_obj, filas = _pagina(request, persona, listado)
+    return JsonResponse({
+        'pagos': [
+            {
+                'id_pago': f['pago'].id_pago,
+                'prestamo': f['pago'].prestamo_id,
+                'banco': f['pago'].prestamo.banco,
+                'numero_cuota': f['pago'].numero_cuota,
+                'fecha_vencimiento': f['pago'].fecha_vencimiento.isoformat(),
+                'estado': f['pago'].estado,
+                'moneda': (f['pago'].prestamo.moneda_prestamo or 'PEN').upper(),
+                'monto': str(f['monto_base']),
+                'equivalente': str(f['equiv']) if f['equiv'] is not None else None,
+            }
+            for f in filas
+        ],
+        'siguiente': page_obj.next_token,
+        'anterior': page_obj.previous_token,
+    })
 
 
 # ======================================================
@@ -226,18 +209,20 @@ def _monto_en_pen_desde_pago(pago: Pago) -> float:
 def pagar_cuota(request, pago_id: int):
     """
     Crea una preferencia de pago en Mercado Pago para la cuota indicada
-    y redirige al Checkout Pro.
+    y redirige al Checkout Pro. Si la cuota ya tiene una preferencia
+    vigente por el mismo monto se reutiliza sin llamar a Mercado Pago.
     """
     pago = get_object_or_404(
         Pago,
         pk=pago_id,
         prestamo__persona__user=request.user,
-        estado="Pendiente",
+        estado__in=POR_PAGAR,
     )
 
-    sdk = mercadopago.SDK(settings.MP_ACCESS_TOKEN)
-
     monto_pen = _monto_en_pen_desde_pago(pago)
+    init_point = preferencia_vigente(pago, _q2(monto_pen))
+    if init_point:
+        return redirect(init_point)
 
     back_success = request.build_absolute_uri(reverse("pagos:mp_success"))
     back_failure = request.build_absolute_uri(reverse("pagos:mp_failure"))
@@ -268,7 +253,7 @@ def pagar_cuota(request, pago_id: int):
     }
 
     try:
-        result = sdk.preference().create(preference_data)
+        result = cliente().preference().create(preference_data)
         print("=== MERCADO PAGO RESULT ===")
         print(result)
     except Exception as e:
@@ -312,12 +297,9 @@ def pagar_cuota(request, pago_id: int):
 
 
     pref = response
-    init_point = pref.get("init_point")
-
-    pago.mp_preference_id = pref.get("id")
-    pago.save(update_fields=["mp_preference_id"])
+    guardar_preferencia(pago, pref, _q2(monto_pen))
 
-    return redirect(init_point)
+    return redirect(pref.get("init_point"))
 
 
 @login_required
@@ -0,0 +1,144 @@
+# Prestamos/amortizacion.py
+from decimal import Decimal
+
+try:
+    # NumPy es opcional: sin él se usa el cálculo préstamo por préstamo
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# margen alrededor de .5 centavos dentro del cual el float no es confiable
+# y el redondeo se rehace en Decimal
+_EPS_CENTAVO = 1e-5
+_CENTAVO = Decimal('0.01')
+
+
+def _dec_centavos(c) -> Decimal:
+    """Entero de centavos -> Decimal con 2 decimales (igual que _round2)."""
+    return Decimal(int(c)) * _CENTAVO
+
+
+def _referencia(principales, teas, plazos) -> list:
+    """Cálculo préstamo por préstamo con filas_cronograma (sin NumPy)."""
+    from .services import filas_cronograma
+    return [filas_cronograma(P, tea, n) for P, tea, n in zip(principales, teas, plazos)]
+
+
+def _redondear_centavos(x, exacto):
+    """
+    Redondeo HALF_UP a centavo de un arreglo float `x` (en centavos, >= 0).
+    Los valores que caen a menos de _EPS_CENTAVO de .5 se recalculan con
+    `exacto(indice)` (Decimal), para que el resultado sea idéntico al de
+    _round2.
+    """
+    out = np.floor(x + 0.5).astype(np.int64)
+    frac = x - np.floor(x)
+    dudosos = np.nonzero(np.abs(frac - 0.5) < _EPS_CENTAVO)[0]
+    for idx in dudosos:
+        out[idx] = exacto(int(idx))
+    return out
+
+
+def calcular_cronogramas(principales, teas, plazos) -> list:
+    """
+    Cronogramas de muchos préstamos a la vez. Recibe listas paralelas de
+    principal, TEA (%) y número de cuotas; devuelve, por préstamo, una
+    lista de tuplas (monto, interes, capital, saldo) en Decimal, idénticas
+    a las de filas_cronograma.
+
+    Con NumPy las columnas se calculan en centavos (int64) para todos los
+    préstamos en cada periodo; los redondeos que el float no puede
+    garantizar se concilian en Decimal.
+    """
+    from .services import _i_mensual_desde_tea, _to_dec, _round2
+
+    principales = [_to_dec(P) for P in principales]
+    teas = [_to_dec(t or 0) for t in teas]
+    plazos = [int(n or 0) for n in plazos]
+    # principales con más de 2 decimales no caben en centavos enteros
+    if not HAS_NUMPY or not principales or any(P != _round2(P) for P in principales):
+        return _referencia(principales, teas, plazos)
+
+    L = len(principales)
+    # tasa mensual: misma función (memoizada) que el cálculo por préstamo
+    i_dec = [_i_mensual_desde_tea(t) for t in teas]
+    i = np.array([float(x) for x in i_dec], dtype=np.float64)
+    n = np.array(plazos, dtype=np.int64)
+    P_c = np.array([int(P * 100) for P in principales], dtype=np.int64)
+    frances = (i > 0) & (n > 0)   # sin cuotas no hay cuota fija que calcular
+
+    # --- cuota fija (centavos) ---
+    cuota = np.zeros(L, dtype=np.int64)
+    if frances.any():
+        idx_f = np.nonzero(frances)[0]
+        i_f = i[idx_f]
+        cuota_f = (P_c[idx_f] * i_f) / (1.0 - np.power(1.0 + i_f, -n[idx_f].astype(np.float64)))
+
+        def cuota_exacta(k):
+            j = idx_f[k]
+            P, ii = principales[j], i_dec[j]
+            c = P * ii / (Decimal('1') - ((Decimal('1') + ii) ** Decimal(-plazos[j])))
+            return int(_round2(c) * 100)
+
+        cuota[idx_f] = _redondear_centavos(cuota_f, cuota_exacta)
+
+    # --- prorrateo sin interés: base = round_half_up(P / n) ---
+    sin_interes = (~frances) & (n > 0)
+    n_seguro = np.maximum(n, 1)
+    base_prorrateo = (2 * P_c + n_seguro) // (2 * n_seguro)
+
+    max_n = int(n.max()) if L else 0
+    monto = np.zeros((L, max_n), dtype=np.int64)
+    interes = np.zeros((L, max_n), dtype=np.int64)
+    capital = np.zeros((L, max_n), dtype=np.int64)
+    saldo_col = np.zeros((L, max_n), dtype=np.int64)
+
+    saldo = P_c.copy()
+    for k in range(1, max_n + 1):
+        activos = n >= k
+        if not activos.any():
+            break
+        col = k - 1
+
+        # francés: interés = round2(saldo * i); monto = cuota (la última
+        # también, porque total_teorico - suma = cuota)
+        f = activos & frances
+        if f.any():
+            idx = np.nonzero(f)[0]
+
+            def interes_exacto(m, idx=idx):
+                j = idx[m]
+                return int(_round2(_dec_centavos(saldo[j]) * i_dec[j]) * 100)
+
+            int_k = _redondear_centavos(saldo[idx] * i[idx], interes_exacto)
+            cap_k = cuota[idx] - int_k
+            nuevo = saldo[idx] - cap_k
+            nuevo[nuevo < 0] = 0
+            monto[idx, col] = cuota[idx]
+            interes[idx, col] = int_k
+            capital[idx, col] = cap_k
+            saldo[idx] = nuevo
+            saldo_col[idx, col] = nuevo
+
+        # prorrateo: base en todas, la última cierra al principal
+        z = activos & sin_interes
+        if z.any():
+            idx = np.nonzero(z)[0]
+            m_k = np.where(n[idx] == k, P_c[idx] - base_prorrateo[idx] * (n[idx] - 1), base_prorrateo[idx])
+            monto[idx, col] = m_k
+            capital[idx, col] = m_k
+            saldo[idx] = saldo[idx] - m_k
+            saldo_col[idx, col] = saldo[idx]
+
+    # a Decimal en una sola pasada sobre las celdas válidas (fila por fila,
+    # 4 columnas) y se reparte por préstamo según su número de cuotas
+    validas = np.arange(max_n) < n[:, None]
+    celdas = np.stack([monto, interes, capital, saldo_col], axis=-1)[validas].ravel().tolist()
+    decimales = list(map(_CENTAVO.__rmul__, map(Decimal, celdas)))
+    filas = list(zip(*[iter(decimales)] * 4))
+    resultado, ini = [], 0
+    for plazo in plazos:
+        resultado.append(filas[ini:ini + plazo])
+        ini += plazo
+    return resultado
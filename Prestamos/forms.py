@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django import forms
 from .models import Prestamo, MONEDAS, Acreedor
 
@@ -61,8 +63,9 @@ class PrestamoForm(forms.ModelForm):
         if user is not None and getattr(user, 'is_authenticated', False):
             qs = Acreedor.objects.filter(owner=user).order_by('nombre')
 
-        self.fields['acreedor'].queryset = qs
-        self.fields['acreedor'].empty_label = '--------'
+        if 'acreedor' in self.fields:
+            self.fields['acreedor'].queryset = qs
+            self.fields['acreedor'].empty_label = '--------'
 
     def clean(self):
         cleaned = super().clean()
@@ -78,6 +81,39 @@ class PrestamoForm(forms.ModelForm):
             self.add_error('cuotas_totales', 'Las cuotas no pueden ser más de 36.')
         return cleaned
 
+class SimulacionForm(PrestamoForm):
+    """Parámetros del cronograma para la vista previa: los campos y límites de PrestamoForm."""
+    class Meta(PrestamoForm.Meta):
+        fields = ['monto_total', 'tasa_interes', 'cuotas_totales', 'fecha_inicio']
+
+
+# cada monto del prepago se valida como un DecimalField (rechaza NaN e Infinity)
+_MONTO_PREPAGO = forms.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'), max_value=400000)
+
+
+class PrepagoForm(forms.Form):
+    """Escenarios de prepago: varios montos separados por coma; vacío = cancelar todo."""
+    fecha = forms.DateField(widget=DateInput(attrs={'class': 'input'}))
+    montos = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'input', 'placeholder': 'Ej. 1000, 2500, 5000'}),
+    )
+
+    def clean_montos(self):
+        montos = []
+        for parte in (self.cleaned_data.get('montos') or '').split(','):
+            parte = parte.strip()
+            if not parte:
+                continue
+            try:
+                montos.append(_MONTO_PREPAGO.clean(parte))
+            except forms.ValidationError:
+                raise forms.ValidationError(f'Monto inválido: {parte} (debe ser positivo, hasta 400 000 y con 2 decimales).')
+        if len(montos) > 20:
+            raise forms.ValidationError('Máximo 20 montos por simulación.')
+        return montos
+
+
 class AcreedorForm(forms.ModelForm):
     class Meta:
         model = Acreedor
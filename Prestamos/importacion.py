@@ -0,0 +1,99 @@
+# Prestamos/importacion.py
+import csv
+import time
+
+from django.db import transaction
+
+from .forms import PrestamoForm
+from .models import Acreedor, Prestamo
+from .services import generar_cuotas_lote
+
+# columnas del CSV (acreedor y descripcion son opcionales)
+COLUMNAS = [
+    'acreedor', 'banco', 'descripcion', 'monto_total', 'tasa_interes',
+    'fecha_inicio', 'cuotas_totales', 'moneda_prestamo', 'moneda_pago',
+]
+
+
+def leer_csv(archivo):
+    """
+    Lee el CSV de préstamos (con cabecera) fila por fila. Genera tuplas
+    (numero_de_linea, dict) con los valores sin espacios alrededor.
+    Lanza ValueError con la línea si el archivo no se puede decodificar o
+    no es un CSV válido.
+    """
+    lector = csv.DictReader(archivo)
+    try:
+        for fila in lector:
+            yield lector.line_num, {k.strip().lower(): (v or '').strip() for k, v in fila.items() if k}
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f"Línea {lector.line_num + 1}: no se pudo leer el CSV ({e})") from e
+
+
+def importar_prestamos(filas, persona, batch_size: int = 500) -> dict:
+    """
+    Importa préstamos de `persona` validando cada fila con PrestamoForm.
+    Los acreedores se buscan por nombre en un diccionario cargado una sola
+    vez (los que no existen se crean). Por lote: un bulk_create de
+    préstamos (sin la señal por fila) y generar_cuotas_lote para todas sus
+    cuotas. No se envían alertas inmediatas: son deudas que ya existían.
+    Todo el archivo va en una sola transacción: si la lectura falla a la
+    mitad (ValueError de leer_csv) no queda ningún préstamo importado. Las
+    filas que no pasan la validación se saltan y se informan.
+
+    Devuelve {'prestamos': n, 'cuotas': m, 'errores': [(linea, mensaje)],
+    'segundos': s}.
+    """
+    inicio = time.monotonic()
+    user = persona.user
+    acreedores = {
+        a.nombre.strip().lower(): a
+        for a in Acreedor.objects.filter(owner=user)
+    }
+    errores = []
+    creados = cuotas = 0
+    lote = []
+
+    def volcar():
+        nonlocal creados, cuotas
+        # acreedores nuevos de este lote (el FK toma su pk al guardar los préstamos)
+        nuevos = [a for a in acreedores.values() if a.pk is None]
+        if nuevos:
+            Acreedor.objects.bulk_create(nuevos)
+        prestamos = Prestamo.objects.bulk_create(lote)
+        cuotas += len(generar_cuotas_lote(prestamos))
+        creados += len(prestamos)
+        lote.clear()
+
+    with transaction.atomic():
+        for linea, datos in filas:
+            nombre_acreedor = datos.pop('acreedor', '')
+            datos['acreedor'] = ''
+            form = PrestamoForm(datos, user=user)
+            if not form.is_valid():
+                detalle = ' | '.join(
+                    f"{campo}: {' '.join(msgs)}" for campo, msgs in form.errors.items()
+                )
+                errores.append((linea, detalle))
+                continue
+
+            prestamo = form.save(commit=False)
+            prestamo.persona = persona
+            if nombre_acreedor:
+                clave = nombre_acreedor.lower()
+                acreedor = acreedores.get(clave)
+                if acreedor is None:
+                    acreedor = acreedores[clave] = Acreedor(owner=user, nombre=nombre_acreedor[:150])
+                prestamo.acreedor = acreedor
+            lote.append(prestamo)
+            if len(lote) >= batch_size:
+                volcar()
+
+        if lote:
+            volcar()
+    return {
+        'prestamos': creados,
+        'cuotas': cuotas,
+        'errores': errores,
+        'segundos': time.monotonic() - inicio,
+    }
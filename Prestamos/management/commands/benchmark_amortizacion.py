@@ -0,0 +1,53 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Prestamos.amortizacion import HAS_NUMPY, calcular_cronogramas
+from Prestamos.services import filas_cronograma
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el cálculo de cronogramas en lote (vectorizado) contra el "
+        "cálculo préstamo por préstamo, con préstamos sintéticos (no toca la BD)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prestamos', type=int, default=5000, help='Cantidad de préstamos sintéticos')
+        parser.add_argument('--max-cuotas', type=int, default=60, help='Máximo de cuotas por préstamo')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla del generador aleatorio')
+
+    def handle(self, *args, **options):
+        if options['prestamos'] <= 0 or options['max_cuotas'] <= 0:
+            raise CommandError("--prestamos y --max-cuotas deben ser positivos")
+        if not HAS_NUMPY:
+            self.stderr.write(self.style.WARNING("NumPy no está instalado: el lote usa el cálculo por préstamo"))
+
+        rnd = random.Random(options['seed'])
+        teas = [Decimal('0'), Decimal('8.5'), Decimal('12'), Decimal('18.75'), Decimal('25'), Decimal('45')]
+        principales, tasas, plazos = [], [], []
+        for _ in range(options['prestamos']):
+            principales.append(Decimal(rnd.randint(10000, 50000000)).scaleb(-2))
+            tasas.append(rnd.choice(teas))
+            plazos.append(rnd.randint(1, options['max_cuotas']))
+
+        inicio = time.perf_counter()
+        referencia = [filas_cronograma(P, t, n) for P, t, n in zip(principales, tasas, plazos)]
+        t_ref = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        lote = calcular_cronogramas(principales, tasas, plazos)
+        t_lote = time.perf_counter() - inicio
+
+        distintos = sum(1 for a, b in zip(referencia, lote) if a != b)
+        cuotas = sum(plazos)
+        self.stdout.write(
+            f"{len(principales)} préstamos / {cuotas} cuotas\n"
+            f"  por préstamo: {t_ref:.3f}s ({cuotas / (t_ref or 1e-9):.0f} cuotas/s)\n"
+            f"  en lote:      {t_lote:.3f}s ({cuotas / (t_lote or 1e-9):.0f} cuotas/s)"
+        )
+        if distintos:
+            raise CommandError(f"{distintos} cronogramas no coinciden al centavo")
+        self.stdout.write(self.style.SUCCESS("Cronogramas idénticos al centavo"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Prestamos.services import completar_desglose
+
+
+class Command(BaseCommand):
+    help = "Completa interés, capital y saldo de las cuotas generadas antes de guardarse el desglose."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Préstamos por lote')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size debe ser positivo")
+        resumen = completar_desglose(batch_size=options['batch_size'])
+        if resumen['omitidos']:
+            self.stderr.write(self.style.WARNING(
+                f"{resumen['omitidos']} cuotas no coinciden con el cronograma actual y quedaron sin desglose"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Cuotas con desglose completado: {resumen['actualizados']}"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Persona.models import Persona
+from Prestamos.importacion import importar_prestamos, leer_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa préstamos desde un CSV (acreedor,banco,descripcion,monto_total,"
+        "tasa_interes,fecha_inicio,cuotas_totales,moneda_prestamo,moneda_pago)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV (UTF-8, con cabecera)')
+        parser.add_argument('--persona', type=int, required=True, help='id de la Persona dueña de los préstamos')
+        parser.add_argument('--batch-size', type=int, default=500, help='Préstamos por bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            persona = Persona.objects.select_related('user').get(pk=options['persona'])
+        except Persona.DoesNotExist:
+            raise CommandError(f"No existe la Persona {options['persona']}")
+        if persona.user is None:
+            raise CommandError("La Persona no está vinculada a un usuario")
+
+        try:
+            with open(options['archivo'], 'r', newline='', encoding='utf-8-sig') as archivo:
+                resumen = importar_prestamos(leer_csv(archivo), persona, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(f"No se pudo leer el archivo: {e}")
+        except ValueError as e:
+            raise CommandError(f"No se importó ningún préstamo. {e}")
+
+        for linea, error in resumen['errores']:
+            self.stderr.write(self.style.WARNING(f"Línea {linea}: {error}"))
+        segundos = resumen['segundos'] or 1e-9
+        self.stdout.write(self.style.SUCCESS(
+            f"Importados {resumen['prestamos']} préstamos ({resumen['cuotas']} cuotas) en {segundos:.2f}s "
+            f"({resumen['prestamos'] / segundos:.0f} préstamos/s), {len(resumen['errores'])} filas con error"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Prestamos.services import actualizar_resumen
+
+
+class Command(BaseCommand):
+    help = "Recalcula el resumen de cuotas de todos los préstamos (por si quedó desfasado)."
+
+    def handle(self, *args, **options):
+        n = actualizar_resumen()
+        self.stdout.write(self.style.SUCCESS(f'Resumen actualizado en {n} préstamos'))
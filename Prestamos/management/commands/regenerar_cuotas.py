@@ -1,42 +1,95 @@
-from decimal import Decimal, ROUND_HALF_UP
-from django.core.management.base import BaseCommand
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
 
 from Prestamos.models import Prestamo
-from Prestamos.utils import add_months
+from Prestamos.services import generar_cuotas_lote
 from Pagos.models import Pago
 
 
+def _generar(lote) -> int:
+    """Corre en un hilo del pool: cada hilo usa (y cierra) su conexión."""
+    try:
+        return len(generar_cuotas_lote(lote))
+    finally:
+        connection.close()
+
+
 class Command(BaseCommand):
     help = "Genera cuotas para préstamos que aún no tienen pagos creados."
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Préstamos por lote')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Lotes en paralelo (con SQLite conviene dejar 1)',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta, no crea cuotas')
+
     def handle(self, *args, **options):
-        creadas = 0
-        for pr in Prestamo.objects.all():
-            if Pago.objects.filter(prestamo=pr).exists():
-                continue
-
-            n = int(pr.cuotas_totales or 0)
-            if n <= 0:
-                continue
-
-            total = Decimal(pr.monto_total)
-            monto_base = (total / Decimal(n)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            acumulado = Decimal('0.00')
-
-            for i in range(1, n + 1):
-                if i == n:
-                    monto = (total - acumulado).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                else:
-                    monto = monto_base
-                    acumulado += monto
-
-                Pago.objects.create(
-                    prestamo=pr,
-                    numero_cuota=i,
-                    monto=monto,
-                    fecha_vencimiento=add_months(pr.fecha_inicio, i - 1),
-                    estado='Pendiente',
-                )
-                creadas += 1
-
-        self.stdout.write(self.style.SUCCESS(f'Cuotas creadas: {creadas}'))
+        batch_size = options['batch_size']
+        workers = options['workers']
+        if batch_size <= 0 or workers <= 0:
+            raise CommandError("--batch-size y --workers deben ser positivos")
+
+        # anti-join: préstamos sin ningún pago
+        qs = (
+            Prestamo.objects
+            .filter(cuotas_totales__gt=0)
+            .filter(~Exists(Pago.objects.filter(prestamo=OuterRef('pk'))))
+            .order_by('pk')
+        )
+        total = qs.count()
+        if options['dry_run']:
+            self.stdout.write(f'Préstamos sin cuotas: {total}')
+            return
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Cuotas creadas: 0'))
+            return
+
+        inicio = time.monotonic()
+        procesados = creadas = 0
+
+        def avance(n_prestamos, n_cuotas):
+            nonlocal procesados, creadas
+            procesados += n_prestamos
+            creadas += n_cuotas
+            seg = time.monotonic() - inicio
+            self.stdout.write(
+                f'  {procesados}/{total} préstamos, {creadas} cuotas '
+                f'({procesados / (seg or 1e-9):.0f} préstamos/s)'
+            )
+
+        def lotes():
+            lote = []
+            for pr in qs.iterator(chunk_size=batch_size):
+                lote.append(pr)
+                if len(lote) >= batch_size:
+                    yield lote
+                    lote = []
+            if lote:
+                yield lote
+
+        if workers == 1:
+            for lote in lotes():
+                avance(len(lote), len(generar_cuotas_lote(lote)))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pendientes = {}
+                for lote in lotes():
+                    # no leer más lotes de los que se pueden procesar
+                    while len(pendientes) >= workers * 2:
+                        hechos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                        for f in hechos:
+                            avance(pendientes.pop(f), f.result())
+                    pendientes[pool.submit(_generar, lote)] = len(lote)
+                for f in list(pendientes):
+                    avance(pendientes.pop(f), f.result())
+
+        seg = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'Cuotas creadas: {creadas} ({procesados} préstamos en {seg:.2f}s)'
+        ))
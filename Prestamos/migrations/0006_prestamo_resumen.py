@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def llenar_resumen(apps, schema_editor):
+    Prestamo = apps.get_model('Prestamos', 'Prestamo')
+    Pago = apps.get_model('Pagos', 'Pago')
+
+    pagos = Pago.objects.filter(prestamo=OuterRef('pk'))
+    abiertas = pagos.exclude(estado='Pagado')
+    proxima = abiertas.order_by('fecha_vencimiento', 'numero_cuota')
+
+    def agregado(qs, expresion, campo):
+        return Coalesce(
+            Subquery(qs.values('prestamo').annotate(v=expresion).values('v')[:1], output_field=campo),
+            Value(0), output_field=campo,
+        )
+
+    Prestamo.objects.update(
+        saldo_pendiente=agregado(abiertas, Sum('monto'), models.DecimalField(max_digits=12, decimal_places=2)),
+        cuotas_pagadas=agregado(pagos.filter(estado='Pagado'), Count('pk'), models.IntegerField()),
+        cuotas_pendientes=agregado(abiertas, Count('pk'), models.IntegerField()),
+        proximo_vencimiento=Subquery(proxima.values('fecha_vencimiento')[:1]),
+        proximo_monto=Subquery(proxima.values('monto')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Prestamos', '0005_alter_acreedor_celular_alter_acreedor_documento_and_more'),
+        ('Pagos', '0004_pago_montos_convertidos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestamo',
+            name='cuotas_pagadas',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='cuotas_pendientes',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='proximo_monto',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='proximo_vencimiento',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='saldo_pendiente',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+    ]
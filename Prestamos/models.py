@@ -152,5 +152,14 @@ class Prestamo(models.Model):
         default='PEN',
     )
 
+    # --- Resumen denormalizado de las cuotas (lo mantiene
+    #     Prestamos.services.actualizar_resumen; ver reconstruir_resumen) ---
+    saldo_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cuotas_pagadas = models.PositiveSmallIntegerField(default=0)
+    cuotas_pendientes = models.PositiveSmallIntegerField(default=0)
+    proximo_vencimiento = models.DateField(blank=True, null=True)
+    proximo_monto = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # ------------------------------------------------------------------------
+
     def __str__(self):
         return f"{self.banco} — {self.persona} — #{self.id_prestamo}"
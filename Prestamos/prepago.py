@@ -0,0 +1,185 @@
+# Prestamos/prepago.py
+"""
+Simulación de prepagos (parciales o cancelación total) sobre las cuotas
+guardadas de un préstamo. Todo en memoria: no modifica Pagos.
+"""
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from baseParcial.cache import CacheTTL
+from Pagos.models import Pago
+from .services import _i_mensual_desde_tea, _round2, _to_dec, filas_cronograma
+from .utils import add_months
+
+MODALIDADES = ('plazo', 'cuota')   # reducir plazo / reducir cuota
+
+# cronograma base por préstamo; la clave incluye el resumen denormalizado,
+# así que cualquier cambio en sus cuotas genera una clave nueva
+bases_cache = CacheTTL(maxsize=256, ttl=300)
+
+
+@dataclass(frozen=True)
+class CuotaBase:
+    numero_cuota: int
+    fecha_vencimiento: date
+    monto: Decimal
+    interes: Decimal
+    capital: Decimal
+    saldo: Decimal        # capital pendiente después de la cuota
+
+
+@dataclass(frozen=True)
+class Base:
+    i: Decimal            # tasa mensual
+    pendientes: tuple     # CuotaBase no pagadas, en orden
+
+
+def _clave(prestamo) -> tuple:
+    return (
+        prestamo.pk, prestamo.tasa_interes, prestamo.saldo_pendiente,
+        prestamo.cuotas_pendientes, prestamo.proximo_vencimiento,
+    )
+
+
+def cronograma_base(prestamo) -> Base:
+    """
+    Cuotas pendientes del préstamo con su desglose (el guardado en Pago;
+    si falta, el del cronograma recalculado). Cacheado por préstamo.
+    """
+    clave = _clave(prestamo)
+    base = bases_cache.get(clave)
+    if base is not None:
+        return base
+
+    pagos = list(
+        Pago.objects
+        .filter(prestamo=prestamo)
+        .order_by('numero_cuota')
+        .values_list('numero_cuota', 'fecha_vencimiento', 'monto', 'interes', 'capital', 'saldo', 'estado')
+    )
+    calculado = None
+    if any(p[3] is None or p[5] is None for p in pagos):
+        calculado = filas_cronograma(prestamo.monto_total, prestamo.tasa_interes, prestamo.cuotas_totales)
+
+    pendientes = []
+    for numero, fecha, monto, interes, capital, saldo, estado in pagos:
+        if interes is None or saldo is None:
+            k = numero - 1
+            if calculado is None or not 0 <= k < len(calculado):
+                continue
+            _, interes, capital, saldo = calculado[k]
+        if estado != 'Pagado':
+            pendientes.append(CuotaBase(numero, fecha, monto, interes, capital, saldo))
+
+    base = Base(
+        i=_i_mensual_desde_tea(_to_dec(prestamo.tasa_interes or 0)),
+        pendientes=tuple(pendientes),
+    )
+    bases_cache.set(clave, base)
+    return base
+
+
+def _reducir_plazo(saldo: Decimal, i: Decimal, cuota: Decimal) -> list:
+    """Misma cuota hasta cancelar; la última solo cubre lo que queda."""
+    filas = []
+    while saldo > 0:
+        interes = _round2(saldo * i)
+        if cuota <= interes:
+            raise ValueError("La cuota no cubre el interés del periodo")
+        capital = min(cuota - interes, saldo)
+        filas.append((capital + interes, interes))
+        saldo = _round2(saldo - capital)
+    return filas
+
+
+def _frances(saldo: Decimal, i: Decimal, n: int) -> list:
+    """Mismo número de cuotas con la nueva cuota francesa (o prorrateo)."""
+    if n < 1:
+        raise ValueError("No quedan cuotas para repartir el saldo")
+    if i <= 0:
+        cuota = _round2(saldo / Decimal(n))
+    else:
+        cuota = _round2(saldo * i / (Decimal('1') - (Decimal('1') + i) ** Decimal(-n)))
+    filas = []
+    for k in range(1, n + 1):
+        interes = _round2(saldo * i)
+        capital = saldo if k == n else min(cuota - interes, saldo)
+        filas.append((capital + interes, interes))
+        saldo = _round2(saldo - capital)
+    return filas
+
+
+def simular_prepago(base: Base, fecha: date, monto=None, modalidad: str = 'plazo') -> dict:
+    """
+    Aplica un prepago junto con la primera cuota pendiente que vence en o
+    después de `fecha` (las anteriores se asumen pagadas según el
+    cronograma). monto=None cancela todo el saldo.
+    Devuelve totales del escenario y el ahorro frente al cronograma base.
+    """
+    if modalidad not in MODALIDADES:
+        raise ValueError(f"Modalidad inválida: {modalidad}")
+    pendientes = base.pendientes
+    j = next((k for k, c in enumerate(pendientes) if c.fecha_vencimiento >= fecha), None)
+    if j is None:
+        raise ValueError("No hay cuotas pendientes después de esa fecha")
+
+    restantes = pendientes[j:]
+    cuota_j = restantes[0]
+    saldo_j = cuota_j.saldo
+    # en la última cuota el saldo guardado puede ser un residuo de redondeo (0.01)
+    if saldo_j <= 0 or len(restantes) == 1:
+        raise ValueError("Es la última cuota: no queda saldo por prepagar")
+    original_total = sum((c.monto for c in restantes), Decimal('0.00'))
+    original_interes = sum((c.interes for c in restantes), Decimal('0.00'))
+
+    extra = saldo_j if monto is None else min(_round2(_to_dec(monto)), saldo_j)
+    if extra <= 0:
+        raise ValueError("El monto del prepago debe ser positivo")
+    saldo = _round2(saldo_j - extra)
+
+    if saldo <= 0:
+        filas = []
+    elif modalidad == 'plazo':
+        filas = _reducir_plazo(saldo, base.i, cuota_j.monto)
+    else:
+        filas = _frances(saldo, base.i, len(restantes) - 1)
+
+    total = cuota_j.monto + extra + sum((m for m, _ in filas), Decimal('0.00'))
+    interes = cuota_j.interes + sum((x for _, x in filas), Decimal('0.00'))
+    ultima = add_months(cuota_j.fecha_vencimiento, len(filas))
+    return {
+        'modalidad': 'total' if not filas else modalidad,
+        'prepago': extra,
+        'cuota_prepago': cuota_j.numero_cuota,
+        'fecha_prepago': cuota_j.fecha_vencimiento,
+        'cuotas_restantes': len(filas),
+        'nueva_cuota': filas[0][0] if filas else None,
+        'ultimo_vencimiento': ultima,
+        'total_pagado': total,
+        'interes_total': interes,
+        'ahorro_interes': original_interes - interes,
+        'ahorro_total': original_total - total,
+    }
+
+
+def simular_escenarios(prestamo, fecha: date, montos, modalidades=MODALIDADES) -> list:
+    """
+    Varios escenarios sobre el mismo cronograma base (cargado una vez y
+    cacheado). `montos` puede incluir None para la cancelación total, que
+    se evalúa una sola vez.
+    """
+    base = cronograma_base(prestamo)
+    escenarios = []
+    for monto in montos:
+        for modalidad in (modalidades[:1] if monto is None else modalidades):
+            try:
+                escenario = simular_prepago(base, fecha, monto, modalidad)
+            except ValueError as e:
+                escenarios.append({'modalidad': modalidad, 'prepago': monto, 'error': str(e)})
+                continue
+            # un monto mayor al saldo es la misma cancelación total
+            if escenario['modalidad'] == 'total' and any(e.get('modalidad') == 'total' for e in escenarios):
+                continue
+            escenarios.append(escenario)
+    return escenarios
@@ -0,0 +1,347 @@
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP, getcontext
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .amortizacion import calcular_cronogramas
+from .models import Prestamo
+from .utils import add_months
+from Pagos.models import Pago
+from Pagos.services import CAMPOS_MONTO, calcular_montos_convertidos, estado_por_fecha
+
+getcontext().prec = 28  # precisión decente para cálculos
+
+# campos de Pago que salen del cronograma
+CAMPOS_CRONOGRAMA = ['monto', 'interes', 'capital', 'saldo', 'fecha_vencimiento']
+
+
+def _to_dec(x) -> Decimal:
+    return x if isinstance(x, Decimal) else Decimal(str(x))
+
+def _round2(x: Decimal) -> Decimal:
+    return x.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+@lru_cache(maxsize=256)
+def _i_mensual_desde_tea(tea_percent: Decimal) -> Decimal:
+    """
+    Convierte TEA (porcentaje) a tasa mensual equivalente (efectiva):
+    i = (1 + TEA)^(1/12) - 1
+    Memoizada: en lotes se repiten pocas TEA distintas.
+    """
+    tea = _to_dec(tea_percent or 0) / Decimal('100')
+    if tea <= 0:
+        return Decimal('0')
+    # usamos float para la potencia fraccionaria y regresamos a Decimal
+    i_float = (1.0 + float(tea)) ** (1.0/12.0) - 1.0
+    return Decimal(str(i_float))
+
+
+def filas_cronograma(monto_total, tasa_interes, cuotas_totales) -> list:
+    """
+    Montos del cronograma, sin fechas: lista de tuplas
+    (monto, interes, capital, saldo) por cuota.
+      - Sistema francés cuando tasa_interes > 0 (cuota fija).
+      - Prorrateo simple cuando tasa_interes == 0.
+    """
+    n = int(cuotas_totales or 0)
+    if n <= 0:
+        return []
+
+    P = _to_dec(monto_total)
+    i = _i_mensual_desde_tea(_to_dec(tasa_interes or 0))
+
+    filas = []
+
+    if i <= 0:
+        # Sin interés: prorrateo
+        base = _round2(P / Decimal(n))
+        acum = Decimal('0.00')
+        saldo = P
+        for k in range(1, n+1):
+            if k == n:
+                monto = _round2(P - acum)
+            else:
+                monto = base
+                acum += base
+            saldo = _round2(saldo - monto)
+            filas.append((monto, Decimal('0.00'), monto, saldo))
+    else:
+        # Francés: cuota fija
+        uno_mas_i = Decimal('1') + i
+        # cuota = P * i / (1 - (1+i)^-n)
+        cuota = P * i / (Decimal('1') - (uno_mas_i ** Decimal(-n)))
+        cuota = _round2(cuota)
+        total_teorico = _round2(cuota * Decimal(n))
+
+        saldo = P
+        sum_asignado = Decimal('0.00')
+        for k in range(1, n+1):
+            interes = _round2(saldo * i)
+            if k == n:
+                # última: que cierre exacto al total_teorico
+                monto = _round2(total_teorico - sum_asignado)
+            else:
+                monto = cuota
+                sum_asignado += monto
+            capital = _round2(monto - interes)
+            saldo = _round2(saldo - capital)
+            if saldo < 0:
+                saldo = Decimal('0.00')
+            filas.append((monto, interes, capital, saldo))
+
+    return filas
+
+
+def _con_fechas(filas, fecha_inicio) -> list:
+    return [
+        {
+            'numero_cuota': k,
+            'monto': monto,
+            'interes': interes,
+            'capital': capital,
+            'saldo': saldo,
+            'fecha_vencimiento': add_months(fecha_inicio, k),
+        }
+        for k, (monto, interes, capital, saldo) in enumerate(filas, start=1)
+    ]
+
+
+def calcular_cronograma(monto_total, tasa_interes, cuotas_totales, fecha_inicio) -> list:
+    """
+    Cronograma del préstamo, sin tocar la BD. Devuelve una lista de dicts
+    con numero_cuota, monto (capital+interés), interes, capital, saldo y
+    fecha_vencimiento.
+
+    Primera cuota: fecha_inicio + 1 mes (luego +2, +3, ...).
+    """
+    return _con_fechas(filas_cronograma(monto_total, tasa_interes, cuotas_totales), fecha_inicio)
+
+
+@lru_cache(maxsize=1024)
+def _cronograma_memo(monto_total: Decimal, tasa_interes: Decimal, cuotas_totales: int, fecha_inicio) -> tuple:
+    return tuple(
+        (c['numero_cuota'], c['fecha_vencimiento'], c['monto'], c['interes'], c['capital'], c['saldo'])
+        for c in calcular_cronograma(monto_total, tasa_interes, cuotas_totales, fecha_inicio)
+    )
+
+
+def simular_cronograma(monto_total, tasa_interes, cuotas_totales, fecha_inicio) -> tuple:
+    """
+    Cronograma para la vista previa, memoizado por (P, TEA, n, fecha_inicio).
+    Devuelve tuplas inmutables
+    (numero_cuota, fecha_vencimiento, monto, interes, capital, saldo).
+    """
+    # normalizar la clave: 1000 y 1000.00 son el mismo préstamo
+    return _cronograma_memo(
+        _round2(_to_dec(monto_total)), _round2(_to_dec(tasa_interes or 0)),
+        int(cuotas_totales or 0), fecha_inicio,
+    )
+
+
+def construir_pagos(prestamo: Prestamo, filas=None) -> list:
+    """
+    Pagos (sin guardar) del cronograma del préstamo, Pendiente o Vencido
+    según su vencimiento. `filas` permite pasar los montos ya calculados
+    (p.ej. por calcular_cronogramas).
+    """
+    if filas is None:
+        filas = filas_cronograma(prestamo.monto_total, prestamo.tasa_interes, prestamo.cuotas_totales)
+    hoy = date.today()
+    return [
+        Pago(
+            prestamo=prestamo,
+            numero_cuota=c['numero_cuota'],
+            monto=c['monto'],
+            interes=c['interes'],
+            capital=c['capital'],
+            saldo=c['saldo'],
+            fecha_vencimiento=c['fecha_vencimiento'],
+            estado=estado_por_fecha(c['fecha_vencimiento'], hoy),
+        )
+        for c in _con_fechas(filas, prestamo.fecha_inicio)
+    ]
+
+
+def _agregado(qs, expresion, output_field):
+    """Subconsulta escalar con un agregado de los pagos de cada préstamo."""
+    return Coalesce(
+        Subquery(qs.values('prestamo').annotate(v=expresion).values('v')[:1], output_field=output_field),
+        Value(0), output_field=output_field,
+    )
+
+
+def actualizar_resumen(prestamo_ids=None) -> int:
+    """
+    Recalcula saldo_pendiente, cuotas_pagadas, cuotas_pendientes,
+    proximo_vencimiento y proximo_monto de los préstamos indicados (todos
+    si es None) con un solo UPDATE con subconsultas: no carga filas en
+    Python. Devuelve cuántos préstamos se actualizaron.
+    """
+    pagos = Pago.objects.filter(prestamo=OuterRef('pk'))
+    abiertas = pagos.exclude(estado='Pagado')
+    proxima = abiertas.order_by('fecha_vencimiento', 'numero_cuota')
+
+    qs = Prestamo.objects.all()
+    if prestamo_ids is not None:
+        qs = qs.filter(pk__in=list(prestamo_ids))
+    return qs.update(
+        saldo_pendiente=_agregado(abiertas, Sum('monto'), DecimalField(max_digits=12, decimal_places=2)),
+        cuotas_pagadas=_agregado(pagos.filter(estado='Pagado'), Count('pk'), IntegerField()),
+        cuotas_pendientes=_agregado(abiertas, Count('pk'), IntegerField()),
+        proximo_vencimiento=Subquery(proxima.values('fecha_vencimiento')[:1]),
+        proximo_monto=Subquery(proxima.values('monto')[:1]),
+    )
+
+
+def generar_cuotas_lote(prestamos) -> list:
+    """
+    Genera las cuotas de muchos préstamos a la vez: una consulta para saber
+    cuáles ya tienen pagos, los cronogramas se calculan juntos (vectorizado
+    si hay NumPy) y se escriben con un solo bulk_create dentro de una
+    transacción.
+    Devuelve los pagos creados.
+    """
+    prestamos = [pr for pr in prestamos if pr.pk is not None]
+    if not prestamos:
+        return []
+
+    # evitar duplicados
+    con_pagos = set(
+        Pago.objects
+        .filter(prestamo__in=[pr.pk for pr in prestamos])
+        .values_list('prestamo_id', flat=True)
+        .distinct()
+    )
+    nuevos = [pr for pr in prestamos if pr.pk not in con_pagos]
+    if not nuevos:
+        return []
+
+    cronogramas = calcular_cronogramas(
+        [pr.monto_total for pr in nuevos],
+        [pr.tasa_interes for pr in nuevos],
+        [pr.cuotas_totales for pr in nuevos],
+    )
+    pagos = []
+    for pr, filas in zip(nuevos, cronogramas):
+        pagos.extend(construir_pagos(pr, filas))
+    if not pagos:
+        return []
+
+    # equivalentes en PEN/USD/EUR para que los listados no conviertan fila
+    # por fila; solo con tasas ya guardadas (lo que falte lo llena el refresco)
+    calcular_montos_convertidos(pagos, sin_red=True)
+    with transaction.atomic():
+        creados = Pago.objects.bulk_create(pagos, batch_size=1000)
+        # bulk_create no dispara señales: el resumen se actualiza aquí
+        actualizar_resumen([pr.pk for pr in nuevos])
+    return creados
+
+
+def generar_cuotas(prestamo: Prestamo) -> list:
+    """Genera las cuotas de un préstamo (si aún no tiene)."""
+    return generar_cuotas_lote([prestamo])
+
+
+def sincronizar_cuotas(prestamo: Prestamo, moneda_anterior: str | None = None) -> list:
+    """
+    Lleva los pagos del préstamo al cronograma actual sin borrarlos y
+    volver a crearlos: las cuotas iguales no se tocan, las que cambian de
+    monto o vencimiento van en un bulk_update y solo la cola sobrante se
+    borra (o la faltante se inserta). Se comparan monto, vencimiento y el
+    desglose interés/capital/saldo. Si `moneda_anterior` (la moneda del
+    préstamo antes de editarlo) es distinta de la actual se recalculan los
+    equivalentes de todas las cuotas aunque el cronograma sea el mismo.
+    Devuelve los pagos creados o modificados (no los que solo cambiaron de
+    equivalentes).
+    """
+    nuevos = {p.numero_cuota: p for p in construir_pagos(prestamo)}
+    actuales = {p.numero_cuota: p for p in Pago.objects.filter(prestamo=prestamo)}
+
+    cambio_moneda = (
+        moneda_anterior is not None
+        and moneda_anterior.upper() != (prestamo.moneda_prestamo or 'PEN').upper()
+    )
+
+    cambiados = []
+    for numero, pago in actuales.items():
+        nuevo = nuevos.get(numero)
+        if nuevo is None:
+            continue
+        if any(getattr(pago, campo) != getattr(nuevo, campo) for campo in CAMPOS_CRONOGRAMA):
+            for campo in CAMPOS_CRONOGRAMA:
+                setattr(pago, campo, getattr(nuevo, campo))
+            if pago.estado != 'Pagado':
+                # el vencimiento pudo moverse
+                pago.estado = nuevo.estado
+            pago.prestamo = prestamo
+            cambiados.append(pago)
+    insertar = [p for numero, p in nuevos.items() if numero not in actuales]
+    sobrantes = [numero for numero in actuales if numero not in nuevos]
+    en_cambiados = {p.numero_cuota for p in cambiados}
+    # los equivalentes guardados son de la moneda anterior
+    solo_montos = [
+        p for numero, p in actuales.items()
+        if cambio_moneda and numero in nuevos and numero not in en_cambiados
+    ]
+    for pago in solo_montos:
+        pago.prestamo = prestamo
+
+    calcular_montos_convertidos(cambiados + solo_montos + insertar, sin_red=True)
+    campos = [*CAMPOS_CRONOGRAMA, 'estado', *CAMPOS_MONTO.values(), 'fecha_tc_montos']
+    with transaction.atomic():
+        if sobrantes:
+            Pago.objects.filter(prestamo=prestamo, numero_cuota__in=sobrantes).delete()
+        if cambiados:
+            Pago.objects.bulk_update(cambiados, campos, batch_size=1000)
+        if solo_montos:
+            Pago.objects.bulk_update(solo_montos, [*CAMPOS_MONTO.values(), 'fecha_tc_montos'], batch_size=1000)
+        creados = Pago.objects.bulk_create(insertar, batch_size=1000) if insertar else []
+        actualizar_resumen([prestamo.pk])
+    return cambiados + creados
+
+
+def completar_desglose(batch_size: int = 500) -> dict:
+    """
+    Llena interes/capital/saldo de los pagos que no los tienen, recalculando
+    el cronograma de su préstamo (en lote). Solo se completa la cuota cuyo
+    monto coincide con el cronograma actual; las que no (p.ej. préstamos con
+    la tasa editada después de pagar) se dejan en blanco y se cuentan como
+    omitidas. Devuelve {'actualizados': n, 'omitidos': m}.
+    """
+    incompletos = Pago.objects.filter(prestamo=OuterRef('pk'), interes__isnull=True)
+    qs = Prestamo.objects.filter(Exists(incompletos)).order_by('pk')
+
+    actualizados = omitidos = 0
+
+    def procesar(lote):
+        nonlocal actualizados, omitidos
+        cronogramas = calcular_cronogramas(
+            [pr.monto_total for pr in lote],
+            [pr.tasa_interes for pr in lote],
+            [pr.cuotas_totales for pr in lote],
+        )
+        por_prestamo = {pr.pk: filas for pr, filas in zip(lote, cronogramas)}
+        cambiados = []
+        for pago in Pago.objects.filter(prestamo__in=list(por_prestamo), interes__isnull=True):
+            filas = por_prestamo[pago.prestamo_id]
+            k = pago.numero_cuota - 1
+            if 0 <= k < len(filas) and filas[k][0] == pago.monto:
+                _, pago.interes, pago.capital, pago.saldo = filas[k]
+                cambiados.append(pago)
+            else:
+                omitidos += 1
+        Pago.objects.bulk_update(cambiados, ['interes', 'capital', 'saldo'], batch_size=1000)
+        actualizados += len(cambiados)
+
+    lote = []
+    for pr in qs.iterator(chunk_size=batch_size):
+        lote.append(pr)
+        if len(lote) >= batch_size:
+            procesar(lote)
+            lote = []
+    if lote:
+        procesar(lote)
+    return {'actualizados': actualizados, 'omitidos': omitidos}
@@ -1,3 +1,500 @@
-from django.test import TestCase
+import io
+import random
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db.models import F
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+import Moneda.services as moneda
+from Moneda.models import TipoCambio
+from Pagos.models import Pago
+from Persona.models import Persona
+from .forms import PrepagoForm, PrestamoForm, SimulacionForm
+from .models import Prestamo
+from .prepago import MODALIDADES, Base, CuotaBase, bases_cache, cronograma_base, simular_escenarios, simular_prepago
+from .services import (
+    calcular_cronograma, completar_desglose, filas_cronograma, generar_cuotas_lote, sincronizar_cuotas,
+)
+from . import amortizacion, importacion, signals
+
+
+def crear_persona(**kwargs):
+    datos = {'nombres': 'Ana', 'apellidos': 'Pérez', 'correo': 'ana@example.com', 'noti_sms': False}
+    datos.update(kwargs)
+    return Persona.objects.create(**datos)
+
+
+def crear_prestamo(persona, **kwargs):
+    datos = {
+        'persona': persona, 'banco': 'BCP', 'monto_total': Decimal('10000'),
+        'tasa_interes': Decimal('20'), 'cuotas_totales': 36, 'fecha_inicio': date.today(),
+        'moneda_prestamo': 'USD', 'moneda_pago': 'PEN',
+    }
+    datos.update(kwargs)
+    return Prestamo.objects.create(**datos)
+
+
+class GenerarCuotasTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        self.persona = crear_persona()
+
+    def test_guardar_prestamo_no_consulta_proveedores(self):
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')) as fetch:
+            prestamo = crear_prestamo(self.persona)
+        fetch.assert_not_called()
+
+        pagos = Pago.objects.filter(prestamo=prestamo)
+        self.assertEqual(pagos.count(), 36)
+        # sin tasas guardadas: solo la moneda del préstamo; el resto lo llena el refresco
+        self.assertFalse(pagos.exclude(monto_usd=F('monto')).exists())
+        self.assertFalse(pagos.filter(monto_pen__isnull=False).exists())
+        self.assertFalse(pagos.filter(fecha_tc_montos__isnull=False).exists())
+
+    def test_guardar_prestamo_usa_tasas_guardadas(self):
+        hoy = date.today()
+        TipoCambio.objects.bulk_create([
+            TipoCambio(fecha=hoy, base='USD', destino='PEN', valor=Decimal('3.500000')),
+            TipoCambio(fecha=hoy, base='USD', destino='EUR', valor=Decimal('0.900000')),
+        ])
+        with mock.patch.object(moneda, '_fetch_remote_tabla') as fetch:
+            prestamo = crear_prestamo(self.persona, fecha_inicio=hoy)
+        fetch.assert_not_called()
+
+        pago = Pago.objects.get(prestamo=prestamo, numero_cuota=1)
+        self.assertEqual(pago.monto_pen, (pago.monto * Decimal('3.5')).quantize(Decimal('0.01'), ROUND_HALF_UP))
+        self.assertEqual(pago.fecha_tc_montos, hoy)
+
+
+    def filas(self, prestamo) -> list:
+        return list(
+            Pago.objects.filter(prestamo=prestamo).order_by('numero_cuota')
+            .values_list('numero_cuota', 'fecha_vencimiento', 'monto', 'interes', 'capital', 'saldo', 'estado',
+                         'monto_pen', 'monto_usd', 'monto_eur', 'fecha_tc_montos')
+        )
+
+    def test_lote_igual_que_la_senal(self):
+        hoy = date.today()
+        parametros = [
+            {'monto_total': Decimal('10000'), 'tasa_interes': Decimal('20'), 'cuotas_totales': 36},
+            {'monto_total': Decimal('1234.56'), 'tasa_interes': Decimal('0'), 'cuotas_totales': 7,
+             'fecha_inicio': hoy - timedelta(days=100)},
+            {'monto_total': Decimal('400000'), 'tasa_interes': Decimal('116'), 'cuotas_totales': 1,
+             'moneda_prestamo': 'PEN'},
+        ]
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            por_senal = [crear_prestamo(self.persona, **kw) for kw in parametros]
+            en_lote = Prestamo.objects.bulk_create([
+                Prestamo(**dict({'persona': self.persona, 'banco': 'BCP', 'fecha_inicio': hoy,
+                                 'moneda_prestamo': 'USD', 'moneda_pago': 'PEN'}, **kw))
+                for kw in parametros
+            ])
+            self.assertFalse(Pago.objects.filter(prestamo__in=en_lote).exists())   # bulk_create no dispara la señal
+            creados = generar_cuotas_lote(en_lote)
+
+        self.assertEqual(len(creados), 36 + 7 + 1)
+        for a, b in zip(por_senal, en_lote):
+            self.assertEqual(self.filas(a), self.filas(b))
+            esperado = calcular_cronograma(a.monto_total, a.tasa_interes, a.cuotas_totales, a.fecha_inicio)
+            self.assertEqual(
+                [f[:6] for f in self.filas(b)],
+                [(c['numero_cuota'], c['fecha_vencimiento'], c['monto'], c['interes'], c['capital'], c['saldo'])
+                 for c in esperado],
+            )
+            a.refresh_from_db()
+            b.refresh_from_db()
+            self.assertEqual(
+                (a.saldo_pendiente, a.cuotas_pendientes, a.proximo_vencimiento),
+                (b.saldo_pendiente, b.cuotas_pendientes, b.proximo_vencimiento),
+            )
+
+    def test_lote_no_duplica_cuotas(self):
+        prestamo = crear_prestamo(self.persona, cuotas_totales=3)
+        self.assertEqual(generar_cuotas_lote([prestamo, Prestamo(banco='sin guardar')]), [])
+        self.assertEqual(Pago.objects.filter(prestamo=prestamo).count(), 3)
+
+
+class CalcularCronogramasTests(TestCase):
+    def prestamos(self, cantidad=400):
+        rnd = random.Random(7)
+        teas = [Decimal('0'), Decimal('8.5'), Decimal('12'), Decimal('18.75'), Decimal('45'), Decimal('116')]
+        principales = [Decimal(rnd.randint(1, 40_000_000)) / 100 for _ in range(cantidad)]
+        tasas = [rnd.choice(teas) for _ in range(cantidad)]
+        plazos = [rnd.randint(1, 36) for _ in range(cantidad)]
+        return principales, tasas, plazos
+
+    def referencia(self, principales, tasas, plazos):
+        return [filas_cronograma(P, t, n) for P, t, n in zip(principales, tasas, plazos)]
+
+    @skipUnless(amortizacion.HAS_NUMPY, 'NumPy no instalado')
+    def test_numpy_igual_que_el_calculo_por_prestamo(self):
+        datos = self.prestamos()
+        self.assertEqual(amortizacion.calcular_cronogramas(*datos), self.referencia(*datos))
+
+    @skipUnless(amortizacion.HAS_NUMPY, 'NumPy no instalado')
+    def test_conciliacion_en_decimal(self):
+        # con un margen enorme todos los redondeos se rehacen en Decimal
+        datos = self.prestamos(50)
+        with mock.patch.object(amortizacion, '_EPS_CENTAVO', 0.5):
+            self.assertEqual(amortizacion.calcular_cronogramas(*datos), self.referencia(*datos))
+
+    def test_sin_numpy_y_principales_con_mas_de_dos_decimales(self):
+        datos = self.prestamos(20)
+        with mock.patch.object(amortizacion, 'HAS_NUMPY', False):
+            self.assertEqual(amortizacion.calcular_cronogramas(*datos), self.referencia(*datos))
+
+        datos = ([Decimal('1000.005'), Decimal('250')], [Decimal('12'), Decimal('0')], [12, 5])
+        self.assertEqual(amortizacion.calcular_cronogramas(*datos), self.referencia(*datos))
+        self.assertEqual(amortizacion.calcular_cronogramas([], [], []), [])
+
+    def test_plazo_cero(self):
+        datos = ([Decimal('1000'), Decimal('500')], [Decimal('20'), Decimal('0')], [0, 3])
+        self.assertEqual(amortizacion.calcular_cronogramas(*datos), self.referencia(*datos))
+
+
+class RegenerarCuotasTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        self.persona = crear_persona()
+        self.con_cuotas = crear_prestamo(self.persona, cuotas_totales=2)
+        # bulk_create no dispara la señal: quedan sin cuotas
+        self.sin_cuotas = Prestamo.objects.bulk_create([
+            Prestamo(persona=self.persona, banco='BCP', monto_total=Decimal('1000') * k, tasa_interes=Decimal('12'),
+                     cuotas_totales=k + 1, fecha_inicio=date.today(), moneda_prestamo='PEN', moneda_pago='PEN')
+            for k in range(1, 6)
+        ])
+
+    def correr(self, *args) -> str:
+        salida = io.StringIO()
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            call_command('regenerar_cuotas', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_genera_solo_los_que_no_tienen_cuotas(self):
+        self.assertIn('Préstamos sin cuotas: 5', self.correr('--dry-run'))
+        self.assertFalse(Pago.objects.filter(prestamo__in=self.sin_cuotas).exists())
+
+        salida = self.correr('--batch-size', '2')
+
+        self.assertIn('Cuotas creadas: 20 (5 préstamos', salida)
+        self.assertEqual(Pago.objects.filter(prestamo=self.con_cuotas).count(), 2)
+        for pr in self.sin_cuotas:
+            self.assertEqual(Pago.objects.filter(prestamo=pr).count(), pr.cuotas_totales)
+        self.assertIn('Cuotas creadas: 0', self.correr())
+
+    def test_argumentos_invalidos(self):
+        with self.assertRaises(CommandError):
+            self.correr('--batch-size', '0')
+
+
+class DesgloseCuotasTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            self.prestamo = crear_prestamo(crear_persona(), cuotas_totales=12)
+
+    def desglose(self) -> list:
+        return list(
+            Pago.objects.filter(prestamo=self.prestamo).order_by('numero_cuota')
+            .values_list('monto', 'interes', 'capital', 'saldo')
+        )
+
+    def test_cuotas_guardan_interes_capital_y_saldo(self):
+        filas = self.desglose()
+        self.assertEqual(filas, filas_cronograma(Decimal('10000'), Decimal('20'), 12))
+        self.assertEqual(filas[-1][3], Decimal('0.00'))
+        for monto, interes, capital, _ in filas:
+            self.assertEqual(monto, interes + capital)
+
+    def test_completar_desglose(self):
+        esperado = self.desglose()
+        Pago.objects.filter(prestamo=self.prestamo).update(interes=None, capital=None, saldo=None)
+        # editada a mano: ya no coincide con el cronograma y se omite
+        Pago.objects.filter(prestamo=self.prestamo, numero_cuota=12).update(monto=Decimal('1.00'))
+
+        self.assertEqual(completar_desglose(batch_size=1), {'actualizados': 11, 'omitidos': 1})
+        self.assertEqual(self.desglose()[:11], esperado[:11])
+        self.assertEqual(self.desglose()[11], (Decimal('1.00'), None, None, None))
+
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('completar_desglose_cuotas', stdout=salida, stderr=errores)
+        self.assertIn('Cuotas con desglose completado: 0', salida.getvalue())
+        self.assertIn('1 cuotas no coinciden', errores.getvalue())
+
+
+class SincronizarCuotasTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        hoy = date.today()
+        TipoCambio.objects.bulk_create([
+            TipoCambio(fecha=hoy, base='USD', destino='PEN', valor=Decimal('3.500000')),
+            TipoCambio(fecha=hoy, base='USD', destino='EUR', valor=Decimal('0.900000')),
+        ])
+        self.prestamo = crear_prestamo(crear_persona(), moneda_prestamo='PEN', cuotas_totales=12)
+
+    def test_cambio_de_moneda_recalcula_equivalentes(self):
+        self.prestamo.moneda_prestamo = 'USD'
+        self.prestamo.save()
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            cambiados = sincronizar_cuotas(self.prestamo, moneda_anterior='PEN')
+
+        # mismo cronograma: ninguna cuota cuenta como modificada
+        self.assertEqual(cambiados, [])
+        pagos = Pago.objects.filter(prestamo=self.prestamo)
+        self.assertFalse(pagos.exclude(monto_usd=F('monto')).exists())
+        pago = pagos.get(numero_cuota=1)
+        self.assertEqual(pago.monto_pen, (pago.monto * Decimal('3.5')).quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+    def test_cambio_de_moneda_recalcula_aunque_el_equivalente_no_lo_delate(self):
+        # sin equivalente guardado, o con uno que coincide con el monto
+        Pago.objects.filter(prestamo=self.prestamo, numero_cuota=1).update(monto_usd=None)
+        Pago.objects.filter(prestamo=self.prestamo, numero_cuota=2).update(monto_usd=F('monto'))
+        self.prestamo.moneda_prestamo = 'USD'
+        self.prestamo.save()
+        sincronizar_cuotas(self.prestamo, moneda_anterior='PEN')
+
+        for pago in Pago.objects.filter(prestamo=self.prestamo, numero_cuota__in=(1, 2)):
+            self.assertEqual(pago.monto_usd, pago.monto)
+            self.assertEqual(pago.monto_pen, (pago.monto * Decimal('3.5')).quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+    def test_misma_moneda_no_toca_equivalentes(self):
+        Pago.objects.filter(prestamo=self.prestamo).update(monto_usd=None)
+        self.assertEqual(sincronizar_cuotas(self.prestamo, moneda_anterior='PEN'), [])
+        self.assertFalse(Pago.objects.filter(prestamo=self.prestamo, monto_usd__isnull=False).exists())
+
+    @override_settings(ALERTAS_WORKER_HILO=False)
+    def test_editar_prestamo_pasa_la_moneda_anterior(self):
+        user = User.objects.create_user('ana', password='x')
+        self.prestamo.persona.user = user
+        self.prestamo.persona.save()
+        self.client.force_login(user)
+        datos = {
+            'banco': 'BCP', 'descripcion': '', 'monto_total': '10000', 'tasa_interes': '20',
+            'fecha_inicio': self.prestamo.fecha_inicio.isoformat(), 'cuotas_totales': '12',
+            'moneda_prestamo': 'USD', 'moneda_pago': 'PEN',
+        }
+        r = self.client.post(reverse('prestamos:editar', args=[self.prestamo.pk]), datos)
+        self.assertEqual(r.status_code, 302)
+        pagos = Pago.objects.filter(prestamo=self.prestamo)
+        self.assertFalse(pagos.exclude(monto_usd=F('monto')).exists())
+
+
+class PrepagoFormTests(TestCase):
+    def test_rechaza_montos_no_finitos(self):
+        for valor in ('NaN', 'Infinity', '-Infinity', 'abc', '0', '-5'):
+            form = PrepagoForm({'fecha': date.today().isoformat(), 'montos': f'1000, {valor}'})
+            self.assertFalse(form.is_valid(), valor)
+            self.assertIn('montos', form.errors)
+
+    def test_montos_validos(self):
+        form = PrepagoForm({'fecha': date.today().isoformat(), 'montos': '1000, 2500.50'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['montos'], [Decimal('1000'), Decimal('2500.50')])
+
+
+@override_settings(ALERTAS_WORKER_HILO=False)
+class SimulacionFormTests(TestCase):
+    BASE = {'monto_total': '10000', 'tasa_interes': '20', 'cuotas_totales': '12', 'fecha_inicio': '2026-01-15'}
+    DATOS_PRESTAMO = {'banco': 'BCP', 'moneda_prestamo': 'PEN', 'moneda_pago': 'PEN'}
+
+    def test_mismos_limites_que_prestamo_form(self):
+        casos = [
+            ('monto_total', '400000'), ('monto_total', '400000.01'), ('monto_total', '0'),
+            ('tasa_interes', '116'), ('tasa_interes', '116.01'), ('tasa_interes', '-1'),
+            ('cuotas_totales', '36'), ('cuotas_totales', '37'), ('cuotas_totales', '0'),
+            ('fecha_inicio', 'mañana'),
+        ]
+        for campo, valor in casos:
+            with self.subTest(campo=campo, valor=valor):
+                datos = dict(self.BASE, **{campo: valor})
+                simulacion = SimulacionForm(datos)
+                prestamo = PrestamoForm(dict(datos, **self.DATOS_PRESTAMO))
+                self.assertEqual(simulacion.is_valid(), prestamo.is_valid())
+                self.assertEqual(campo in simulacion.errors, campo in prestamo.errors)
+                self.assertEqual(list(simulacion.errors), [campo] if simulacion.errors else [])
+
+    def test_vista_simular(self):
+        self.client.force_login(User.objects.create_user('ana', password='x'))
+        url = reverse('prestamos:simular')
+
+        r = self.client.get(url, self.BASE)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()['cuotas']), 12)
+
+        r = self.client.get(url, dict(self.BASE, cuotas_totales='37'))
+        self.assertEqual(r.status_code, 400)
+        self.assertIn('cuotas_totales', r.json()['errores'])
+
+
+class SimularPrepagoTests(TestCase):
+    def base_ultima_cuota(self, i):
+        fecha = date.today() + timedelta(days=10)
+        cuota = CuotaBase(12, fecha, Decimal('100.00'), Decimal('1.00'), Decimal('99.00'), Decimal('0.02'))
+        return Base(i=i, pendientes=(cuota,))
+
+    def test_prepago_en_la_ultima_cuota_es_error(self):
+        for i in (Decimal('0'), Decimal('0.015')):
+            base = self.base_ultima_cuota(i)
+            for modalidad in MODALIDADES:
+                with self.assertRaises(ValueError):
+                    simular_prepago(base, date.today(), Decimal('0.01'), modalidad)
+
+
+class PrepagoEscenariosTests(TestCase):
+    def setUp(self):
+        moneda.tasas_cache.limpiar()
+        moneda.fallos_cache.limpiar()
+        bases_cache.limpiar()
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            self.prestamo = crear_prestamo(crear_persona(), cuotas_totales=24, moneda_prestamo='PEN')
+        self.fecha = date.today() + timedelta(days=1)   # la primera cuota pendiente
+
+    def test_escenarios_conservan_el_capital(self):
+        base = cronograma_base(self.prestamo)
+        cuota = base.pendientes[0]
+        interes_original = sum(c.interes for c in base.pendientes)
+        escenarios = simular_escenarios(self.prestamo, self.fecha, [None, Decimal('2000'), Decimal('999999')])
+
+        self.assertEqual([e['modalidad'] for e in escenarios], ['total', 'plazo', 'cuota'])
+        total, plazo, reducir_cuota = escenarios
+        for e in escenarios:
+            # lo pagado menos el interés es el capital que quedaba antes de la cuota
+            self.assertEqual(e['total_pagado'] - e['interes_total'], cuota.capital + cuota.saldo)
+            self.assertGreater(e['ahorro_interes'], 0)
+        self.assertEqual(total['prepago'], cuota.saldo)
+        self.assertEqual(total['interes_total'], cuota.interes)
+        self.assertEqual(total['ahorro_interes'], interes_original - cuota.interes)
+        self.assertLess(plazo['cuotas_restantes'], 23)
+        self.assertEqual(plazo['nueva_cuota'], cuota.monto)
+        self.assertEqual(reducir_cuota['cuotas_restantes'], 23)
+        self.assertLess(reducir_cuota['nueva_cuota'], cuota.monto)
+        self.assertGreater(total['ahorro_interes'], plazo['ahorro_interes'])
+        self.assertGreater(plazo['ahorro_interes'], reducir_cuota['ahorro_interes'])
+
+    def test_sin_cuotas_despues_de_la_fecha(self):
+        escenarios = simular_escenarios(self.prestamo, self.fecha + timedelta(days=3650), [None])
+        self.assertIn('error', escenarios[0])
+
+    def test_base_cacheada_hasta_que_cambian_las_cuotas(self):
+        base = cronograma_base(self.prestamo)
+        with self.assertNumQueries(0):
+            self.assertIs(cronograma_base(self.prestamo), base)
+
+        pago = Pago.objects.get(prestamo=self.prestamo, numero_cuota=1)
+        pago.estado = 'Pagado'
+        pago.save()
+        self.prestamo.refresh_from_db()
+
+        nueva = cronograma_base(self.prestamo)
+        self.assertEqual(len(nueva.pendientes), len(base.pendientes) - 1)
+        self.assertEqual(nueva.pendientes, base.pendientes[1:])
+
+    def test_base_sin_desglose_guardado(self):
+        guardada = cronograma_base(self.prestamo)
+        bases_cache.limpiar()
+        Pago.objects.filter(prestamo=self.prestamo).update(interes=None, capital=None, saldo=None)
+
+        self.assertEqual(cronograma_base(self.prestamo), guardada)
+
+
+class ResumenPrestamoTests(TestCase):
+    def setUp(self):
+        self.persona = crear_persona()
+        with mock.patch.object(moneda, '_fetch_remote_tabla', side_effect=ValueError('caído')):
+            self.prestamos = [crear_prestamo(self.persona, cuotas_totales=6) for _ in range(2)]
+
+    def test_borrado_en_bloque_recalcula_una_vez(self):
+        with mock.patch.object(signals, 'actualizar_resumen', wraps=signals.actualizar_resumen) as resumen:
+            Pago.objects.filter(numero_cuota__gte=5).delete()
+        resumen.assert_called_once_with({p.pk for p in self.prestamos})
+        for prestamo in self.prestamos:
+            prestamo.refresh_from_db()
+            self.assertEqual(prestamo.cuotas_pendientes, 4)
+
+    def test_borrado_por_el_related_manager_tambien(self):
+        prestamo = self.prestamos[0]
+        with mock.patch.object(signals, 'actualizar_resumen', wraps=signals.actualizar_resumen) as resumen:
+            prestamo.pagos.filter(numero_cuota=6).delete()
+        resumen.assert_called_once_with({prestamo.pk})
+        prestamo.refresh_from_db()
+        self.assertEqual(prestamo.cuotas_pendientes, 5)
+
+    def test_borrar_la_persona_no_recalcula(self):
+        with mock.patch.object(signals, 'actualizar_resumen') as resumen:
+            self.persona.delete()
+        resumen.assert_not_called()
+
+    def test_guardar_sin_cambios_que_afecten_el_resumen_no_recalcula(self):
+        pago = Pago.objects.get(prestamo=self.prestamos[0], numero_cuota=1)
+        with mock.patch.object(signals, 'actualizar_resumen', wraps=signals.actualizar_resumen) as resumen:
+            pago.tc_fijo = Decimal('3.5')
+            pago.save()
+            pago.save(update_fields=['tc_fijo'])
+            resumen.assert_not_called()
+
+            pago.estado = 'Pagado'
+            pago.save()
+            pago.save()
+        resumen.assert_called_once_with([pago.prestamo_id])
+        self.prestamos[0].refresh_from_db()
+        self.assertEqual(self.prestamos[0].cuotas_pagadas, 1)
+
+
+CSV_PRESTAMOS = (
+    "acreedor,banco,descripcion,monto_total,tasa_interes,fecha_inicio,cuotas_totales,moneda_prestamo,moneda_pago\n"
+    "Caja Piura,Caja,auto,5000,18,2024-01-15,12,PEN,PEN\n"
+    ",BCP,,1200,0,2024-02-01,6,PEN,PEN\n"
+)
+
+
+@override_settings(ALERTAS_WORKER_HILO=False)
+class ImportarPrestamosTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='x')
+        self.persona = crear_persona(user=self.user)
+        self.client.force_login(self.user)
+
+    def subir(self, contenido: bytes):
+        archivo = SimpleUploadedFile('prestamos.csv', contenido, content_type='text/csv')
+        return self.client.post(reverse('prestamos:importar'), {'archivo': archivo})
+
+    def test_archivo_valido(self):
+        r = self.subir(CSV_PRESTAMOS.encode())
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.context['resumen']['prestamos'], 2)
+        self.assertEqual(r.context['resumen']['cuotas'], 18)
+        self.assertEqual(Pago.objects.filter(prestamo__persona=self.persona).count(), 18)
+        self.assertEqual(Prestamo.objects.get(banco='Caja').acreedor.nombre, 'Caja Piura')
+
+    def test_fila_invalida_se_informa_y_las_demas_se_importan(self):
+        r = self.subir((CSV_PRESTAMOS + ",Otro,,abc,10,2024-03-01,6,PEN,PEN\n").encode())
+        resumen = r.context['resumen']
+        self.assertEqual(resumen['prestamos'], 2)
+        self.assertEqual([linea for linea, _ in resumen['errores']], [4])
+        self.assertIn('monto_total', resumen['errores'][0][1])
+
+    def test_codificacion_invalida_no_importa_nada(self):
+        r = self.subir(CSV_PRESTAMOS.encode() + "Año,Caja,,100,5,2024-01-01,3,PEN,PEN\n".encode('latin-1'))
+        self.assertIsNone(r.context['resumen'])
+        self.assertFalse(Prestamo.objects.exists())
+        self.assertIn('No se importó ningún préstamo', str(list(r.context['messages'])[0]))
+
+    def test_error_de_lectura_a_la_mitad_revierte_los_lotes_ya_guardados(self):
+        def filas():
+            yield from importacion.leer_csv(io.StringIO(CSV_PRESTAMOS))
+            raise ValueError('Línea 4: no se pudo leer el CSV')
+
+        with self.assertRaises(ValueError):
+            importacion.importar_prestamos(filas(), self.persona, batch_size=1)
+        self.assertFalse(Prestamo.objects.exists())
+        self.assertFalse(Pago.objects.exists())
@@ -6,7 +6,10 @@ app_name = 'prestamos'
 urlpatterns = [
     path('', views.lista_prestamos, name='lista'),
     path('<int:prestamo_id>/pagos/', views.pagos_por_prestamo, name='pagos_por_prestamo'),
+    path('<int:prestamo_id>/prepago/', views.simular_prepago, name='prepago'),
     path('nuevo/', views.crear_prestamo, name='crear'),
+    path('simular/', views.simular_prestamo, name='simular'),
+    path('importar/', views.importar_prestamos, name='importar'),
     path('<int:prestamo_id>/editar/', views.editar_prestamo, name='editar'),
     path('<int:prestamo_id>/eliminar/', views.eliminar_prestamo, name='eliminar'),
     path('acreedores/', views.lista_acreedores, name='acreedores_lista'),
@@ -1,18 +1,24 @@
+import io
 from datetime import date
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
+from django.views.decorators.http import require_GET
 
-from Moneda.services import convertir_monto
+from Moneda.services import convertir_montos_batch
 from Pagos.models import Pago
-from Alertas.services import enviar_alerta_inmediata_por_pago
+from Pagos.services import POR_PAGAR, equivalentes
+from Alertas.services import encolar_alertas_inmediatas
 
+from . import importacion
 from .models import Prestamo, Acreedor
-from .forms import PrestamoForm, AcreedorForm
-from .signals import generar_cuotas
+from .forms import PrestamoForm, AcreedorForm, PrepagoForm, SimulacionForm
+from .prepago import simular_escenarios
+from .services import simular_cronograma, sincronizar_cuotas
 
 
 @login_required
@@ -46,7 +52,20 @@ def pagos_por_prestamo(request, prestamo_id: int):
     preferida = (getattr(request.user.persona, 'moneda_preferida', None) or 'PEN').upper()
     destino = (getattr(prestamo, 'moneda_pago', None) or preferida).upper()
 
-    pagos = Pago.objects.filter(prestamo=prestamo).order_by('numero_cuota')
+    pagos = list(Pago.objects.filter(prestamo=prestamo).order_by('numero_cuota'))
+
+    # pagadas con snapshot: no necesitan tipo de cambio; pagadas sin snapshot:
+    # se convierten a la fecha de pago; pendientes: equivalente precalculado
+    pagadas = [
+        p for p in pagos
+        if origen != destino and p.estado == 'Pagado' and not p.monto_destino_fijo
+    ]
+    pendientes = [p for p in pagos if origen != destino and p.estado != 'Pagado']
+    convertidos = convertir_montos_batch(
+        [(p.monto, origen, destino, p.fecha_pago or p.fecha_vencimiento) for p in pagadas],
+        omitir_errores=True,
+    ) + equivalentes(pendientes, [destino] * len(pendientes))
+    equivs = {p.pk: eq for p, eq in zip(pagadas + pendientes, convertidos)}
 
     filas = []
     for p in pagos:
@@ -54,18 +73,10 @@ def pagos_por_prestamo(request, prestamo_id: int):
         equiv = None
 
         if origen != destino:
-            try:
-                if p.estado == 'Pagado' and hasattr(p, 'monto_destino_fijo') and p.monto_destino_fijo:
-                    equiv = _q2(p.monto_destino_fijo)
-                else:
-                    fecha_ref = (
-                        p.fecha_pago.date()
-                        if (p.estado == 'Pagado' and p.fecha_pago)
-                        else p.fecha_vencimiento
-                    )
-                    equiv = _q2(convertir_monto(p.monto, origen, destino, fecha_ref))
-            except Exception:
-                equiv = None
+            if p.estado == 'Pagado' and p.monto_destino_fijo:
+                equiv = _q2(p.monto_destino_fijo)
+            elif equivs.get(p.pk) is not None:
+                equiv = _q2(equivs[p.pk])
 
         filas.append({
             'pago': p,
@@ -75,11 +86,16 @@ def pagos_por_prestamo(request, prestamo_id: int):
             'sym_destino': _sym(destino),
         })
 
+    # desglose guardado en cada cuota (las antiguas pueden no tenerlo)
+    interes_pagado = sum((p.interes for p in pagos if p.estado == 'Pagado' and p.interes is not None), Decimal('0.00'))
+    interes_por_pagar = sum((p.interes for p in pagos if p.estado != 'Pagado' and p.interes is not None), Decimal('0.00'))
+
     back_url = request.GET.get('next') or reverse('prestamos:lista')
     ctx = {
         'prestamo': prestamo,
         'filas': filas,
-        'today': date.today(),
+        'interes_pagado': interes_pagado,
+        'interes_por_pagar': interes_por_pagar,
         'sym_origen': _sym(origen),
         'sym_destino': _sym(destino),
         'back_url': back_url,
@@ -87,6 +103,28 @@ def pagos_por_prestamo(request, prestamo_id: int):
     return render(request, 'prestamos/pagos_por_prestamo.html', ctx)
 
 
+@login_required
+def simular_prepago(request, prestamo_id: int):
+    """
+    Escenarios de prepago del préstamo: cancelación total y, por cada monto
+    indicado, reducir plazo o reducir cuota. No modifica las cuotas.
+    """
+    prestamo = get_object_or_404(Prestamo, pk=prestamo_id, persona__user=request.user)
+    form = PrepagoForm(request.GET or None, initial={'fecha': date.today()})
+    escenarios = None
+    if form.is_valid():
+        escenarios = simular_escenarios(
+            prestamo, form.cleaned_data['fecha'], [None] + form.cleaned_data['montos'],
+        )
+
+    return render(request, 'prestamos/prepago.html', {
+        'prestamo': prestamo,
+        'form': form,
+        'escenarios': escenarios,
+        'sym': _sym(prestamo.moneda_prestamo),
+    })
+
+
 @login_required
 def crear_prestamo(request):
     persona = getattr(request.user, 'persona', None)
@@ -100,10 +138,10 @@ def crear_prestamo(request):
             prestamo = form.save(commit=False)
             prestamo.persona = persona
             prestamo.save()
-            # generar cuotas por signal
-            pagos_nuevos = Pago.objects.filter(prestamo=prestamo, estado='Pendiente')
-            for pago in pagos_nuevos:
-                enviar_alerta_inmediata_por_pago(pago)
+            # generar cuotas por signal; las alertas se envían en segundo plano
+            encolar_alertas_inmediatas(
+                Pago.objects.filter(prestamo=prestamo, estado__in=POR_PAGAR, fecha_vencimiento__lte=date.today())
+            )
             messages.success(request, 'Préstamo creado y cuotas generadas automáticamente.')
             return redirect('prestamos:lista')
         messages.error(request, 'Revisa los campos del formulario.')
@@ -113,6 +151,72 @@ def crear_prestamo(request):
     return render(request, 'prestamos/nuevo.html', {'form': form})
 
 
+@login_required
+def importar_prestamos(request):
+    """Carga masiva de préstamos desde un CSV (ver Prestamos.importacion)."""
+    persona = getattr(request.user, 'persona', None)
+    if persona is None:
+        messages.error(request, 'Primero completa tu perfil para vincular tu cuenta a una Persona.')
+        return redirect('seguridad:profile')
+
+    resumen = None
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            messages.error(request, 'Selecciona un archivo CSV.')
+        else:
+            texto = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+            try:
+                resumen = importacion.importar_prestamos(importacion.leer_csv(texto), persona)
+            except ValueError as e:
+                # la importación es atómica: no quedó nada a medias
+                messages.error(request, f'No se importó ningún préstamo. {e}')
+            else:
+                if resumen['prestamos']:
+                    messages.success(
+                        request,
+                        f"Se importaron {resumen['prestamos']} préstamos ({resumen['cuotas']} cuotas).",
+                    )
+                if resumen['errores']:
+                    messages.error(request, f"{len(resumen['errores'])} filas no se importaron.")
+
+    return render(request, 'prestamos/importar.html', {
+        'resumen': resumen,
+        'columnas': importacion.COLUMNAS,
+    })
+
+
+@login_required
+@require_GET
+def simular_prestamo(request):
+    """
+    Vista previa del cronograma en JSON, sin tocar la BD. Recibe por GET
+    monto_total, tasa_interes, cuotas_totales y fecha_inicio (YYYY-MM-DD).
+    """
+    form = SimulacionForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errores': form.errors.get_json_data()}, status=400)
+
+    d = form.cleaned_data
+    filas = simular_cronograma(d['monto_total'], d['tasa_interes'], d['cuotas_totales'], d['fecha_inicio'])
+    cuotas = [
+        {
+            'numero_cuota': numero,
+            'fecha_vencimiento': fecha.isoformat(),
+            'monto': str(monto),
+            'interes': str(interes),
+            'capital': str(capital),
+            'saldo': str(saldo),
+        }
+        for numero, fecha, monto, interes, capital, saldo in filas
+    ]
+    return JsonResponse({
+        'cuotas': cuotas,
+        'total': str(sum((f[2] for f in filas), Decimal('0.00'))),
+        'total_interes': str(sum((f[3] for f in filas), Decimal('0.00'))),
+    })
+
+
 @login_required
 def editar_prestamo(request, prestamo_id: int):
     prestamo = get_object_or_404(Prestamo, pk=prestamo_id, persona__user=request.user)
@@ -134,11 +238,10 @@ def editar_prestamo(request, prestamo_id: int):
                 )
             else:
                 form.save()
-                Pago.objects.filter(prestamo=prestamo).delete()
-                generar_cuotas(prestamo)
-                pagos_recalculados = Pago.objects.filter(prestamo=prestamo, estado='Pendiente')
-                for pago in pagos_recalculados:
-                    enviar_alerta_inmediata_por_pago(pago)
+                # solo las cuotas que cambiaron (o se agregaron) generan alerta
+                encolar_alertas_inmediatas(
+                    sincronizar_cuotas(prestamo, moneda_anterior=form.initial.get('moneda_prestamo'))
+                )
                 messages.success(request, 'Préstamo actualizado y cuotas recalculadas.')
             return redirect('prestamos:lista')
         messages.error(request, 'Revisa los campos del formulario.')
@@ -8,7 +8,7 @@ from django.db.models import Q
 from django.utils import timezone
 
 from Pagos.models import Pago
-from Moneda.services import convertir_monto
+from Pagos.services import POR_PAGAR, equivalentes
 
 
 def _q2(x) -> Decimal:
@@ -85,7 +85,7 @@ def dashboard(request):
         .filter(prestamo__persona=persona)
         .filter(
             Q(fecha_vencimiento__gte=primer_dia, fecha_vencimiento__lte=ultimo_dia)
-            | Q(fecha_vencimiento__lt=primer_dia, estado='Pendiente')
+            | Q(fecha_vencimiento__lt=primer_dia, estado__in=POR_PAGAR)
         )
         .select_related('prestamo', 'prestamo__persona')
         .order_by('fecha_vencimiento', 'numero_cuota')
@@ -102,36 +102,39 @@ def dashboard(request):
         .select_related('prestamo', 'prestamo__persona')
     )
 
-    def conv(p):
-        origen = p.prestamo.moneda_prestamo or 'PEN'
-        return _q2(convertir_monto(p.monto, origen, base, p.fecha_vencimiento))
+    def conv(pagos):
+        # montos precalculados en Pago; lo que falte se convierte en bloque
+        pagos = list(pagos)
+        return [_q2(m) for m in equivalentes(pagos, [base] * len(pagos), omitir_errores=False)]
+
+    pagos_base = list(qs_base)
 
     # === Totales ===
     # Este mes debes pagar: todo lo pendiente que estás viendo (mes + atrasados)
+    montos_base = conv(pagos_base)
     total_pendientes = sum(
-        (conv(p) for p in qs_base.filter(estado='Pendiente')),
+        (m for p, m in zip(pagos_base, montos_base) if p.estado in POR_PAGAR),
         Decimal('0.00')
     )
 
     # Pagado en el mes: solo cuotas de este mes con estado Pagado
     total_pagados_mes = sum(
-        (conv(p) for p in qs_mes.filter(estado='Pagado')),
+        conv(qs_mes.filter(estado='Pagado')),
         Decimal('0.00')
     )
 
-    # Pagos vencidos (globales): todo lo pendiente con fecha pasada, sin importar el mes
+    # Pagos vencidos (globales): todo lo Vencido, sin importar el mes
     qs_vencidos_global = (
         Pago.objects
         .filter(
             prestamo__persona=persona,
-            estado='Pendiente',
-            fecha_vencimiento__lt=today,
+            estado='Vencido',
         )
         .select_related('prestamo', 'prestamo__persona')
     )
 
     total_vencidos = sum(
-        (conv(p) for p in qs_vencidos_global),
+        conv(qs_vencidos_global),
         Decimal('0.00')
     )
 
@@ -150,8 +153,8 @@ def dashboard(request):
     def estado_visual(pago: Pago) -> str:
         pago_dt = to_local_datetime(pago.fecha_vencimiento)
 
-        # Rojo: cualquier cuota NO pagada cuya fecha de vencimiento ya pasó
-        if pago_dt < today_dt and pago.estado != 'Pagado':
+        # Rojo: cuotas marcadas como Vencido
+        if pago.estado == 'Vencido':
             return 'vencido'
 
         # Amarillo: cuotas PENDIENTES que vencen entre hoy y los próximos 7 días
@@ -163,11 +166,11 @@ def dashboard(request):
     filas = [
         {
             'pago': p,
-            'monto_base': conv(p),
+            'monto_base': monto,
             'monto_destino': None,
             'estado_visual': estado_visual(p),
         }
-        for p in qs_base
+        for p, monto in zip(pagos_base, montos_base)
     ]
 
     ctx = {
@@ -207,7 +210,7 @@ def agenda(request):
 
     vencidos = (
         Pago.objects
-        .filter(prestamo__persona=persona, estado='Pendiente', fecha_vencimiento__lt=hoy)
+        .filter(prestamo__persona=persona, estado='Vencido')
         .select_related('prestamo', 'prestamo__persona')
     )
     proximos = (
@@ -218,10 +221,8 @@ def agenda(request):
         .order_by('fecha_vencimiento', 'numero_cuota')
     )
 
-    def row(p):
-        origen = p.prestamo.moneda_prestamo or 'PEN'
-        monto = convertir_monto(p.monto, origen, base, p.fecha_vencimiento)
-        if p.fecha_vencimiento < hoy:
+    def row(p, monto):
+        if p.estado == 'Vencido':
             estado = 'Vencido'
         elif p.fecha_vencimiento == hoy:
             estado = 'Hoy'
@@ -229,7 +230,9 @@ def agenda(request):
             estado = 'Próximo'
         return {'pago': p, 'monto': monto, 'estado': estado}
 
-    items = [row(p) for p in vencidos] + [row(p) for p in proximos]
+    pagos = list(vencidos) + list(proximos)
+    montos = equivalentes(pagos, [base] * len(pagos), omitir_errores=False)
+    items = [row(p, m) for p, m in zip(pagos, montos)]
 
     return render(request, 'reportes/agenda.html', {
         'items': items,
@@ -13,4 +13,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'baseParcial.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from Moneda.services_async import cerrar_sesion  # noqa: E402  (requiere las apps cargadas)
+
+
+async def application(scope, receive, send):
+    """
+    Django no maneja el protocolo lifespan: se atiende aquí para cerrar en
+    el shutdown la sesión aiohttp de Moneda.services_async.
+    """
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensaje['type'] == 'lifespan.shutdown':
+            await cerrar_sesion()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
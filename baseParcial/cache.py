@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheTTL:
+    """
+    Cache LRU en memoria con expiración (TTL). Vive a nivel de proceso: lo
+    comparten todas las requests de un worker. Lo usan los tipos de cambio
+    (Moneda.services) y los cronogramas base de prepago (Prestamos.prepago).
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()   # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, clave):
+        ahora = time.monotonic()
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None:
+                self.misses += 1
+                return None
+            expira_en, valor = item
+            if expira_en <= ahora:
+                del self._datos[clave]
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def set(self, clave, valor):
+        expira_en = time.monotonic() + self.ttl
+        with self._lock:
+            self._datos[clave] = (expira_en, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def invalidar_donde(self, condicion):
+        """Elimina todas las claves para las que condicion(clave) es True."""
+        with self._lock:
+            for clave in [c for c in self._datos if condicion(c)]:
+                del self._datos[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'tamano': len(self._datos),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -131,8 +131,33 @@ VONAGE_API_KEY     = os.getenv('VONAGE_API_KEY')
 VONAGE_API_SECRET  = os.getenv('VONAGE_API_SECRET')
 VONAGE_FROM_NUMBER = os.getenv('VONAGE_FROM_NUMBER', 'GestorPagos')
 SMS_ENABLED = VONAGE_SMS_ENABLED
+
+# Cola de alertas inmediatas (Alertas.AlertaEnCola)
+ALERTAS_WORKER_HILO = os.getenv('ALERTAS_WORKER_HILO', 'True') == 'True'  # hilo de fondo en el proceso web
+ALERTAS_COLA_INTERVALO = float(os.getenv('ALERTAS_COLA_INTERVALO', 30))  # segundos entre revisiones del hilo
+ALERTAS_COLA_REINTENTOS = int(os.getenv('ALERTAS_COLA_REINTENTOS', 3))
+ALERTAS_COLA_RECLAMO = int(os.getenv('ALERTAS_COLA_RECLAMO', 600))  # segundos en Procesando antes de reclamarla
 # ============================
 #  Mercado Pago (Checkout Pro)
 # ============================
 MP_PUBLIC_KEY = os.getenv('MP_PUBLIC_KEY')
 MP_ACCESS_TOKEN = os.getenv('MP_ACCESS_TOKEN')
+MP_PREFERENCIA_TTL = int(os.getenv('MP_PREFERENCIA_TTL', 86400))  # segundos que se reutiliza una preferencia
+
+# ============================
+#  Tipo de cambio (Moneda)
+# ============================
+TIPOCAMBIO_CACHE_MAXSIZE = int(os.getenv('TIPOCAMBIO_CACHE_MAXSIZE', 512))
+TIPOCAMBIO_CACHE_TTL = int(os.getenv('TIPOCAMBIO_CACHE_TTL', 3600))  # segundos
+TIPOCAMBIO_MONEDAS = ('PEN', 'USD', 'EUR')
+TIPOCAMBIO_PIVOTE = os.getenv('TIPOCAMBIO_PIVOTE', 'USD')  # base de la tabla que se pide al proveedor
+TIPOCAMBIO_FETCH_MODO = os.getenv('TIPOCAMBIO_FETCH_MODO', 'paralelo')  # 'paralelo' | 'secuencial'
+TIPOCAMBIO_FETCH_TIMEOUT = float(os.getenv('TIPOCAMBIO_FETCH_TIMEOUT', 8))  # segundos
+TIPOCAMBIO_FETCH_WORKERS = int(os.getenv('TIPOCAMBIO_FETCH_WORKERS', 6))
+TIPOCAMBIO_HEDGE_DELAY = float(os.getenv('TIPOCAMBIO_HEDGE_DELAY', 0))  # 0 = todos a la vez
+TIPOCAMBIO_CB_FALLOS = int(os.getenv('TIPOCAMBIO_CB_FALLOS', 3))  # fallos seguidos para abrir el circuito
+TIPOCAMBIO_CB_ENFRIAMIENTO = float(os.getenv('TIPOCAMBIO_CB_ENFRIAMIENTO', 60))  # segundos hasta la sonda
+TIPOCAMBIO_NEGATIVO_TTL = int(os.getenv('TIPOCAMBIO_NEGATIVO_TTL', 60))  # segundos
+TIPOCAMBIO_RESPALDO_ULTIMA = os.getenv('TIPOCAMBIO_RESPALDO_ULTIMA', 'True') == 'True'
+TIPOCAMBIO_MAX_ANTIGUEDAD_DIAS = int(os.getenv('TIPOCAMBIO_MAX_ANTIGUEDAD_DIAS', 7))  # hueco aceptado para fechas pasadas
+TIPOCAMBIO_OFFLINE = os.getenv('TIPOCAMBIO_OFFLINE', 'False') == 'True'  # nunca consultar proveedores
@@ -12,6 +12,7 @@ urlpatterns = [
     path('prestamos/', include('Prestamos.urls')),
     path('pagos/', include('Pagos.urls')),
     path('reportes/', include('Reportes.urls')),
+    path('moneda/', include('Moneda.urls')),
 
     # Admin de Django
     path('admin/', admin.site.urls),